@@ -23,6 +23,68 @@ log = getLogger(__name__)
 
 NO_CURATION_PREFIX = 'not-curated-'
 
+REGEX_SPECIAL_CHARS = set('.^$*+?{}[]()|')
+
+SEARCH_LOOKUPS = {
+    'exact': 'iexact',
+    'prefix': 'istartswith',
+    'suffix': 'iendswith',
+    'substring': 'icontains',
+    'regex': 'iregex',
+}
+""" Lookups for search terms on fields without search index """
+
+
+def classify_search_term(term):
+    """
+    Classify a search term
+
+    Search terms are (case-insensitive) regular expressions to the user, but
+    most are plain strings, possibly anchored by ^ and/or $.  Returns a tuple
+    (kind, value) where kind is one of 'exact', 'prefix', 'suffix',
+    'substring', or, if the term uses any other regex syntax, 'regex'.  For
+    kinds other than 'regex' value is the plain string without anchors and
+    with escaped characters unescaped.
+    """
+    if term.startswith('^'):
+        start, body = True, term[1:]
+    else:
+        start, body = False, term
+
+    end = False
+    value = []
+    escaped = False
+    for pos, char in enumerate(body):
+        if escaped:
+            if char.isalnum() or char == '_':
+                # e.g. \d or \b
+                return 'regex', term
+            value.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '$' and pos == len(body) - 1:
+            end = True
+        elif char in REGEX_SPECIAL_CHARS:
+            return 'regex', term
+        else:
+            value.append(char)
+
+    if escaped:
+        # trailing backslash, invalid regex, let the DB complain
+        return 'regex', term
+
+    value = ''.join(value)
+    if start and end:
+        kind = 'exact'
+    elif start:
+        kind = 'prefix'
+    elif end:
+        kind = 'suffix'
+    else:
+        kind = 'substring'
+    return kind, value
+
 
 class DataConfig:
     """
@@ -248,6 +310,17 @@ class DataConfig:
         self.filter = {}
         self.negate = False
 
+    def has_selection(self):
+        """
+        Say if the queryset is restricted beyond the model's manager
+
+        This covers filters, excludes, searches and a dataset's own manager.
+        """
+        return bool(
+            self.q or self.excludes or self.filter or self.negate
+            or self._manager is not None
+        )
+
     def set_name(self, name):
         """
         Switch config over to different model/dataset
@@ -548,10 +621,11 @@ class DataConfig:
 
                 qlist.append(q)
 
-        else:
-            for i in terms:
-                # last term wins
-                filter[field_name + '__iregex'] = i
+        elif terms:
+            # last term wins
+            filter.update(
+                self._get_search_lookups(field, field_name, terms[-1])
+            )
 
         # simplify Qs to filter opportunistically
         complex_qlist = []
@@ -564,6 +638,34 @@ class DataConfig:
 
         return complex_qlist, filter
 
+    @staticmethod
+    def _get_search_lookups(field, field_name, term):
+        """
+        Get filter dict for searching a text field
+
+        Regular expression lookups are only used for terms that need them.
+        For fields with a search index (see Model.search_index_fields) exact
+        searches for terms without any cased characters, e.g. numeric
+        accessions, are done as equality lookups, which can use the index.
+        For such terms this is the same as the case-insensitive lookup.
+        Prefix searches always use istartswith, as a range lookup on the
+        index would not be correct under all collations.
+        """
+        kind, value = classify_search_term(term)
+        indexed = False
+        if hasattr(field.model, 'get_search_index_fields'):
+            indexed = field.name in field.model.get_search_index_fields()
+        if indexed:
+            # case-invariant value
+            indexed = value.lower() == value == value.upper()
+
+        if indexed and kind == 'exact':
+            return {field_name: value}
+
+        if kind == 'regex':
+            value = term
+        return {field_name + '__' + SEARCH_LOOKUPS[kind]: value}
+
     def shift(self, *fields):
         """
         Shift to a related model
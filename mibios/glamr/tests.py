@@ -1,3 +1,146 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from mibios.glamr.models import Dataset, Sample
+from mibios.umrad.models import (
+    CompoundRecord, FuncRefDBEntry, ReactionCompound, ReactionRecord,
+)
+
+
+class DetailViewQueryCountTests(TestCase):
+    """
+    Detail pages should take a fixed number of queries, independent of the
+    number of related objects
+    """
+    def add_reactions(self, compound, num):
+        ec = FuncRefDBEntry.objects.create(
+            accession=f'ec:{compound.accession}',
+            db=FuncRefDBEntry.DB_EC,
+        )
+        for i in range(num):
+            reaction = ReactionRecord.objects.create(
+                accession=f'{compound.accession}-R{i}',
+                source=ReactionCompound.DB_KEGG,
+                ec=ec,
+            )
+            ReactionCompound.objects.create(
+                reactionrecord=reaction,
+                compoundrecord=compound,
+                source=ReactionCompound.DB_KEGG,
+                side=True,
+                location=True,
+                transport='NO',
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_record_view_query_count(self):
+        small = CompoundRecord.objects.create(
+            accession='C1', source=CompoundRecord.DB_KEGG,
+        )
+        large = CompoundRecord.objects.create(
+            accession='C2', source=CompoundRecord.DB_KEGG,
+        )
+        self.add_reactions(small, 1)
+        self.add_reactions(large, 12)
+
+        urls = [
+            reverse('record', kwargs=dict(model='compoundrecord', pk=i.pk))
+            for i in (small, large)
+        ]
+        # first request may do some one-time queries
+        self.count_queries(urls[0])
+        self.assertEqual(*[self.count_queries(i) for i in urls])
+
+    def test_relations_view_query_count(self):
+        small = CompoundRecord.objects.create(
+            accession='C1', source=CompoundRecord.DB_KEGG,
+        )
+        large = CompoundRecord.objects.create(
+            accession='C2', source=CompoundRecord.DB_KEGG,
+        )
+        self.add_reactions(small, 1)
+        self.add_reactions(large, 12)
+
+        urls = [
+            reverse('relations', kwargs=dict(
+                model='compoundrecord',
+                pk=i.pk,
+                field='reactioncompound',
+            ))
+            for i in (small, large)
+        ]
+        # first request may do some one-time queries
+        self.count_queries(urls[0])
+        self.assertEqual(*[self.count_queries(i) for i in urls])
+
+
+class CountTests(TestCase):
+    """
+    Test the counting of distinct and annotated querysets
+    """
+    def setUp(self):
+        # counts are cached by query and data version
+        cache.clear()
+        for i in range(3):
+            dataset = Dataset.objects.create(dataset_id=f'set{i}')
+            for j in range(i):
+                Sample.objects.create(
+                    sample_id=f'samp{i}_{j}',
+                    dataset=dataset,
+                )
+
+    def test_distinct_count(self):
+        qs = Dataset.objects.filter(sample__sample_id__startswith='samp')
+        qs = qs.distinct()
+        self.assertEqual(len(qs), 2)
+        for strategy in ['distinct', 'exists', None]:
+            with self.subTest(strategy=strategy):
+                qs.COUNT_STRATEGY = strategy
+                self.assertEqual(qs.count(), 2)
+                self.assertEqual(qs.all().cached_count(), 2)
+
+    def test_count_sums(self):
+        qs = Dataset.objects.all().annotate_rev_rel_counts()
+        self.assertEqual(qs.count(), 3)
+        self.assertEqual(qs.sum_rev_rel_counts(), {'sample__count__sum': 3})
+
+
+class DataFrameTests(TestCase):
+    """
+    Test conversion of querysets into pandas data frames
+    """
+    def setUp(self):
+        dataset = Dataset.objects.create(dataset_id='set1')
+        for i in range(5):
+            Sample.objects.create(
+                sample_id=f'samp{i}',
+                dataset=dataset if i else None,
+            )
+
+    def test_query_count(self):
+        qs = Sample.objects.all()
+        with CaptureQueriesContext(connection) as ctx:
+            df = qs.as_dataframe('natural', 'dataset__dataset_id')
+        # one query for the values, one for the instances
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(len(df), 5)
+        self.assertEqual(
+            sorted(df['dataset__dataset_id']),
+            ['', 'set1', 'set1', 'set1', 'set1'],
+        )
+
+    def test_null_foreign_key(self):
+        df = Sample.objects.all().as_dataframe('dataset', natural=True)
+        self.assertEqual(df['dataset'].isna().sum(), 1)
+        self.assertEqual(
+            set(df['dataset'].dropna()),
+            {str(Dataset.objects.get().natural)},
+        )
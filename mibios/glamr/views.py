@@ -1,3 +1,5 @@
+from collections import namedtuple
+from functools import cache
 from itertools import chain, groupby
 from logging import getLogger
 
@@ -8,7 +10,9 @@ from django.conf import settings
 from django.contrib import messages
 from django.core.exceptions import FieldDoesNotExist
 from django.db.models import Count, Field, URLField
-from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.http import (
+    Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse,
+)
 from django.urls import reverse
 from django.views.generic import DetailView
 from django.views.generic.base import TemplateView
@@ -16,7 +20,10 @@ from django.views.generic.base import TemplateView
 from mibios import get_registry
 from mibios.data import TableConfig
 from mibios.models import Q
-from mibios.views import ExportBaseMixin, TextRendererZipped
+from mibios.tables import get_export_fields, iter_values
+from mibios.views import (
+    ExportBaseMixin, KeysetPaginationMixin, TextRendererZipped,
+)
 from mibios.omics import get_sample_model
 from mibios.omics.models import (
     CompoundAbundance, FuncAbundance, TaxonAbundance
@@ -67,19 +74,31 @@ class ExportMixin(ExportBaseMixin):
         """ generate file download response """
         name, suffix, renderer_class = self.get_format()
 
-        response = HttpResponse(content_type=renderer_class.content_type)
+        if renderer_class.streaming:
+            response = StreamingHttpResponse(
+                content_type=renderer_class.content_type
+            )
+        else:
+            response = HttpResponse(content_type=renderer_class.content_type)
         filename = self.get_filename() + suffix
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
 
-        renderer_class(response, filename=filename).render(self.get_values())
+        self.render_export(renderer_class(response, filename=filename))
         return response
 
     def get_values(self):
         if hasattr(self, 'get_table'):
-            return self.get_table().as_values()
+            return iter_values(self.get_table())
         else:
             raise RuntimeError('not implemented')
 
+    def get_typed_values(self):
+        if hasattr(self, 'get_table'):
+            table = self.get_table()
+            return iter_values(table, raw=True), get_export_fields(table)
+        else:
+            return super().get_typed_values()
+
 
 class BaseFilterMixin:
     """
@@ -277,7 +296,7 @@ class ModelTableMixin(ExportMixin):
     exclude = ['id']  # do not display these fields
 
     def get_table_kwargs(self):
-        kw = {}
+        kw = super().get_table_kwargs()
         kw['exclude'] = self.exclude
         kw['extra_columns'] = self.get_improved_columns()
         return kw
@@ -422,10 +441,75 @@ class AbundanceGeneView(ModelTableMixin, SingleTableView):
             return super().get_values()
 
 
+PrefetchPlan = namedtuple('PrefetchPlan', ['select', 'to_many'])
+""" Prefetch plan for detail views, see get_prefetch_plan() """
+
+
+def _get_to_one_lookups(model, depth):
+    """
+    Get select_related() lookups for forward relations up to given depth
+
+    For mibios models the relations are those found by get_related_fields().
+    """
+    def is_forward(field):
+        return field.many_to_one or (field.one_to_one and field.concrete)
+
+    if not hasattr(model, 'get_related_fields'):
+        # a plain django model, e.g. an intermediate m2m model
+        return [i.name for i in model._meta.get_fields() if is_forward(i)]
+
+    lookups = []
+    for path in model.get_related_fields():
+        # path: list of relation fields followed by the leaf field
+        for k in range(1, min(depth, len(path) - 1) + 1):
+            if not all((is_forward(i) for i in path[:k])):
+                break
+            lookup = '__'.join((i.name for i in path[:k]))
+            if lookup not in lookups:
+                lookups.append(lookup)
+    return lookups
+
+
+@cache
+def get_prefetch_plan(model, depth=2):
+    """
+    Get the plan by which to retrieve an object and its relations for display
+
+    Returns a PrefetchPlan with the select_related() lookups for the object
+    itself (forward relations up to depth) and, for each to-many relation, a
+    tuple (field, accessor name, select_related() lookups for the related
+    objects).  The latter are only one level deep, enough to display the
+    related objects, whose __str__() often uses their foreign keys.  This
+    way, a detail page takes one query for the object and one for each to-many
+    relation, independent of how many related objects there are.
+    """
+    to_many = []
+    for i in model._meta.get_fields():
+        if not (i.many_to_many or i.one_to_many):
+            continue
+        try:
+            # trying as m2m relation (other side of declared field)
+            rel_attr = i.get_accessor_name()
+        except AttributeError:
+            # this is the m2m field
+            rel_attr = i.name
+        to_many.append(
+            (i, rel_attr, _get_to_one_lookups(i.related_model, depth=1))
+        )
+    return PrefetchPlan(
+        select=_get_to_one_lookups(model, depth=depth),
+        to_many=to_many,
+    )
+
+
 class BaseDetailView(DetailView):
     template_name = 'glamr/detail.html'
     max_to_many = 16
 
+    def get_queryset(self):
+        qs = super().get_queryset()
+        return qs.select_related(*get_prefetch_plan(self.model).select)
+
     def get_context_data(self, **ctx):
         ctx = super().get_context_data(**ctx)
         ctx['object_model_name'] = self.model._meta.model_name
@@ -438,6 +522,8 @@ class BaseDetailView(DetailView):
     def get_details(self):
         details = []
         rel_lists = []
+        plan = get_prefetch_plan(self.model)
+        to_many = {i[0]: i[1:] for i in plan.to_many}
         for i in self.model._meta.get_fields():
             if i.name == 'id':
                 continue
@@ -447,13 +533,9 @@ class BaseDetailView(DetailView):
 
             if i.many_to_many or i.one_to_many:
                 model_name = i.related_model._meta.model_name
-                try:
-                    # trying as m2m relation (other side of declared field)
-                    rel_attr = i.get_accessor_name()
-                except AttributeError:
-                    # this is the m2m field
-                    rel_attr = i.name
-                qs = getattr(self.object, rel_attr).all()[:self.max_to_many]
+                rel_attr, select = to_many[i]
+                qs = getattr(self.object, rel_attr).all()
+                qs = qs.select_related(*select)[:self.max_to_many]
                 rel_lists.append((name, model_name, qs, i))
                 continue
 
@@ -667,10 +749,11 @@ class OverViewSamplesView(SingleTableView):
         return ctx
 
 
-class SampleListView(SingleTableView):
+class SampleListView(KeysetPaginationMixin, SingleTableView):
     """ List of samples belonging to a given dataset  """
     model = get_sample_model()
     template_name = 'glamr/sample_list.html'
+    keyset_template_name = 'glamr/keyset_table.html'
     table_class = tables.SampleTable
 
     def get_queryset(self):
@@ -789,8 +872,10 @@ class SearchHitView(TemplateView):
             ))
 
 
-class TableView(BaseFilterMixin, ModelTableMixin, SingleTableView):
+class TableView(KeysetPaginationMixin, BaseFilterMixin, ModelTableMixin,
+                SingleTableView):
     template_name = 'glamr/table.html'
+    keyset_template_name = 'glamr/keyset_table.html'
 
     def get_queryset(self):
         self.conf.q = [self.q]
@@ -801,9 +886,10 @@ class TableView(BaseFilterMixin, ModelTableMixin, SingleTableView):
         self.conf = TableConfig(self.model)
 
 
-class ToManyListView(SingleTableView):
+class ToManyListView(KeysetPaginationMixin, SingleTableView):
     """ view relations belonging to one object """
     template_name = 'glamr/relations_list.html'
+    keyset_template_name = 'glamr/keyset_table.html'
     table_class = tables.SingleColumnRelatedTable
 
     def setup(self, request, *args, **kwargs):
@@ -835,7 +921,10 @@ class ToManyListView(SingleTableView):
             self.accessor_name = field.name
 
     def get_queryset(self):
-        return getattr(self.object, self.accessor_name).all()
+        qs = getattr(self.object, self.accessor_name).all()
+        # one level of FKs for str() or the FK columns
+        lookups = get_prefetch_plan(self.model, depth=1).select
+        return qs.select_related(*lookups)
 
     def get_context_data(self, **ctx):
         ctx = super().get_context_data(**ctx)
@@ -2,6 +2,7 @@ from collections import Counter, defaultdict
 from csv import DictReader, Sniffer
 from inspect import signature
 from io import TextIOBase, TextIOWrapper
+from itertools import islice
 import re
 import sys
 
@@ -11,7 +12,7 @@ from django.db import transaction, IntegrityError
 
 from . import get_registry
 from .dataset import PARSE_BLANK, UserDataError
-from .models import ImportFile, NaturalKeyLookupError
+from .models import ChangeRecordBatch, ImportFile, NaturalKeyLookupError
 from .utils import DeepRecord, getLogger
 
 
@@ -31,11 +32,13 @@ class Loader():
     dataset = None
     blanks = {None: ['']}
     parse_blank = []
+    batch_size = 500
+    """ Number of rows processed together in bulk history mode """
 
     def __init__(self, data_name, sep=None, can_overwrite=True,
                  warn_on_error=False, strict_sample_id=False, dry_run=False,
                  user=None, erase_on_blank=False, no_new_records=False,
-                 note=''):
+                 note='', bulk_history=False):
         try:
             self.dataset = get_registry().datasets[data_name]
         except KeyError:
@@ -90,6 +93,10 @@ class Loader():
         self.no_new_records = no_new_records
         self.note = note
         self.file_record = None
+        if bulk_history:
+            self.history_batch = ChangeRecordBatch()
+        else:
+            self.history_batch = None
         if dry_run:
             self.log = log
         else:
@@ -177,7 +184,7 @@ class Loader():
         log.debug('processing:', file, vars(file))
         self.linenum = 1
         self.last_warning = None
-        row = None
+        self.row = None
         try:
             with transaction.atomic():
                 self.file_record = ImportFile.create_from_file(
@@ -194,8 +201,15 @@ class Loader():
                 self.setup_reader(file)
                 self.process_header()
 
-                for row in self.reader:
-                    self.process_row(row)
+                if self.history_batch is None:
+                    for row in self.reader:
+                        self.process_row(row)
+                else:
+                    while True:
+                        rows = list(islice(self.reader, self.batch_size))
+                        if not rows:
+                            break
+                        self.process_batch(rows)
 
                 if self.dry_run:
                     raise DryRunRollback
@@ -209,10 +223,13 @@ class Loader():
                 # FIXME: needs to be reported; and (when) does this happen?
                 raise
             else:
-                if row is None:
+                if self.row is None:
                     msg = 'error at file storage or opening stage'
                 else:
-                    msg = 'Failed processing line:\n{}'.format(row)
+                    msg = 'Failed processing line {}:\n{}'.format(
+                        self.linenum,
+                        self.row,
+                    )
                 raise RuntimeError(msg) from e
 
         return dict(
@@ -255,6 +272,7 @@ class Loader():
             line=self.linenum,
             user=self.user,
             comment=' '.join(sys.argv) if self.user is None else '',
+            batch=self.history_batch,
         )
         need_to_save = False
         if is_new:
@@ -322,15 +340,76 @@ class Loader():
             return True
         return False
 
-    def process_row(self, row):
+    def get_state(self):
+        """
+        Get copy of the accounting state
+
+        Helper for process_batch()
+        """
+        def copy_stats(stats):
+            ret = defaultdict(lambda: defaultdict(list))
+            for model_name, objs in stats.items():
+                for obj, items in objs.items():
+                    ret[model_name][obj] = list(items)
+            return ret
+
+        new = defaultdict(list)
+        for model_name, objs in self.new.items():
+            new[model_name] = list(objs)
+
+        return dict(
+            linenum=self.linenum,
+            count=self.count,
+            last_warning=self.last_warning,
+            warnings=list(self.warnings),
+            line_key=dict(self.line_key),
+            new=new,
+            added=copy_stats(self.added),
+            changed=copy_stats(self.changed),
+            erased=copy_stats(self.erased),
+        )
+
+    def process_batch(self, rows):
+        """
+        Process a batch of rows in bulk history mode
+
+        The rows are processed inside a single transaction and the change
+        records of all saved objects are stored together at the end.  Only if
+        a row fails, the batch is rolled back and processed again row by row
+        with a savepoint for each row so that errors are handled as usual.
+        """
+        state = self.get_state()
+        try:
+            with transaction.atomic():
+                for row in rows:
+                    self.process_row(row, savepoint=False)
+                self.history_batch.flush()
+        except (ValidationError, IntegrityError, UserDataError):
+            self.history_batch.clear()
+            for k, v in state.items():
+                setattr(self, k, v)
+            log.debug(f'batch failed before line {self.linenum + 1}, '
+                      f'reprocessing row by row')
+            with transaction.atomic():
+                for row in rows:
+                    self.process_row(row)
+                self.history_batch.flush()
+
+    def process_row(self, row, savepoint=True):
         """
         Process a single input row
 
         This method does pre-processing and wraps the work into a transaction
         and handles some of the fallout of processing failure.  The actual work
         is delegated to process_fields().
+
+        :param bool savepoint: If False, then the row is not processed in its
+                               own transaction and errors are just passed on
+                               to process_batch().
         """
         self.linenum += 1
+        # the raw row, in case pre-processing fails, see process_file()
+        self.row = row
         self.row = self.pre_process_row(row)
 
         # rec: accumulates bits of processing before final assembly
@@ -341,9 +420,14 @@ class Loader():
         changed_ = self.changed.copy()
         erased_ = self.erased.copy()
         try:
-            with transaction.atomic():
+            if savepoint:
+                with transaction.atomic():
+                    self.process_fields()
+            else:
                 self.process_fields()
         except (ValidationError, IntegrityError, UserDataError) as e:
+            if not savepoint:
+                raise
             # Catch errors to be presented to the user;
             # some user errors in the data come up as IntegrityErrors, e.g.
             # violations of UNIQUE, IntegrityError should not be caught
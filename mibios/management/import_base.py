@@ -91,6 +91,12 @@ class AbstractImportCommand(BaseCommand):
                  'in an error.  By default the import is aborted on any such '
                  'error.',
         )
+        parser.add_argument(
+            '--bulk-history',
+            action='store_true',
+            help='Process rows in batches and save the change history in bulk'
+                 ' for each batch.  This is faster for large tables.',
+        )
         parser.add_argument(
             '--debug',
             action='store_true',
@@ -115,6 +121,7 @@ class AbstractImportCommand(BaseCommand):
                 dry_run=options['dry_run'],
                 warn_on_error=options['warn_on_error'],
                 no_new_records=options['no_new_records'],
+                bulk_history=options['bulk_history'],
                 **self.load_file_kwargs(**options),
             )
         except UserDataError as e:
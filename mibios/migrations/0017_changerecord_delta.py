@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mibios', '0016_importfile_note'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='changerecord',
+            name='mibios_chan_record__7aceb3_idx',
+        ),
+        migrations.AddField(
+            model_name='changerecord',
+            name='delta_depth',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Number of deltas since the last full serialization'),
+        ),
+        migrations.AddField(
+            model_name='changerecord',
+            name='is_delta',
+            field=models.BooleanField(default=False, help_text='If true, then fields holds only the changes relative to the previous change record'),
+        ),
+        migrations.AddIndex(
+            model_name='changerecord',
+            index=models.Index(fields=['record_type', 'record_pk', 'timestamp'], name='mibios_chan_record__96d37a_idx'),
+        ),
+    ]
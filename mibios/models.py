@@ -1,28 +1,44 @@
-from collections import namedtuple, OrderedDict
+from collections import defaultdict, namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from decimal import Decimal
-from itertools import groupby
+from functools import wraps
+import gzip
+import hashlib
+from itertools import groupby, islice
 import json
-from operator import itemgetter
+from math import sqrt
+import os
+from operator import attrgetter, itemgetter
 from pathlib import Path
-from shutil import copy2
+from shutil import copyfileobj
+import sqlite3
+import subprocess
+import threading
 
+from django.apps import apps
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core import serializers
+from django.core.cache import cache
 from django.core.files import File
-from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
 from django.urls import reverse
-from django.core.exceptions import FieldDoesNotExist, ValidationError
-from django.db import models, transaction
+from django.core.exceptions import (EmptyResultSet, FieldDoesNotExist,
+                                    ValidationError)
+from django.db import DatabaseError, connections, models, transaction
+from django.db.models.functions import Mod
 from django.db.migrations.recorder import MigrationRecorder
-from django.db.utils import DEFAULT_DB_ALIAS, ConnectionHandler
+from django.db.utils import DEFAULT_DB_ALIAS
+from django.utils.encoding import is_protected_type
 from django.utils.html import format_html
 from rest_framework.serializers import HyperlinkedModelSerializer
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
 
+import numpy
 import pandas
 from pandas.api.types import is_numeric_dtype
 
@@ -44,6 +60,68 @@ class NaturalKeyLookupError(Exception):
     pass
 
 
+class NaturalMapCache:
+    """
+    LRU cache of primary key to natural value mappings
+
+    Shared across requests within a process, so that the natural values of
+    frequently used ("hot") objects don't need to be looked up again.  Each
+    model (curated or not) gets its own cache of limited size.  The entries
+    are kept together with the model's data version at the time they were
+    looked up and are dropped once the data version changes, e.g. after bulk
+    operations or changes made by other processes.  In-process saves and
+    deletes clear the entries right away, see signals.py.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.caches = {}
+        self.versions = {}
+
+    def get_many(self, model, curated, pks, version=None):
+        """
+        Return dict with the cached pks among those given
+
+        Entries cached under a different data version are dropped.
+        """
+        key = (model._meta.label_lower, curated)
+        if self.versions.get(key) != version:
+            self.caches.pop(key, None)
+            self.versions[key] = version
+        cache = self.caches.get(key)
+        if not cache:
+            return {}
+        ret = {}
+        for i in pks:
+            if i in cache:
+                cache.move_to_end(i)
+                ret[i] = cache[i]
+        return ret
+
+    def set_many(self, model, curated, data):
+        key = (model._meta.label_lower, curated)
+        cache = self.caches.setdefault(key, OrderedDict())
+        cache.update(data)
+        for i in data:
+            cache.move_to_end(i)
+        while len(cache) > self.maxsize:
+            cache.popitem(last=False)
+
+    def clear(self, model=None):
+        """
+        Drop all entries or those of given model
+        """
+        if model is None:
+            self.caches.clear()
+            self.versions.clear()
+            return
+        for curated in (True, False):
+            self.caches.pop((model._meta.label_lower, curated), None)
+            self.versions.pop((model._meta.label_lower, curated), None)
+
+
+natural_map_cache = NaturalMapCache(maxsize=100000)
+
+
 class NaturalValuesIterable(models.query.ValuesIterable):
     """
     Iterable like that returned by QuerySet.values() yielding natural values
@@ -52,31 +130,34 @@ class NaturalValuesIterable(models.query.ValuesIterable):
     """
     pk_fields = []
     model_class = None
+    chunk_size = 2000
 
     def __iter__(self):
-        value_maps = {}
-
-        # for each "field/model" generate a mapping from the "real" values to
-        # the natural key for each object/row:
-        for field in self.pk_fields:
-            m = {}
-            model = self.model_class.get_field(field).related_model
-            if self.queryset.is_curated():
-                manager = model.curated
-            else:
-                manager = model.objects
-            for i in manager.iterator():
-                m[i.pk] = i.natural
-            value_maps[field] = m
-
-        # Apply the mapping to each row:
-        for row in super().__iter__():
-            for field, m in value_maps.items():
-                val = row[field]
-                if val is None:
-                    continue
-                row[field] = m[row[field]]
-            yield row
+        rel_models = {
+            i: self.model_class.get_field(i).related_model
+            for i in self.pk_fields
+        }
+        curated = self.queryset.is_curated()
+        rows = super().__iter__()
+
+        # Process rows chunk-wise, for each "field/model" get the mapping from
+        # the referenced "real" values to the natural key and apply it to the
+        # rows of the chunk:
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            for field, model in rel_models.items():
+                m = model.get_natural_map(
+                    (row[field] for row in chunk),
+                    curated=curated,
+                )
+                for row in chunk:
+                    val = row[field]
+                    if val is None:
+                        continue
+                    row[field] = m.get(val, val)
+            yield from chunk
 
 
 def natural_values_iterable_factory(model_class, *pk_fields):
@@ -341,6 +422,9 @@ class QuerySet(models.QuerySet):
         self._rev_rel_count_fields = []
         self._manager = manager
 
+    DATAFRAME_CHUNK_SIZE = 2000
+    """ Number of rows fetched at a time by as_dataframe() """
+
     def as_dataframe(self, *fields, natural=False):
         """
         Convert to pandas dataframe
@@ -349,6 +433,11 @@ class QuerySet(models.QuerySet):
                             this empty then all fields are returned.
         :param: natural bool: If true, then replace id/pk of foreign
                               relation with natural representation.
+
+        The values of all fields, following relations, are retrieved
+        chunk-wise via values_list() and filled into one typed array per
+        column.  If some of the requested columns are not fields, e.g.
+        'natural', then model instances are retrieved for each chunk, too.
         """
         if self._avg_by:
             return self._as_dataframe_avg(*fields)
@@ -369,73 +458,166 @@ class QuerySet(models.QuerySet):
                 # not a real field
                 _fields[i] = None
         fields = _fields
-        # real field names has at least 'id', so it's never empty:
-        real_field_names = [i for i in fields if fields[i] is not None]
         del _fields
 
-        # get transposed value list (for real fields):
-        data = list(map(list, zip(*self.values_list(*real_field_names))))
-
-        if len(self) == 0:
-            # we're empty, and data == [] but we need it to be a list of empty
-            # lists, the pandas calls below will then make a nice empty
-            # DataFrame (with columns and index) for us
-            data = [[] for _ in real_field_names]
+        # real fields first, 'id' is always the first, then other attributes
+        names = [i for i, field in fields.items() if field is not None]
+        props = [i for i, field in fields.items() if field is None]
+        rows = self.values_list(*names).iterator(
+            chunk_size=self.DATAFRAME_CHUNK_SIZE,
+        )
+        if props:
+            rows = self._iter_with_attributes(rows, props)
+            names += props
 
-        # map field name to list index (for real fields):
-        fidx = dict((j, i) for i, j in enumerate(real_field_names))
+        columns, masks = self._fill_columns(
+            rows,
+            [self._column_dtype(fields[i]) for i in names],
+        )
+        columns = dict(zip(names, columns))
+        masks = dict(zip(names, masks))
 
-        index = pandas.Index(data[fidx['id']], dtype=int, name='id')
+        index = pandas.Index(columns['id'], dtype=int, name='id')
         df = pandas.DataFrame([], index=index)
 
         for name, field in fields.items():
             if name == 'id':
                 continue
 
-            if field is None:
-                dtype = None
-                # not a field we can retrieve directly from the DB, have to
-                # hope this works, can be expensive (extra DB queries)
-                # E.g. 'pk', 'natural',
-                # TODO: other examples?
-                col_dat = (row.get_value_related(name) for row in self)
-            else:
-                dtype = Model.pd_type(field)
-                col_dat = data[fidx[name]]
+            col_dat = columns[name]
 
             if field is not None and field.is_relation and natural:
-                # replace pks with natural key, 1 extra DB query
-                if self.is_curated():
-                    manager = field.related_model.curated
-                else:
-                    manager = field.related_model.objects
-                qs = manager.iterator()
-                nat_dict = {i.pk: i.natural for i in qs}
-                col_dat = map(
-                    lambda pk: None if pk is None else nat_dict[pk],
-                    col_dat
+                # replace pks with natural key, only for referenced objects
+                nat_dict = field.related_model.get_natural_map(
+                    col_dat[~masks[name]],
+                    curated=self.is_curated(),
                 )
+                col_dat = numpy.frompyfunc(
+                    lambda pk: None if pk is None else nat_dict.get(pk, pk),
+                    1, 1,
+                )(col_dat)
 
-            kwargs = dict(index=index)
-            if field is not None and field.choices:
-                col_dat = pandas.Categorical(col_dat)
-            else:
-                if dtype is str and not field.is_relation:
-                    # None become empty str
-                    # prevents 'None' string to enter df str columns
-                    # (but not for foreign key columns)
-                    col_dat = ('' if i is None else i for i in col_dat)
-                if dtype == bool:
-                    # don't pass dtype=bool to Series, this would make Nones
-                    # be identified as False in the Series, but without dtype
-                    # Series will auto-detect the type and store Nones as NAs
-                    pass
+            df[name] = self._make_series(col_dat, masks[name], field, index)
+
+        return df
+
+    def _iter_with_attributes(self, rows, attrs):
+        """
+        Append values of model attributes to rows from values_list()
+
+        The first value of each row must be the primary key.  For each chunk
+        of rows the model instances are retrieved with one query, following
+        the forward relations via select_related().
+        """
+        getters = [attrgetter(i) for i in attrs]
+        manager = self.model._base_manager
+        while True:
+            chunk = list(islice(rows, self.DATAFRAME_CHUNK_SIZE))
+            if not chunk:
+                break
+            objs = manager.select_related().in_bulk([i[0] for i in chunk])
+            for row in chunk:
+                obj = objs[row[0]]
+                yield row + tuple((get(obj) for get in getters))
+
+    @staticmethod
+    def _column_dtype(field):
+        """
+        Get the numpy dtype to hold the values of a column
+
+        Non-fields, relations, and fields with choices or types not known to
+        Model.pd_type() get object arrays.
+        """
+        if field is None or field.is_relation or field.choices:
+            return object
+        try:
+            dtype = Model.pd_type(field)
+        except ValueError:
+            return object
+        if dtype is float:
+            return numpy.float64
+        if dtype is bool:
+            return numpy.bool_
+        if dtype is str:
+            return object
+        return numpy.int64
+
+    def _fill_columns(self, rows, dtypes):
+        """
+        Collect rows into one 1-dimensional numpy array per column
+
+        Returns a list of value arrays of the given dtypes and a list of
+        boolean arrays marking the NULL values.  NULLs are kept as None in
+        object arrays.  The arrays are pre-allocated with room for a chunk of
+        rows and are grown geometrically as needed, so the rows are never held
+        in python lists.
+        """
+        size = self.DATAFRAME_CHUNK_SIZE
+        columns = [numpy.empty(size, dtype=i) for i in dtypes]
+        masks = [numpy.zeros(size, dtype=bool) for _ in dtypes]
+        count = 0
+        for row in rows:
+            if count == size:
+                size *= 2
+                for i in columns + masks:
+                    i.resize(size, refcheck=False)
+            for col, mask, value in zip(columns, masks, row):
+                if value is None:
+                    mask[count] = True
+                    if col.dtype == object:
+                        col[count] = None
                 else:
-                    kwargs['dtype'] = dtype
+                    col[count] = value
+            count += 1
+        return [i[:count] for i in columns], [i[:count] for i in masks]
+
+    @staticmethod
+    def _make_series(values, isnull, field, index):
+        """
+        Make a pandas Series from a column array of field values
+
+        For fields, the dtype is given by Model.pd_type() and missing values,
+        marked by isnull, are handled via masks.  Columns with choices become
+        categorical.
+        """
+        if field is None:
+            # let pandas figure out the type
+            return pandas.Series(values, index=index).infer_objects()
+
+        if field.choices:
+            return pandas.Series(pandas.Categorical(values), index=index)
+
+        dtype = Model.pd_type(field)
+
+        if dtype is str:
+            if not field.is_relation:
+                # None become empty str
+                # prevents 'None' string to enter df str columns
+                # (but not for foreign key columns)
+                values = values.copy()
+                values[isnull] = ''
+            return pandas.Series(values, index=index, dtype=dtype)
+
+        if dtype == bool:
+            # Don't let Nones become False, keep them as NA.
+            if isnull.any():
+                values = values.copy()
+                values[isnull] = False
+                arr = pandas.arrays.BooleanArray(values, isnull)
+            else:
+                arr = values
+            return pandas.Series(arr, index=index)
 
-            df[name] = pandas.Series(col_dat, **kwargs)
+        if dtype is float:
+            values = values.copy()
+            values[isnull] = numpy.nan
+            return pandas.Series(values, index=index)
 
-        return df
+        # nullable integers
+        values = values.copy()
+        values[isnull] = 0
+        arr = pandas.arrays.IntegerArray(values, isnull)
+        return pandas.Series(arr, index=index, dtype=dtype)
 
     def _as_dataframe_avg(self, *fields):
         """
@@ -446,23 +628,71 @@ class QuerySet(models.QuerySet):
         if not fields:
             fields = self._avg_fields
 
-        # getting pks here for index
-        index = pandas.MultiIndex.from_tuples(
-            self.values_list(*self._avg_by),
+        # one pass over the queryset, getting the avg_by values for the index
+        # and the requested values
+        names = list(self._avg_by) + list(fields)
+        columns, _ = self._fill_columns(
+            (itemgetter(*names)(row) if len(names) > 1 else (row[names[0]], )
+             for row in self),
+            [object] * len(names),
+        )
+        num_idx = len(self._avg_by)
+
+        index = pandas.MultiIndex.from_arrays(
+            columns[:num_idx],
             names=self._avg_by
         )
         df = pandas.DataFrame([], index=index)
 
-        for i in fields:
-            col_dat = []
-            for row in self:
-                val = row[i]
-                if isinstance(val, Decimal):
-                    val = float(val)
-                col_dat.append(val)
-            df[i] = pandas.Series(col_dat, index=index)
+        for name, col_dat in zip(fields, columns[num_idx:]):
+            col_dat = numpy.frompyfunc(
+                lambda val: float(val) if isinstance(val, Decimal) else val,
+                1, 1,
+            )(col_dat)
+            df[name] = pandas.Series(col_dat, index=index).infer_objects()
         return df
 
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Bulk-create objects and bump the data version
+        """
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if objs:
+            DataVersion.bump(self.model)
+        return objs
+
+    def bulk_update(self, objs, *args, **kwargs):
+        """
+        Bulk-update objects and bump the data version
+        """
+        ret = super().bulk_update(objs, *args, **kwargs)
+        DataVersion.bump(self.model)
+        return ret
+
+    def update(self, **kwargs):
+        """
+        Update rows and bump the data version
+        """
+        rows = super().update(**kwargs)
+        if rows:
+            DataVersion.bump(self.model)
+        return rows
+
+    update.alters_data = True
+
+    def delete(self):
+        """
+        Delete rows and bump the data version of all affected models
+        """
+        deleted, counts = super().delete()
+        DataVersion.bump(*(
+            apps.get_model(label) for label, num in counts.items() if num
+        ))
+        return deleted, counts
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
     def _filter_or_exclude(self, negate, *args, **kwargs):
         """
         Handle natural lookups for filtering operations
@@ -480,10 +710,291 @@ class QuerySet(models.QuerySet):
             fields = [i for i in fields if i != 'natural']
         return super()._values(*fields, **expressions)
 
-    def get_field_stats(self, fieldname, natural=False):
+    STATS_TOP_VALUES = 30
+    """ Maximum number of distinct values for which get_field_stats() returns
+    counts """
+    STATS_SAMPLE_SIZE = 10000
+    """ Approximate size of the sample used to calculate the quantiles for
+    get_field_stats() in sampling mode """
+
+    def get_field_stats(self, fieldname, natural=False, sample=None):
         """
         Get basic descriptive stats from a single field/column
 
+        Returns a dict: stats_type -> obj
+        Returning an empty dict indicates some error
+
+        Stats are calculated by the database and are cached until the data
+        changes.  For numeric fields the 'description' are count, mean, std,
+        min, max and quartiles and 'choice_counts' only give the number of
+        missing values.  For other fields 'choice_counts' has at most the
+        STATS_TOP_VALUES most frequent values.
+
+        :param bool sample: If True, then calculate quantiles from a sample of
+                            about STATS_SAMPLE_SIZE rows.  If False, quantiles
+                            are exact.  By default, the sample is used if
+                            there are more than STATS_SAMPLE_SIZE rows.
+        """
+        if fieldname in ['id', 'pk']:
+            # as_dataframe('id') does not return anything too meaningful.  If
+            # we wanted to return something here we need to treat id something
+            # different that ordinary int fields.
+            return {}
+
+        field = self._get_stats_field(fieldname)
+        if field is None:
+            return self._get_field_stats_pandas(fieldname, natural=natural)
+
+        key = self._get_stats_cache_key(fieldname, natural, sample)
+        ret = cache.get(key)
+        if ret is None:
+            ret = self._get_field_stats_sql(fieldname, field, natural, sample)
+            cache.set(key, ret)
+        return ret
+
+    def _get_stats_field(self, fieldname):
+        """
+        Return the field if we can get stats for it via SQL, or else None
+
+        This works for concrete fields, possibly across forward relations,
+        but not for averages or annotations.
+        """
+        if self._avg_by:
+            return None
+
+        model = self.model
+        *path, name = fieldname.split('__')
+        try:
+            for i in path:
+                field = model._meta.get_field(i)
+                if not (field.many_to_one or field.one_to_one):
+                    return None
+                model = field.related_model
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+        if not field.concrete or field.many_to_many:
+            return None
+        return field
+
+    def _get_stats_cache_key(self, fieldname, natural, sample):
+        """
+        Get the cache key for get_field_stats()
+
+        The key depends on the query, i.e. model and filters, the field, and
+        the data version, see _get_data_version().
+        """
+        version = self._get_data_version()
+        return 'mibios-field-stats:{}:{}:{}:{}:{}:{}'.format(
+            self.model._meta.label_lower,
+            self._get_query_hash(self._get_stats_base()),
+            fieldname,
+            natural,
+            sample,
+            version,
+        )
+
+    def _get_data_version(self, *other_models):
+        """
+        Get the data version of our model
+
+        The version combines the latest change record and the DataVersion
+        counter of bulk changes.  With other models given, the version covers
+        all these and our model.
+        """
+        record_types = ContentType.objects.get_for_models(
+            self.model, *other_models,
+        ).values()
+        latest = ChangeRecord.objects.filter(
+            record_type__in=record_types,
+        ).aggregate(models.Max('pk'))['pk__max']
+        return '{}.{}'.format(
+            latest,
+            DataVersion.get_version(self.model, *other_models),
+        )
+
+    @staticmethod
+    def _get_query_hash(qs):
+        """
+        Get hash of a queryset's SQL and parameters
+
+        Returns 'empty' for querysets that can't return anything, i.e. where
+        the SQL compiler raises EmptyResultSet.
+        """
+        try:
+            sql = qs.query.get_compiler(using=qs.db).as_sql()
+        except EmptyResultSet:
+            return 'empty'
+        return hashlib.md5(repr(sql).encode()).hexdigest()
+
+    def _get_stats_base(self):
+        """
+        Get queryset suitable for aggregating over the rows
+
+        Removes count annotations, ordering, and duplicates from joins
+        """
+        if self._pre_annotation_clone is None:
+            qs = self
+        else:
+            qs = self._pre_annotation_clone
+
+        qs = qs.order_by()
+        if qs.query.distinct:
+            qs = self.model._base_manager.filter(pk__in=qs.values('pk'))
+        return qs
+
+    def _get_field_stats_sql(self, fieldname, field, natural, sample):
+        """
+        Calculate the get_field_stats() results in the database
+        """
+        qs = self._get_stats_base()
+
+        # integer fields get value counts, like for the pandas-derived
+        # stats, where the table view only uses the description of floats
+        numeric_types = (
+            models.DecimalField,
+            models.FloatField,
+        )
+        if isinstance(field, numeric_types) and not field.choices \
+                and not field.is_relation:
+            return self._get_numeric_stats_sql(qs, fieldname, sample)
+
+        top = list(
+            qs.values_list(fieldname)
+            .annotate(num=models.Count('*'))
+            .order_by('-num')[:self.STATS_TOP_VALUES]
+        )
+
+        is_text = isinstance(field, (models.CharField, models.TextField)) \
+            and not field.is_relation
+        if is_text:
+            # like as_dataframe(), treat None as blank
+            merged = {}
+            for value, num in top:
+                value = '' if value is None else value
+                merged[value] = merged.get(value, 0) + num
+            top = sorted(merged.items(), key=itemgetter(1), reverse=True)
+
+        if natural and field.is_relation:
+            nat_dict = field.related_model.get_natural_map(
+                [pk for pk, _ in top],
+                curated=self.is_curated(),
+            )
+            top = [
+                (None if pk is None else nat_dict.get(pk, pk), num)
+                for pk, num in top
+            ]
+
+        # sorted by value, None first
+        counts = pandas.Series(
+            dict(sorted(top, key=lambda x: (x[0] is not None, x[0]))),
+            dtype=int,
+        )
+        ret = {
+            'choice_counts': counts,
+        }
+
+        if len(top) == 1:
+            # all values the same
+            ret['uniform'] = counts.to_dict()
+
+        if top and top[0][1] < 2:
+            # column values are unique
+            ret['unique'] = top[0][1]
+
+        if is_text:
+            blank = dict(top).get('')
+            not_blank_max = max(
+                (num for value, num in top if value != ''),
+                default=0,
+            )
+            if not_blank_max < 2:
+                if blank is None:
+                    # may have been cut off from top values
+                    blank = qs.filter(
+                        models.Q(**{fieldname: ''})
+                        | models.Q(**{fieldname + '__isnull': True})
+                    ).count()
+                if blank:
+                    # column unique except for empties
+                    ret['unique_blank'] = {
+                        'BLANK': blank,
+                        'NOT_BLANK': qs.count() - blank,
+                    }
+
+        return ret
+
+    def _get_numeric_stats_sql(self, qs, fieldname, sample):
+        """
+        Get stats for numeric field
+
+        Quantiles are either taken exactly, via ordering by the field, or from
+        a sample of rows taken by primary key stride.
+        """
+        agg = qs.aggregate(
+            total=models.Count('*'),
+            count=models.Count(fieldname),
+            mean=models.Avg(fieldname),
+            # not using StdDev which on SQLite gets all values into python
+            sum_sq=models.Sum(
+                models.F(fieldname) * models.F(fieldname),
+                output_field=models.FloatField(),
+            ),
+            min=models.Min(fieldname),
+            max=models.Max(fieldname),
+        )
+        count = agg['count']
+        if count > 1:
+            var = (float(agg['sum_sq']) - count * float(agg['mean']) ** 2)
+            std = sqrt(max(var, 0) / (count - 1))
+        else:
+            std = None
+        quantiles = (0.25, 0.5, 0.75)
+
+        if sample is None:
+            sample = count > self.STATS_SAMPLE_SIZE
+
+        values = qs.exclude(**{fieldname + '__isnull': True})
+        if count == 0:
+            qvals = [None for _ in quantiles]
+        elif sample:
+            stride = -(-count // self.STATS_SAMPLE_SIZE)
+            values = values.annotate(_stride=Mod('pk', stride))
+            values = values.filter(_stride=0)
+            values = values.values_list(fieldname, flat=True)
+            qvals = pandas.Series(list(values), dtype=float)
+            qvals = qvals.quantile(quantiles).tolist()
+        else:
+            # nearest rank, one single-row query each
+            values = values.order_by(fieldname)
+            values = values.values_list(fieldname, flat=True)
+            qvals = [values[round(q * (count - 1))] for q in quantiles]
+
+        description = pandas.Series(
+            [count, agg['mean'], std, agg['min'], *qvals, agg['max']],
+            index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'],
+            dtype=float,
+        )
+
+        missing = agg['total'] - count
+        if missing:
+            counts = pandas.Series({float('nan'): missing}, dtype=int)
+        else:
+            counts = pandas.Series([], dtype=int)
+
+        return {
+            'choice_counts': counts,
+            'description': description,
+        }
+
+    def _get_field_stats_pandas(self, fieldname, natural=False):
+        """
+        Get basic descriptive stats from a single field/column via pandas
+
+        This is the fallback for get_field_stats() for columns that are not
+        plain database fields, e.g. averages or other annotations.
+
         Returns a dict: stats_type -> obj
         Returning an empty dict indicates some error
         """
@@ -539,19 +1050,17 @@ class QuerySet(models.QuerySet):
     def annotate_rev_rel_counts(self):
         """
         Add reverse relation count annotations
+
+        Each count is a correlated subquery on the related table, so the
+        relations are not joined into the main query and rows do not get
+        multiplied across several relations.
         """
         count_args = {}
         rels = self.model.get_related_objects()
 
         for i in rels:
-            kwargs = dict(distinct=True)
-            f = {}
-            if self.is_curated():
-                f = i.related_model.curated.get_curation_filter()
-            if f:
-                kwargs['filter'] = f
             name = i.related_model._meta.model_name + '__count'
-            count_args[name] = models.Count(i.name, **kwargs)
+            count_args[name] = self._get_rev_rel_count(i)
 
         qs = self.annotate(**count_args)
         if count_args:
@@ -562,20 +1071,113 @@ class QuerySet(models.QuerySet):
         log.debug(f'COUNT COLS: {count_args}')
         return qs
 
+    def _get_rev_rel_base(self, rel):
+        """
+        Get queryset of the related model for relation count
+
+        For curated querysets the related records get curation-filtered too.
+        """
+        if self.is_curated() and hasattr(rel.related_model, 'curated'):
+            return rel.related_model.curated.using(self.db).all()
+        return models.QuerySet(rel.related_model, using=self.db)
+
+    def _get_rev_rel_count(self, rel):
+        """
+        Get correlated subquery expression counting a relation's objects
+        """
+        if isinstance(rel, models.ManyToManyField):
+            lookup = rel.related_query_name()
+        else:
+            # reverse relation
+            lookup = rel.field.name
+
+        if rel.many_to_many:
+            # custom through models may link the same pair more than once
+            template = '%(function)s(DISTINCT %(expressions)s)'
+        else:
+            template = '%(function)s(%(expressions)s)'
+
+        qs = self._get_rev_rel_base(rel)
+        qs = qs.filter(**{lookup: models.OuterRef('pk')}).order_by()
+        qs = qs.annotate(count=models.Func(
+            models.F('pk'),
+            function='COUNT',
+            template=template,
+            output_field=models.IntegerField(),
+        ))
+        return models.Subquery(qs.values('count'))
+
     def sum_rev_rel_counts(self):
         """
         Aggregate sums over reverse relation counts
 
         Returns a dict with {<model_name>__count__sum: int} per rev rel count
         annotation.  If no such annotation exist then an empty dict is
-        returned.
+        returned.  The sums are cached until the data changes.
+
+        Summing the distinct related objects per row is the same as counting
+        the related objects pointing to any of the rows.  So, where possible,
+        the count is taken directly from the related table, with the rows
+        given by a subquery, avoiding the per-row aggregation.
         """
-        args = [models.Sum(i) for i in self._rev_rel_count_fields or []]
-        return self.aggregate(*args)
+        if not self._rev_rel_count_fields:
+            return {}
+
+        rels = {
+            i.related_model._meta.model_name + '__count': i
+            for i in self.model.get_related_objects()
+        }
+        rels = {
+            k: v for k, v in rels.items()
+            if k in self._rev_rel_count_fields
+        }
+
+        key = 'mibios-count-sums:{}:{}:{}'.format(
+            self.model._meta.label_lower,
+            self._get_count_query_hash(),
+            self._get_data_version(*(i.related_model for i in rels.values())),
+        )
+        ret = cache.get(key)
+        if ret is not None:
+            return ret
+
+        base = self._pre_annotation_clone
+        ret = {}
+        for name in self._rev_rel_count_fields:
+            rel = rels.get(name)
+            if base is not None and rel is not None and rel.one_to_many:
+                ret[name + '__sum'] = self._count_related(base, rel)
+            else:
+                ret.update(self.aggregate(models.Sum(name)))
+        cache.set(key, ret)
+        return ret
+
+    def _count_related(self, base, rel):
+        """
+        Count the objects of a one-to-many relation related to base's rows
+        """
+        target = rel.field.target_field.name
+        pks = base.order_by().values(target)
+        pks.query.distinct = False
+        pks.query.select_related = False
+        return self._get_rev_rel_base(rel).filter(
+            **{rel.field.name + '__in': pks}
+        ).count()
+
+    COUNT_STRATEGY = 'distinct'
+    """ How count() counts distinct querysets with joins: 'distinct' counts
+    the distinct primary keys over the joins, 'exists' counts the rows of the
+    model's table for which a correlated EXISTS subquery finds a match.  With
+    None, Django's default is used, which counts the DISTINCT rows, over all
+    selected columns, in a subquery. """
+
+    APPROXIMATE_COUNT_THRESHOLD = 1000000
+    """ Estimated table size from which on approximate_count() only gives an
+    estimate """
 
     def count(self):
         """
-        Count that optimizes count annotations away
+        Count that optimizes count annotations and distinct() away
 
         This overriding method checks _pre_annotation_clone for presence of a
         clone made before a count column annotation is made.  Running the count
@@ -586,11 +1188,140 @@ class QuerySet(models.QuerySet):
 
         Hence, the general QuerySet build order should have filters first and
         the count annotations added last.
+
+        Distinct model querysets, which usually have joins over reverse
+        relations, are counted as set by COUNT_STRATEGY.
+        """
+        if self._pre_annotation_clone is not None:
+            return self._pre_annotation_clone.count()
+
+        if self._result_cache is None and self._can_rewrite_count():
+            qs = self.order_by()
+            qs.query.distinct = False
+            qs.query.select_related = False
+            if self.COUNT_STRATEGY == 'exists':
+                inner = qs.filter(pk=models.OuterRef('pk')).values('pk')
+                return models.QuerySet(self.model, using=self.db) \
+                    .filter(models.Exists(inner)).count()
+            else:
+                return qs.aggregate(
+                    count=models.Count('pk', distinct=True),
+                )['count']
+
+        return super().count()
+
+    def _can_rewrite_count(self):
+        """
+        Say if the count can be done over distinct primary keys
+
+        This is the case for distinct querysets of model instances without
+        annotations, where distinct rows are the same as distinct primary
+        keys.
+        """
+        query = self.query
+        return (
+            self.COUNT_STRATEGY is not None
+            and query.distinct
+            and not query.distinct_fields
+            and not query.annotations
+            and not query.is_sliced
+            and not query.combinator
+            and self._iterable_class is models.query.ModelIterable
+        )
+
+    def _get_count_query_hash(self):
+        """
+        Get hash of the SQL of the query as it is counted
+
+        Includes the model, so that empty queries of different models don't
+        share a hash.
         """
         if self._pre_annotation_clone is None:
-            return super().count()
+            qs = self
         else:
-            return self._pre_annotation_clone.count()
+            qs = self._pre_annotation_clone
+        return '{}-{}'.format(
+            self.model._meta.label_lower,
+            self._get_query_hash(qs.order_by()),
+        )
+
+    def cached_count(self):
+        """
+        Get the count, cached until the data changes
+
+        The cache key depends on the query and the data version, see
+        get_field_stats().  Intended for counts for display, e.g. for
+        pagination.
+        """
+        key = 'mibios-count:{}:{}:{}'.format(
+            self.model._meta.label_lower,
+            self._get_count_query_hash(),
+            self._get_data_version(),
+        )
+        count = cache.get(key)
+        if count is None:
+            count = self.count()
+            cache.set(key, count)
+        return count
+
+    def approximate_count(self):
+        """
+        Get the count or, for very large tables, an estimate
+
+        If the model's table is estimated to have at least
+        APPROXIMATE_COUNT_THRESHOLD rows, then estimated_count() is returned,
+        which may be None, otherwise the cached_count().
+        """
+        table_size = type(self)(self.model, using=self.db).estimated_count()
+        if table_size is None or table_size < self.APPROXIMATE_COUNT_THRESHOLD:
+            return self.cached_count()
+        return self.estimated_count()
+
+    def estimated_count(self):
+        """
+        Get an estimate of the number of rows without running COUNT(*)
+
+        On PostgreSQL the planner's row estimate for the query is returned.  On
+        SQLite the row count recorded by ANALYZE in the sqlite_stat1 table is
+        used, but this is only meaningful for querysets without filters.
+        Returns None if no estimate is available, e.g. if ANALYZE has never
+        been run, and callers must then either run the exact count() or do
+        without.
+        """
+        if self._pre_annotation_clone is not None:
+            return self._pre_annotation_clone.estimated_count()
+
+        conn = connections[self.db]
+        if conn.vendor == 'postgresql':
+            try:
+                sql, params = self.query.get_compiler(using=self.db).as_sql()
+            except EmptyResultSet:
+                return 0
+            with conn.cursor() as cur:
+                cur.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+                plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+
+        if conn.vendor == 'sqlite':
+            if self.query.has_filters():
+                return None
+            sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s'
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, [self.model._meta.db_table])
+                    rows = cur.fetchall()
+            except DatabaseError:
+                # no sqlite_stat1 table, ANALYZE was never run
+                return None
+            # first number of stat is the number of rows in table or index
+            counts = [int(stat.split()[0]) for stat, in rows if stat]
+            if counts:
+                return max(counts)
+            return None
+
+        return None
 
     def average(self, *avg_by, natural=True):
         """
@@ -780,6 +1511,77 @@ Fields = namedtuple('Fields', ['fields', 'names', 'verbose'])
 """ container to hold list of fields for a model """
 
 
+_introspection_cache = {}
+""" Memoized results of Model introspection methods, see memoize_introspection
+"""
+
+INTROSPECTION_CACHE_MAXSIZE = 100000
+""" Number of entries after which the introspection cache gets reset, some
+arguments, e.g. lookups, may come from user input """
+
+INTROSPECTION_CACHE_ENABLED = True
+""" Set to False to disable the introspection cache, e.g. for benchmarking """
+
+
+def clear_introspection_cache():
+    _introspection_cache.clear()
+
+
+def _copy_introspection_result(value):
+    """
+    Copy the list parts of a cached introspection result
+
+    Callers may modify the lists they get back, but not the fields or models.
+    """
+    if isinstance(value, Fields):
+        return Fields(*(list(i) for i in value))
+    if isinstance(value, list):
+        return [list(i) if isinstance(i, list) else i for i in value]
+    return value
+
+
+def memoize_introspection(method):
+    """
+    Decorator to cache the results of a Model's introspection classmethod
+
+    Results are cached per model and arguments once the app registry is ready.
+    Each entry is tied to the model's cached field list, so it gets
+    invalidated together with Django's field caches, e.g. when
+    apps.clear_cache() is called.  The decorator must be applied below
+    @classmethod.
+    """
+    @wraps(method)
+    def wrapper(cls, *args, **kwargs):
+        if not INTROSPECTION_CACHE_ENABLED or not cls._meta.apps.ready:
+            return method(cls, *args, **kwargs)
+
+        key = (cls, method.__name__, args, tuple(sorted(kwargs.items())))
+        fields = cls._meta.get_fields()
+        try:
+            token, value = _introspection_cache[key]
+        except KeyError:
+            token = None
+        except TypeError:
+            # unhashable arguments
+            return method(cls, *args, **kwargs)
+
+        if token is not fields:
+            value = method(cls, *args, **kwargs)
+            if len(_introspection_cache) >= INTROSPECTION_CACHE_MAXSIZE:
+                _introspection_cache.clear()
+            _introspection_cache[key] = (fields, value)
+        return _copy_introspection_result(value)
+    return wrapper
+
+
+@memoize_introspection
+def _get_field_map(model):
+    """
+    Get dict mapping a model's field names to fields, incl. reverse relations
+    """
+    return {i.name: i for i in model._meta.get_fields()}
+
+
 class AutoField(models.AutoField):
     """
     An AutoField with a verbose name that includes the model
@@ -876,31 +1678,6 @@ class ImportFile(models.Model):
         return txt
 
 
-class ChangeRecordQuerySet(QuerySet):
-    def with_old_fields(self):
-        """
-        Add fields from previous change record
-
-        This annotates each instance with an "old_fields" text field that is
-        populated from the record's preceding change's "fields" field.
-        ChangeRecord.diff() can use this to make the diff.
-        """
-        clone = self._chain()
-        # older: sub query to get previous changes for object
-        older = ChangeRecord.objects.filter(
-            record_type=models.OuterRef('record_type'),
-            record_pk=models.OuterRef('record_pk'),
-            timestamp__lte=models.OuterRef('timestamp'),
-        ).order_by('-timestamp')
-        # older includes the changes itself, sp ick the second change in order
-        old_fields = models.Subquery(
-            older.values('fields')[1:2],
-            output_field=models.TextField(blank=True)
-        )
-        clone = clone.annotate(old_fields=old_fields)
-        return clone
-
-
 class ChangeRecord(models.Model):
     """
     Model representing a changelog entry
@@ -928,15 +1705,28 @@ class ChangeRecord(models.Model):
     fields = models.TextField(blank=True)
     is_created = models.BooleanField(default=False, verbose_name='new record')
     is_deleted = models.BooleanField(default=False)
+    is_delta = models.BooleanField(
+        default=False,
+        help_text='If true, then fields holds only the changes relative to '
+                  'the previous change record',
+    )
+    delta_depth = models.PositiveSmallIntegerField(
+        default=0,
+        help_text='Number of deltas since the last full serialization',
+    )
+
+    FULL_INTERVAL = 20
+    """ Store the full serialization at least at every this many changes of a
+    record, in between only the changes are stored """
 
     class Meta:
         get_latest_by = 'timestamp'
         ordering = ['-timestamp']
         indexes = [
-            models.Index(fields=('record_type', 'record_pk')),
+            models.Index(fields=('record_type', 'record_pk', 'timestamp')),
         ]
 
-    objects = Manager.from_queryset(ChangeRecordQuerySet)()
+    objects = Manager()
 
     def __str__(self):
         user = ' ' + self.user.username if self.user else ''
@@ -953,25 +1743,29 @@ class ChangeRecord(models.Model):
 
     def has_changed(self):
         """
-        Compare with previous change record of same object
+        Compare new change record with latest state of same object
+
+        The latest state is retrieved with a single query, see
+        get_latest_state(), and is remembered for set_delta() at save().
         """
-        qs = self.record.history
-        if self.timestamp is not None:
-            qs = qs.filter(timestamp__lt=self.timestamp)
+        # remember for set_delta() at save()
+        self._prev_state = self.get_latest_state(
+            self.record_type,
+            [self.record_pk],
+        ).get(self.record_pk)
 
-        try:
-            prev = qs.latest()
-        except self.DoesNotExist:
+        if self._prev_state is None:
             # we are first
             return True
 
-        if self.record_natural != prev.record_natural:
-            return True
-
         if not self.fields:
             self.serialize()
 
-        if self.fields != prev.fields:
+        prev_natural, prev_fields, _ = self._prev_state
+        if self.record_natural != prev_natural:
+            return True
+
+        if self.fields_as_dict() != prev_fields:
             return True
 
         return False
@@ -987,6 +1781,96 @@ class ChangeRecord(models.Model):
             use_natural_foreign_keys=True
         )
 
+    @classmethod
+    def serialize_many(cls, records):
+        """
+        Serialize field content of many records of a single model
+
+        Returns a list of serializations, in order of the given records,
+        identical to what serialize() would store.  This is a field-level
+        implementation of Django's json serializer with natural foreign keys:
+        related objects' natural values and the many-to-many fields are
+        retrieved with a few queries for all records together.
+        """
+        if not records:
+            return []
+        model = type(records[0])
+        names = model.get_fields(skip_auto=True, with_m2m=True).names
+
+        # follow django.core.serializers.base.Serializer.serialize()
+        fields = []
+        for field in model._meta.concrete_model._meta.local_fields:
+            if not field.serialize:
+                continue
+            if field.remote_field is None:
+                if field.attname in names:
+                    fields.append(field)
+            elif field.attname[:-3] in names:
+                fields.append(field)
+
+        natural_maps = {}
+        for field in fields:
+            if field.remote_field is not None \
+                    and hasattr(field.related_model, 'get_natural_map'):
+                natural_maps[field.name] = field.related_model.get_natural_map(
+                    (getattr(i, field.attname) for i in records)
+                )
+
+        m2m_values = {}
+        for field in model._meta.concrete_model._meta.local_many_to_many:
+            if not field.serialize or field.attname not in names:
+                continue
+            if not field.remote_field.through._meta.auto_created:
+                continue
+            # query the related model, so the ordering is the same as that
+            # of the related manager
+            lookup = field.related_query_name()
+            pairs = list(
+                field.related_model._default_manager
+                .filter(**{lookup + '__in': [i.pk for i in records]})
+                .values_list(lookup, 'pk')
+            )
+            nat_map = field.related_model.get_natural_map(
+                (pk for _, pk in pairs)
+            )
+            values = defaultdict(list)
+            for pk, rel_pk in pairs:
+                values[pk].append(nat_map[rel_pk])
+            m2m_values[field.name] = values
+
+        def from_field(obj, field):
+            value = field.value_from_object(obj)
+            if is_protected_type(value):
+                return value
+            return field.value_to_string(obj)
+
+        ret = []
+        for obj in records:
+            data = {}
+            for field in fields:
+                if field.remote_field is None:
+                    data[field.name] = from_field(obj, field)
+                    continue
+                pk = getattr(obj, field.attname)
+                if pk is None:
+                    data[field.name] = None
+                elif pk in natural_maps.get(field.name, {}):
+                    data[field.name] = natural_maps[field.name][pk]
+                else:
+                    data[field.name] = getattr(obj, field.name).natural_key()
+            for name, values in m2m_values.items():
+                data[name] = values.get(obj.pk, [])
+            ret.append(json.dumps(
+                [{
+                    'model': str(obj._meta),
+                    'pk': from_field(obj, obj._meta.pk),
+                    'fields': data,
+                }],
+                cls=DjangoJSONEncoder,
+                ensure_ascii=False,
+            ))
+        return ret
+
     def save(self, *args, **kwargs):
         """
         Save change record
@@ -996,11 +1880,139 @@ class ChangeRecord(models.Model):
         change records is created.
         """
         self.serialize()
+        if self.pk is None:
+            if not hasattr(self, '_prev_state'):
+                self._prev_state = self.get_latest_state(
+                    self.record_type,
+                    [self.record_pk],
+                ).get(self.record_pk)
+            if self._prev_state is not None:
+                _, prev_fields, prev_depth = self._prev_state
+                self.set_delta(prev_fields, prev_depth)
         super().save(*args, **kwargs)
         self.record.history.add(self)
         if hasattr(self.record, 'change'):
             del self.record.change
 
+    @staticmethod
+    def make_delta(old, new):
+        """
+        Get compact json encoding of the changes between two field dicts
+        """
+        delta = {'set': {k: v for k, v in new.items()
+                         if k not in old or old[k] != v}}
+        unset = [k for k in old if k not in new]
+        if unset:
+            delta['unset'] = unset
+        return json.dumps(delta, cls=DjangoJSONEncoder, ensure_ascii=False,
+                          separators=(',', ':'))
+
+    @staticmethod
+    def apply_delta(fields, delta):
+        """
+        Return new field dict with json-encoded delta applied
+        """
+        delta = json.loads(delta)
+        fields = dict(fields)
+        fields.update(delta['set'])
+        for i in delta.get('unset', []):
+            fields.pop(i, None)
+        return fields
+
+    def set_delta(self, prev_fields, prev_depth):
+        """
+        Replace full serialization by delta to given previous state
+
+        :param dict prev_fields: The previous change's fields as dict.
+        :param int prev_depth: The previous change's delta_depth.
+
+        Creation and deletion, and every FULL_INTERVAL-th change, keep the
+        full serialization.
+        """
+        if self.is_created or self.is_deleted \
+                or prev_depth + 1 >= self.FULL_INTERVAL:
+            self.is_delta = False
+            self.delta_depth = 0
+            return
+        self.fields = self.make_delta(prev_fields, self.fields_as_dict())
+        self.is_delta = True
+        self.delta_depth = prev_depth + 1
+
+    @classmethod
+    def get_latest_state(cls, record_type, pks):
+        """
+        Get latest natural, fields, and delta depth for each given record pk
+
+        Returns a dict mapping the record pks to (record_natural, fields dict,
+        delta_depth) tuples.  The full field dicts are reconstructed from the
+        latest full serialization and following deltas.  Older changes are
+        not retrieved from the database.
+        """
+        pks = list(pks)
+        state = {}
+        last_full = (
+            cls.objects
+            .filter(
+                record_type=record_type,
+                record_pk=models.OuterRef('record_pk'),
+                is_delta=False,
+            )
+            .order_by('-timestamp', '-pk')
+            .values('timestamp')[:1]
+        )
+        for i in range(0, len(pks), Model.NATURAL_MAP_BATCH_SIZE):
+            qs = (
+                cls.objects
+                .filter(
+                    record_type=record_type,
+                    record_pk__in=pks[i:i + Model.NATURAL_MAP_BATCH_SIZE],
+                    timestamp__gte=models.Subquery(last_full),
+                )
+                .order_by('record_pk', '-timestamp', '-pk')
+                .values_list('record_pk', 'record_natural', 'is_delta',
+                             'fields')
+            )
+            chains = {}
+            naturals = {}
+            for pk, natural, is_delta, fields in qs.iterator():
+                if pk in state:
+                    # already have the full chain
+                    continue
+                naturals.setdefault(pk, natural)
+                chain = chains.setdefault(pk, [])
+                chain.append((is_delta, fields))
+                if not is_delta:
+                    state[pk] = (
+                        naturals[pk],
+                        cls.resolve_chain(chain),
+                        len(chain) - 1,  # depth of latest change
+                    )
+        return state
+
+    @classmethod
+    def resolve_chain(cls, chain):
+        """
+        Get fields dict from list of (is_delta, fields), newest first
+
+        The last element of the chain must be a full serialization.
+        """
+        is_delta, fields = chain[-1]
+        ret = cls.load_fields(fields)
+        for is_delta, fields in reversed(chain[:-1]):
+            ret = cls.apply_delta(ret, fields)
+        return ret
+
+    @staticmethod
+    def load_fields(json_serial):
+        """
+        Get fields dict from full json serialization string
+        """
+        serial = json.loads(json_serial)[0]
+        fields = serial['fields']
+        if 'pk' not in fields:
+            fields['pk'] = serial['pk']
+        return fields
+
     def fields_as_dict(self, json_serial=None):
         """
         Return serialized object as dict
@@ -1009,15 +2021,38 @@ class ChangeRecord(models.Model):
             Alternative json serialization string.  The default is to use the
             instance's "fields" attribute.
 
-        Extract the fields as a dict, primary key is included as "pk".
+        Extract the fields as a dict, primary key is included as "pk".  If the
+        instance's fields holds a delta, then the full fields are
+        reconstructed from the previous changes.
         """
         if json_serial is None:
+            if self.is_delta:
+                return self.get_full_fields()
             json_serial = self.fields
-        serial = json.loads(json_serial)[0]
-        fields = serial['fields']
-        if 'pk' not in fields:
-            fields['pk'] = serial['pk']
-        return fields
+        return self.load_fields(json_serial)
+
+    def get_full_fields(self):
+        """
+        Reconstruct the fields dict of a delta change record
+        """
+        chain = list(
+            ChangeRecord.objects
+            .filter(
+                record_type_id=self.record_type_id,
+                record_pk=self.record_pk,
+            )
+            .filter(
+                models.Q(timestamp__lt=self.timestamp)
+                | models.Q(timestamp=self.timestamp, pk__lte=self.pk)
+            )
+            .order_by('-timestamp', '-pk')
+            .values_list('is_delta', 'fields')[:self.delta_depth + 1]
+        )
+        if not chain or chain[-1][0]:
+            raise RuntimeError(
+                f'failed to find full serialization for change {self.pk}'
+            )
+        return self.resolve_chain(chain)
 
     def get_predecessor(self, constant_pk=True):
         """
@@ -1064,25 +2099,29 @@ class ChangeRecord(models.Model):
         Get the difference in field values introduced by this change
 
         :param dict theirs: Compare against these fields.  The default is
-                                to use the fields in the old_fields instance
-                                attribute.
+                                to use the diff set by add_diffs() or else
+                                the predecessor's fields.
 
         Fields that were dropped from the tables between the changes will not
         be listed.
         """
         if theirs is None:
-            if hasattr(self, 'old_fields'):
-                if self.old_fields is None:
-                    theirs = {}
-                else:
-                    theirs = self.fields_as_dict(self.old_fields)
-            else:
-                return self.diff_to(other=None)
+            if hasattr(self, '_diff'):
+                return self._diff
+            return self.diff_to(other=None)
+
+        return self.diff_fields(self.fields_as_dict(), theirs,
+                                self.record_natural)
 
-        ours = self.fields_as_dict()
+    @staticmethod
+    def diff_fields(ours, theirs, natural):
+        """
+        Get the diff dict between two field dicts
 
+        Helper for diff() and add_diffs()
+        """
         if 'name' in theirs and 'name' not in ours:
-            ours['name'] = self.record_natural
+            ours = dict(ours, name=natural)
 
         diff = {}
         for k, v in ours.items():
@@ -1095,6 +2134,63 @@ class ChangeRecord(models.Model):
                     diff[k] = (old_v, v)
         return diff
 
+    @classmethod
+    def add_diffs(cls, records):
+        """
+        Compute the diffs of many change records at once
+
+        Sets the diff of each given change record, so that subsequent diff()
+        calls don't need to query and parse the preceding change records.
+        The history up to the given changes is retrieved with one query per
+        record type and batch of records and each stored serialization or
+        delta is parsed only once.
+        """
+        wanted = defaultdict(dict)
+        for i in records:
+            if i.record_type_id is None or i.record_pk is None:
+                continue
+            wanted[i.record_type_id][i.pk] = i
+
+        batch_size = Model.NATURAL_MAP_BATCH_SIZE
+        for record_type_id, changes in wanted.items():
+            record_pks = list({i.record_pk for i in changes.values()})
+            max_ts = max((i.timestamp for i in changes.values()))
+            for j in range(0, len(record_pks), batch_size):
+                qs = (
+                    cls.objects
+                    .filter(
+                        record_type_id=record_type_id,
+                        record_pk__in=record_pks[j:j + batch_size],
+                        timestamp__lte=max_ts,
+                    )
+                    .order_by('record_pk', 'timestamp', 'pk')
+                    .values_list('pk', 'record_pk', 'record_natural',
+                                 'is_delta', 'fields')
+                )
+                last_record_pk = None
+                for pk, record_pk, natural, is_delta, fields in qs.iterator():
+                    if record_pk != last_record_pk:
+                        # next record's history starts
+                        state = prev_natural = None
+                        last_record_pk = record_pk
+                    if not is_delta:
+                        new = cls.load_fields(fields)
+                    elif state is not None:
+                        new = cls.apply_delta(state, fields)
+                    else:
+                        # incomplete history, leave it to diff()
+                        continue
+
+                    if pk in changes:
+                        if state is None:
+                            theirs = {}
+                        else:
+                            theirs = dict(state)
+                            theirs.setdefault('name', prev_natural)
+                        changes[pk]._diff = \
+                            cls.diff_fields(new, theirs, natural)
+                    state, prev_natural = new, natural
+
     @classmethod
     def summary(cls):
         """
@@ -1192,12 +2288,12 @@ class ChangeRecord(models.Model):
         :param int first: lowest primary key of range of changes to show
         :param int last: highest primary key of range of changes to show
 
-        Returns all change records in given range with old field annotation.
+        Returns all change records in given range.  Use add_diffs() on the
+        displayed records to get their diffs.
         """
         return (cls.objects
                 .filter(pk__gte=first, pk__lte=last)
-                .select_related('user', 'record_type', 'file')
-                .with_old_fields())
+                .select_related('user', 'record_type', 'file'))
 
     def format(self):
         """
@@ -1235,6 +2331,21 @@ class ChangeRecord(models.Model):
         return out
 
 
+_snapshot_aliases = OrderedDict()
+""" Registered snapshot db aliases, least recently used first """
+_evicted_snapshot_aliases = set()
+""" Snapshot db aliases dropped from _snapshot_aliases, whose connections the
+threads must close, see Snapshot.close_evicted_connections() """
+_snapshot_aliases_lock = threading.Lock()
+
+
+def _quote_name(name):
+    """
+    Quote a table or column name for use in a snapshot's sqlite SQL
+    """
+    return '"{}"'.format(name.replace('"', '""'))
+
+
 def _default_snapshot_name():
     try:
         last_pk = Snapshot.objects.latest().pk
@@ -1248,15 +2359,162 @@ def _default_snapshot_name():
     return name + ' version ' + str(last_pk + 1)
 
 
+class ChangeRecordBatch:
+    """
+    Collect change records of saved objects and store them in bulk
+
+    Objects are added by Model.save() if their change record was created with
+    this batch, see Model.add_change_record().  Then, at flush(), the
+    objects get serialized all at once, compared to their latest existing
+    change records and new change records and history links are inserted via
+    bulk_create().  Call flush() inside a transaction together with the
+    saving of the objects.
+    """
+    def __init__(self):
+        self.items = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, obj, change):
+        self.items.append((obj, change))
+
+    def add_bulk(self, objs):
+        """
+        Add objects that were saved via bulk_create() or bulk_update()
+
+        The objects must have their pk set and must have got their change
+        record via add_change_record() before, as the bulk methods bypass
+        Model.save().
+        """
+        for obj in objs:
+            change = obj.change
+            if change.record_natural is None:
+                change.record_natural = obj.natural
+            change.record = obj
+            self.add(obj, change)
+            del obj.change
+            obj.change_batch = None
+
+    def clear(self):
+        self.items = []
+
+    @transaction.atomic
+    def flush(self):
+        """
+        Save the change records of the collected objects
+
+        Returns the number of change records saved.  Objects that did not
+        change since their latest change record do not get a new one.
+        """
+        items, self.items = self.items, []
+        by_model = defaultdict(list)
+        for obj, change in items:
+            by_model[type(obj)].append((obj, change))
+
+        changes = []
+        for model, group in by_model.items():
+            record_type = ContentType.objects.get_for_model(model)
+            latest = ChangeRecord.get_latest_state(
+                record_type,
+                (i.pk for i, _ in group),
+            )
+            serials = ChangeRecord.serialize_many([i for i, _ in group])
+            for (obj, change), fields in zip(group, serials):
+                change.record_type = record_type
+                change.record_pk = obj.pk
+                change.fields = fields
+                fields = change.fields_as_dict()
+                prev = latest.get(obj.pk)
+                if prev is None:
+                    depth = 0
+                else:
+                    prev_natural, prev_fields, prev_depth = prev
+                    if (prev_natural, prev_fields) \
+                            == (change.record_natural, fields):
+                        continue
+                    change.set_delta(prev_fields, prev_depth)
+                    depth = change.delta_depth
+                latest[obj.pk] = (change.record_natural, fields, depth)
+                changes.append((obj, change))
+
+        if not changes:
+            return 0
+
+        records = [change for _, change in changes]
+        ChangeRecord.objects.bulk_create(records)
+        if records[0].pk is None:
+            # Backend can't return the new pks, e.g. sqlite.  But since we're
+            # inside a transaction holding a write lock, they are the last
+            # pks in sequence.
+            pks = ChangeRecord.objects.order_by('-pk') \
+                .values_list('pk', flat=True)[:len(records)]
+            for change, pk in zip(records, reversed(list(pks))):
+                change.pk = pk
+
+        links = defaultdict(list)
+        for obj, change in changes:
+            field = obj._meta.get_field('history')
+            through = field.remote_field.through
+            links[through].append(through(**{
+                field.m2m_field_name() + '_id': obj.pk,
+                field.m2m_reverse_field_name() + '_id': change.pk,
+            }))
+        for through, objs in links.items():
+            through.objects.bulk_create(objs)
+
+        return len(records)
+
+
+class DataVersion(models.Model):
+    """
+    Counter of bulk changes to a model's table
+
+    Bulk operations, like QuerySet.update() or bulk_create(), bypass
+    Model.save() and leave no change records.  The mibios QuerySet bumps the
+    counter instead, so that together with the latest change record, data
+    changes can be detected, e.g. to invalidate cached values.  Writes via raw
+    SQL must call bump() themselves.
+    """
+    model = models.CharField(max_length=100, unique=True,
+                             help_text='model label')
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.model}: {self.version}'
+
+    @classmethod
+    def bump(cls, *models_):
+        """
+        Increment the counter of the given models
+        """
+        for label in {i._meta.label_lower for i in models_}:
+            updated = cls.objects.filter(model=label).update(
+                version=models.F('version') + 1,
+            )
+            if not updated:
+                cls.objects.get_or_create(model=label,
+                                          defaults=dict(version=1))
+
+    @classmethod
+    def get_version(cls, *models_):
+        """
+        Get combined counter value of the given models
+        """
+        labels = [i._meta.label_lower for i in models_]
+        return cls.objects.filter(model__in=labels) \
+            .aggregate(models.Sum('version'))['version__sum'] or 0
+
+
 class Snapshot(models.Model):
     """
     Snapshot of database
 
     An instance will make a copy the first time it is saved.  After that, the
     name and the note can be edited.  The snapshot consists of a copy of the
-    sqlite3 database file and a json dump of the models in the apps in the
-    mibios registry.  Deleting the object from the database will also delete
-    the snapshot files.
+    database (a sqlite3 file or a pg_dump archive) and a compressed json-lines
+    dump of the models in the apps in the mibios registry.  Deleting the
+    object from the database will also delete the snapshot files.
     """
     def get_app_list():
         """
@@ -1320,27 +2578,38 @@ class Snapshot(models.Model):
             self._create_snapshot()
         super().save(*args, **kwargs)
 
+    backup_pages = 1024
+    """ Number of database pages copied per step by the sqlite backup """
+
+    json_workers = 4
+    """ Number of threads writing the per-model JSON archive parts """
+
+    json_chunk_size = 1000
+    """ Number of objects serialized at a time for the JSON archive """
+
+    fetch_size = 1000
+    """ Number of rows fetched at a time when iterating over table data """
+
+    max_db_aliases = 8
+    """ Number of snapshot databases kept registered for read-only access """
+
     def _create_snapshot(self):
         if not settings.SNAPSHOT_DIR.is_dir():
             settings.SNAPSHOT_DIR.mkdir(mode=0o770, parents=True)
-        src = settings.DATABASES['default']['NAME']
         stem = '_'.join(self.name.split())
 
-        self.dbfile = stem + '.sqlite3'
-        self.jsondump = stem + '.json'
-
-        copy2(src, str(self.dbpath()))
+        vendor = connections[DEFAULT_DB_ALIAS].vendor
+        if vendor == 'sqlite':
+            self.dbfile = stem + '.sqlite3'
+            self._backup_sqlite()
+        elif vendor == 'postgresql':
+            self.dbfile = stem + '.pgdump'
+            self._backup_postgresql()
+        else:
+            raise NotImplementedError(f'no snapshot support for {vendor}')
 
-        call_command(
-            'dumpdata',
-            *get_registry().apps,
-            format='json',
-            indent=4,
-            database='default',
-            natural_foreign=True,
-            natural_primary=True,
-            output=self.jsonpath(),
-        )
+        self.jsondump = stem + '.jsonl.gz'
+        self._dump_json()
 
         # set read-only
         self.dbpath().chmod(0o440)
@@ -1358,36 +2627,219 @@ class Snapshot(models.Model):
 
         self.migrations = serializers.serialize('json', migrations)
 
+    def _backup_sqlite(self):
+        """
+        Copy the database via sqlite's online backup API
+
+        The copy proceeds in steps of backup_pages pages, between which other
+        connections can access the database.  If the database gets written to
+        in between steps, then sqlite restarts the backup.
+        """
+        conn = connections[DEFAULT_DB_ALIAS]
+        conn.ensure_connection()
+        dst = sqlite3.connect(str(self.dbpath()))
+        try:
+            conn.connection.backup(dst, pages=self.backup_pages, sleep=0.01)
+        finally:
+            dst.close()
+
+    def _backup_postgresql(self):
+        """
+        Dump the database with pg_dump (custom format)
+        """
+        db = settings.DATABASES['default']
+        cmd = ['pg_dump', '--format=custom', '--no-owner',
+               '--file', str(self.dbpath())]
+        if db.get('HOST'):
+            cmd += ['--host', db['HOST']]
+        if db.get('PORT'):
+            cmd += ['--port', str(db['PORT'])]
+        if db.get('USER'):
+            cmd += ['--username', db['USER']]
+        cmd.append(db['NAME'])
+        env = dict(os.environ)
+        if db.get('PASSWORD'):
+            env['PGPASSWORD'] = db['PASSWORD']
+        subprocess.run(cmd, env=env, check=True)
+
+    def get_db_alias(self):
+        """
+        Get a database alias for read-only access to the snapshot's database
+
+        The alias is set up on first use.  Django keeps the connections per
+        alias and thread, so these get re-used.  Beyond max_db_aliases the
+        least recently used alias is evicted.  A connection can only be closed
+        by its own thread, so the evicted alias stays configured and each
+        thread closes its connection at the end of its current request, see
+        close_evicted_connections().
+        """
+        if not self.dbfile.endswith('.sqlite3'):
+            raise ValueError(f'snapshot has no sqlite3 database: {self}')
+
+        alias = 'snapshot_' + self.dbfile
+        with _snapshot_aliases_lock:
+            _evicted_snapshot_aliases.discard(alias)
+            if alias in _snapshot_aliases:
+                _snapshot_aliases.move_to_end(alias)
+            else:
+                connections.databases[alias] = {
+                    'ENGINE': 'django.db.backends.sqlite3',
+                    'NAME': 'file:{}?mode=ro'.format(self.dbpath()),
+                    'OPTIONS': {'uri': True},
+                    'CONN_MAX_AGE': 600,
+                }
+                _snapshot_aliases[alias] = None
+                while len(_snapshot_aliases) > self.max_db_aliases:
+                    old_alias, _ = _snapshot_aliases.popitem(last=False)
+                    _evicted_snapshot_aliases.add(old_alias)
+        self.close_evicted_connections()
+        return alias
+
+    @staticmethod
+    def _close_db_alias(alias):
+        """
+        Evict the given alias and close the current thread's connection
+
+        Other threads close their connections via close_evicted_connections().
+        """
+        with _snapshot_aliases_lock:
+            if alias in _snapshot_aliases:
+                del _snapshot_aliases[alias]
+                _evicted_snapshot_aliases.add(alias)
+        Snapshot.close_evicted_connections()
+
+    @staticmethod
+    def close_evicted_connections():
+        """
+        Close the current thread's connections of evicted snapshot aliases
+
+        Called at the end of each request, see signals.py.
+        """
+        with _snapshot_aliases_lock:
+            aliases = list(_evicted_snapshot_aliases)
+        for i in aliases:
+            conn = getattr(connections._connections, i, None)
+            if conn is not None:
+                conn.close()
+
+    def _dump_json(self):
+        """
+        Write the compressed JSON-lines archive
+
+        For sqlite the data is read from the snapshot's database copy,
+        otherwise from the live database.  Each model is dumped by a worker
+        thread to a separate gzip file and these are then concatenated,
+        giving a valid multi-member gzip file, which loaddata can read.
+        """
+        if self.dbfile.endswith('.sqlite3'):
+            alias = self.get_db_alias()
+        else:
+            alias = DEFAULT_DB_ALIAS
+
+        model_list = []
+        for app_conf in get_registry().apps.values():
+            model_list += list(app_conf.get_models())
+
+        parts = [
+            self.jsonpath().with_name(
+                f'{self.jsondump}.{i._meta.label_lower}.part'
+            )
+            for i in model_list
+        ]
+        try:
+            with ThreadPoolExecutor(max_workers=self.json_workers) as pool:
+                for _ in pool.map(self._dump_model_json, model_list, parts,
+                                  [alias] * len(parts)):
+                    pass
+
+            with self.jsonpath().open('wb') as ofile:
+                for i in parts:
+                    with i.open('rb') as ifile:
+                        copyfileobj(ifile, ofile)
+        finally:
+            for i in parts:
+                i.unlink(missing_ok=True)
+
+    def _dump_model_json(self, model, path, alias):
+        """
+        Serialize a model's objects to gzipped JSON-lines file
+
+        Runs in a worker thread.  Objects are retrieved in chunks, with their
+        many-to-many relations prefetched.  As with the dumpdata command,
+        natural keys are used where models provide them, related objects
+        needed for natural foreign keys are loaded via joins.
+        """
+        m2m_fields = [
+            i.name for i in model._meta.local_many_to_many
+            if i.remote_field.through._meta.auto_created
+        ]
+        natural_fk_fields = [
+            i.name for i in model._meta.concrete_fields
+            if i.is_relation and i.many_to_one
+            and hasattr(i.related_model, 'natural_key')
+        ]
+        qs = model._base_manager.using(alias).order_by('pk')
+        if natural_fk_fields:
+            qs = qs.select_related(*natural_fk_fields)
+        if m2m_fields:
+            qs = qs.prefetch_related(*m2m_fields)
+
+        try:
+            with gzip.open(path, 'wt', encoding='utf-8') as ofile:
+                last_pk = None
+                while True:
+                    chunk = qs
+                    if last_pk is not None:
+                        chunk = chunk.filter(pk__gt=last_pk)
+                    chunk = list(chunk[:self.json_chunk_size])
+                    if not chunk:
+                        break
+                    serializers.serialize(
+                        'jsonl',
+                        chunk,
+                        stream=ofile,
+                        use_natural_foreign_keys=True,
+                        use_natural_primary_keys=True,
+                    )
+                    last_pk = chunk[-1].pk
+        finally:
+            connections[alias].close()
+
     def delete(self, *args, **kwargs):
+        self._close_db_alias('snapshot_' + self.dbfile)
         self.dbpath().unlink(missing_ok=True)
         self.jsonpath().unlink(missing_ok=True)
         super().delete(*args, **kwargs)
 
     def do_sql(self, sql, params=[], descr=False):
         """
-        Connect to snapshot db, run sql and fetchall rows
+        Run sql on the snapshot db and fetchall rows
+
+        The snapshot's pooled read-only connection is used, see
+        get_db_alias().
         """
-        db = {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': 'file:{}?mode=ro'.format(self.dbpath()),
-            'OPTIONS': {'uri': True, },
-        }
-        conf = {DEFAULT_DB_ALIAS: db}
-        conn_h = ConnectionHandler(conf)
-        conn = conn_h[DEFAULT_DB_ALIAS]
-        try:
-            with conn.cursor() as cur:
-                cur.execute(sql, params)
-                rows = cur.fetchall()
-        except Exception:
-            raise
-        else:
+        with connections[self.get_db_alias()].cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
             if descr:
                 return rows, cur.description
-            else:
-                return rows
-        finally:
-            conn.close()
+        return rows
+
+    def iter_sql(self, sql, params=[], chunk_size=None):
+        """
+        Run sql on the snapshot db and iterate over the rows
+
+        The rows are fetched chunk_size rows at a time.
+        """
+        if chunk_size is None:
+            chunk_size = self.fetch_size
+        with connections[self.get_db_alias()].cursor() as cur:
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
 
     def get_table_names(self, app_label, app_check=True):
         """
@@ -1429,12 +2881,12 @@ class Snapshot(models.Model):
             ]
         return data
 
-    def get_table_data(self, user_app, user_table_name):
+    def get_table(self, user_app, user_table_name):
         """
-        Return table content for given app and short table name
+        Get lazy access to a table for given app and short table name
 
         The parameters are untrusted, assumed to be passed from a URL and will
-        be checked here.
+        be checked here.  Returns a SnapshotTable.
         """
         # verify app and table name
         for i in self.get_table_names(user_app):
@@ -1446,15 +2898,115 @@ class Snapshot(models.Model):
                 f'no such table in snapshot: {user_app} / {user_table_name}'
             )
 
-        rows, descr = self.do_sql('select * from ' + table_name, descr=True)
+        _, descr = self.do_sql(
+            f'select * from {_quote_name(table_name)} limit 0',
+            descr=True,
+        )
+        return SnapshotTable(self, table_name, [i[0] for i in descr])
+
+    def get_table_data(self, user_app, user_table_name):
+        """
+        Return table content for given app and short table name
 
-        columns = [i[0] for i in descr]
-        return columns, rows
+        Returns a tuple of the list of column names and the list of all rows.
+        For large tables use get_table() instead.
+        """
+        table = self.get_table(user_app, user_table_name)
+        return table.columns, list(table.iter_rows())
 
     def get_absolute_url(self):
         return reverse('snapshot', kwargs=dict(name=self.name))
 
 
+class SnapshotTable:
+    """
+    Lazy, queryset-like access to one table of a snapshot database
+
+    Rows are dicts mapping column names to values.  Only count() and slicing
+    access the database, via COUNT(*) and LIMIT/OFFSET respectively, so this
+    can be handed to a table view for paginated and sorted display without
+    loading the whole table.  The rowid is used as last ordering key to keep
+    pages stable.
+    """
+    def __init__(self, snapshot, table_name, columns, ordering=()):
+        self.snapshot = snapshot
+        self.table_name = table_name
+        self.columns = columns
+        self.ordering = tuple(ordering)
+        self._count = None
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.snapshot} / {self.table_name}>'
+
+    def order_by(self, *fields):
+        """
+        Return a copy ordered by the given, optionally '-'-prefixed, columns
+        """
+        for i in fields:
+            if i.lstrip('-') not in self.columns:
+                raise ValueError(f'no such column: {i}')
+        obj = type(self)(self.snapshot, self.table_name, self.columns,
+                         ordering=fields)
+        obj._count = self._count
+        return obj
+
+    def count(self):
+        if self._count is None:
+            sql = f'select count(*) from {_quote_name(self.table_name)}'
+            self._count = self.snapshot.do_sql(sql)[0][0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def _get_sql(self):
+        order_by = [
+            _quote_name(i[1:]) + ' desc' if i.startswith('-')
+            else _quote_name(i)
+            for i in self.ordering
+        ]
+        order_by.append('rowid')
+        return (f'select * from {_quote_name(self.table_name)} '
+                f'order by {", ".join(order_by)}')
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            if key < 0:
+                raise IndexError('negative indexing is not supported')
+            rows = self[key:key + 1]
+            if not rows:
+                raise IndexError('row index out of range')
+            return rows[0]
+
+        if not isinstance(key, slice):
+            raise TypeError(f'invalid index type: {type(key)}')
+        if key.step is not None:
+            raise ValueError('slicing with step is not supported')
+        start = key.start or 0
+        if start < 0 or (key.stop is not None and key.stop < 0):
+            raise ValueError('negative indexing is not supported')
+        if key.stop is None:
+            limit = -1
+        else:
+            limit = max(key.stop - start, 0)
+
+        rows = self.snapshot.do_sql(
+            self._get_sql() + ' limit %s offset %s',
+            [limit, start],
+        )
+        return [dict(zip(self.columns, i)) for i in rows]
+
+    def __iter__(self):
+        for i in self.iter_rows():
+            yield dict(zip(self.columns, i))
+
+    def iter_rows(self, chunk_size=None):
+        """
+        Iterate over all rows as tuples, in order
+        """
+        return self.snapshot.iter_sql(self._get_sql(), chunk_size=chunk_size)
+
+
 class Model(models.Model):
     """
     Adds some extras to Django's Model
@@ -1596,6 +3148,7 @@ class Model(models.Model):
             return True
 
     @classmethod
+    @memoize_introspection
     def get_fields(
         cls,
         skip_auto=False,
@@ -1656,6 +3209,7 @@ class Model(models.Model):
         return Fields(fields=fields, names=names, verbose=verbose)
 
     @classmethod
+    @memoize_introspection
     def get_related_objects(cls):
         """
         Get compatible one-to-many related objects
@@ -1674,6 +3228,7 @@ class Model(models.Model):
         ]
 
     @classmethod
+    @memoize_introspection
     def get_related_accessors(cls):
         """
         Discover simple local and forward-looking remotely related fields
@@ -1735,6 +3290,7 @@ class Model(models.Model):
         return data
 
     @classmethod
+    @memoize_introspection
     def get_related_fields(cls, relations_last=True, auto_fields=False):
         """
         Discover simple local and forward-looking remotely related fields
@@ -1802,6 +3358,7 @@ class Model(models.Model):
         return data
 
     @classmethod
+    @memoize_introspection
     def get_related_accessors2(cls, relations_last=True, auto_fields=False):
         """
         List accessors to (related) fields
@@ -1817,6 +3374,7 @@ class Model(models.Model):
         return ['__'.join([i.name for i in path]) for path in fields]
 
     @classmethod
+    @memoize_introspection
     def get_field(cls, accessor):
         """
         Retrieve a field object following relations
@@ -1843,6 +3401,7 @@ class Model(models.Model):
             return field
 
     @classmethod
+    @memoize_introspection
     def get_average_fields(cls):
         """
         Get fields for which we may want to calculate averages
@@ -1987,6 +3546,65 @@ class Model(models.Model):
     def natural_key(self):
         return self.natural
 
+    NATURAL_MAP_BATCH_SIZE = 900
+    """ Number of primary keys looked up per query by get_natural_map() """
+
+    @classmethod
+    def get_natural_column(cls):
+        """
+        Get name of the column holding the natural value
+
+        Returns None if the natural property is implemented in Python by the
+        model and can't be retrieved by a simple column lookup.
+        """
+        if cls.natural is not Model.natural:
+            return None
+        try:
+            cls._meta.get_field('name')
+        except FieldDoesNotExist:
+            return 'pk'
+        else:
+            return 'name'
+
+    @classmethod
+    def get_natural_map(cls, pks, curated=False):
+        """
+        Get mapping from primary keys to natural values
+
+        :param pks: Iterable of primary keys, may contain None and duplicates.
+        :param bool curated: Whether to use the curated manager.
+
+        Only the given primary keys are looked up, in batches and taking
+        advantage of the process-wide natural_map_cache, which is valid for
+        the current data version of the model.  Primary keys that don't exist
+        (or are not curated) are missing from the returned dict.
+        """
+        pks = set(pks)
+        pks.discard(None)
+
+        column = cls.get_natural_column()
+        if column == 'pk':
+            return {i: i for i in pks}
+
+        if not pks:
+            return {}
+
+        version = cls.objects.all()._get_data_version()
+        ret = natural_map_cache.get_many(cls, curated, pks, version)
+        missing = list(pks.difference(ret))
+        manager = cls.curated if curated else cls.objects
+        for i in range(0, len(missing), cls.NATURAL_MAP_BATCH_SIZE):
+            qs = manager.filter(
+                pk__in=missing[i:i + cls.NATURAL_MAP_BATCH_SIZE]
+            )
+            if column is None:
+                data = {obj.pk: obj.natural for obj in qs.iterator()}
+            else:
+                data = dict(qs.values_list('pk', column).iterator())
+            natural_map_cache.set_many(cls, curated, data)
+            ret.update(data)
+        return ret
+
     @classmethod
     def natural_lookup(cls, value):
         """
@@ -2044,8 +3662,50 @@ class Model(models.Model):
             # is just pk
             return super().__str__()
 
+    search_index_fields = ()
+    """ Names of indexed fields, e.g. accessions, on which exact searches for
+    terms without cased characters are done as equality lookups, so that they
+    can use the index """
+
+    @classmethod
+    def get_search_index_fields(cls):
+        """
+        Get names of fields with an index usable for search
+
+        See search_index_fields.
+        """
+        return cls.search_index_fields
+
     NOT_A_VALUE = object()
 
+    @classmethod
+    @memoize_introspection
+    def _resolve_natural_lhs(cls, lhs):
+        """
+        Resolve the lhs of a possible natural object lookup
+
+        Returns a tuple of the model at the end of the relations in lhs and
+        the lhs prefix for the natural replacements, with any trailing
+        natural removed.  The model is None if lhs is not an object lookup.
+        """
+        cur_model = cls
+        parts = lhs.split('__')
+        for part in parts:
+            if part == 'natural':
+                continue
+            field = _get_field_map(cur_model).get(part)
+            if field is not None and field.is_relation:
+                cur_model = field.related_model
+            else:
+                return None, None
+
+        if part == 'natural':
+            # remove __natural from lhs
+            lhs = '__'.join(parts[:-1])
+        if lhs:
+            lhs += '__'
+        return cur_model, lhs
+
     @classmethod
     def resolve_natural_lookups(cls, *accessors, **lookups):
         """
@@ -2075,42 +3735,25 @@ class Model(models.Model):
                 ret[lhs] = rhs
                 continue
 
-            cur_model = cls
-
-            parts = lhs.split('__')
-            for part in parts:
-                if part == 'natural':
-                    continue
-                fields = {i.name: i for i in cur_model._meta.get_fields()}
-                if part in fields and fields[part].is_relation:
-                    cur_model = fields[part].related_model
-                else:
-                    # not an obj lookup, keep as-is
-                    ret[lhs] = rhs
-                    break
+            cur_model, prefix = cls._resolve_natural_lhs(lhs)
+            if cur_model is None:
+                # not an obj lookup, keep as-is
+                ret[lhs] = rhs
+            elif isinstance(rhs, int):
+                ret.update({prefix + 'pk': rhs})
             else:
-                # prepare lhs prefix for the natural replacements:
-                if part == 'natural':
-                    # remove __natural from lhs
-                    lhs = '__'.join(parts[:-1])
-
-                if lhs:
-                    lhs += '__'
-
-                if isinstance(rhs, int):
-                    ret.update({lhs + 'pk': rhs})
-                else:
-                    try:
-                        real_lookups = cur_model.natural_lookup(rhs)
-                    except Exception as e:
-                        # Assume code in natural_lookup() is correct and
-                        # treat this a user error, i.e. the natural rhs is
-                        # bad
-                        msg = 'Failed to resolve: [{}]{}={}' \
-                              ''.format(cur_model._meta.model_name, parts, rhs)
-                        raise NaturalKeyLookupError(msg) from e
-
-                    ret.update({lhs + k: v for k, v in real_lookups.items()})
+                try:
+                    real_lookups = cur_model.natural_lookup(rhs)
+                except Exception as e:
+                    # Assume code in natural_lookup() is correct and
+                    # treat this a user error, i.e. the natural rhs is
+                    # bad
+                    msg = 'Failed to resolve: [{}]{}={}' \
+                          ''.format(cur_model._meta.model_name,
+                                    lhs.split('__'), rhs)
+                    raise NaturalKeyLookupError(msg) from e
+
+                ret.update({prefix + k: v for k, v in real_lookups.items()})
         if accessors:
             return list(ret.keys())
         else:
@@ -2152,15 +3795,18 @@ class Model(models.Model):
         return reverse(name, kwargs=dict(object_id=self.pk))
 
     def add_change_record(self, is_created=None, is_deleted=False, file=None,
-                          line=None, user=None, comment=''):
+                          line=None, user=None, comment='', batch=None):
         """
         Create a change record attribute for this object
 
         If the object has no id/pk yet the change will be "is_created".  The
         fields will remain empty until save()
 
-        Call this before the objects save() or delete() method.
+        Call this before the objects save() or delete() method.  If a
+        ChangeRecordBatch is given, then save() will leave the change record
+        to the batch instead of saving it directly.
         """
+        self.change_batch = batch
         self.change = ChangeRecord(
             user=user,
             file=file,
@@ -2172,27 +3818,44 @@ class Model(models.Model):
             is_deleted=is_deleted,
         )
 
-    @transaction.atomic
     def save(self, *args, **kwargs):
-        is_created = self.id is None
-        super().save(*args, **kwargs)
+        """
+        Save object and record the change
 
-        if self.history is None:
-            return
+        Without a change batch this runs in its own transaction.  With a
+        batch, the batch's owner, e.g. Loader.process_batch(), provides the
+        transaction and no savepoint is made per object.
+        """
+        if getattr(self, 'change_batch', None) is None:
+            atomic = transaction.atomic()
+        else:
+            atomic = nullcontext()
 
-        if not hasattr(self, 'change'):
-            self.add_change_record(is_created=is_created)
-        if self.change.record_natural is None:
-            # natural may still be None if record is new and change was created
-            # manually and the model uses the fallback to pk for natural
-            # property but now after save() we have a valid pk
-            self.change.record_natural = self.natural
-
-        # set record (again) as super().save() resets this to None for unknown
-        # reasons:
-        self.change.record = self
-        if self.change.has_changed():
-            self.change.save()
+        with atomic:
+            is_created = self.id is None
+            super().save(*args, **kwargs)
+
+            if self.history is None:
+                return
+
+            if not hasattr(self, 'change'):
+                self.add_change_record(is_created=is_created)
+            if self.change.record_natural is None:
+                # natural may still be None if record is new and change was
+                # created manually and the model uses the fallback to pk for
+                # natural property but now after save() we have a valid pk
+                self.change.record_natural = self.natural
+
+            # set record (again) as super().save() resets this to None for
+            # unknown reasons:
+            self.change.record = self
+            batch = getattr(self, 'change_batch', None)
+            if batch is not None:
+                batch.add(self, self.change)
+                del self.change
+                self.change_batch = None
+            elif self.change.has_changed():
+                self.change.save()
 
     def delete(self, *args, **kwargs):
         if self.history is None:
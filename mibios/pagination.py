@@ -0,0 +1,353 @@
+"""
+Keyset pagination for table views
+
+Offset pagination makes the database skip over all the rows before the
+requested page and needs a COUNT(*) over the whole result to display the
+number of pages.  Both get slow for large tables.  The KeysetPaginator
+instead remembers the last (or first) row of the displayed page in a cursor
+query parameter and retrieves the next (or previous) page with a WHERE clause
+on the ordering columns, which the database can answer via an index.  The
+total number of pages is only estimated.
+"""
+from zlib import crc32
+
+from django.core.paginator import EmptyPage, Page
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q, QuerySet
+from django.db.models.query import ModelIterable
+from django_tables2.paginators import LazyPaginator
+from django_tables2.rows import BoundRow, BoundRows
+
+from .utils import getLogger
+
+
+log = getLogger(__name__)
+
+
+AFTER = 'a'
+BEFORE = 'b'
+
+
+class KeysetPage(Page):
+    """
+    A page that knows its neighbors via cursors instead of offsets
+    """
+    def __init__(self, object_list, number, paginator, has_next=False,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self._has_next
+
+
+class KeysetPaginator(LazyPaginator):
+    """
+    Paginator using the ordering columns of a queryset to find the next page
+
+    Intended to be used as paginator_class for django_tables2 table views.  If
+    the table data is not a plain model queryset or is ordered by something
+    that can't be used as a key, e.g. by a field across a to-many relation or
+    by an expression, then this falls back to the offset-based but count-free
+    behavior of the LazyPaginator.
+
+    :param str cursor: The cursor value as received via the query string.
+    :param str count_mode: Either 'estimate' (the default) to get the total
+                           number of rows from the database's statistics,
+                           'exact' to run a COUNT query, or 'auto' to count
+                           unless the table is very large.  Exact counts are
+                           cached if the queryset supports it.
+    """
+    cursor_field = 'cursor'
+    count_mode = 'estimate'
+
+    def __init__(self, object_list, per_page, cursor=None, cursor_field=None,
+                 count_mode=None, **kwargs):
+        self.cursor = cursor
+        if cursor_field is not None:
+            self.cursor_field = cursor_field
+        if count_mode is not None:
+            self.count_mode = count_mode
+        super().__init__(object_list, per_page, **kwargs)
+        self.queryset = self._get_queryset()
+        self.keys = self._get_keys()
+        self._estimated_count = None
+
+    def _get_queryset(self):
+        """
+        Get the underlying queryset if keyset pagination can be applied to it
+        """
+        qs = self.object_list
+        if isinstance(qs, BoundRows):
+            # table.rows -> TableData -> queryset
+            qs = getattr(qs.data, 'data', None)
+
+        if not isinstance(qs, QuerySet):
+            return None
+        if qs._iterable_class is not ModelIterable:
+            # values() etc. / averages
+            return None
+        if qs.query.is_sliced or qs.query.combinator:
+            return None
+        if qs.query.distinct_fields:
+            return None
+        return qs
+
+    def _get_keys(self):
+        """
+        Get the list of (name, descending) ordering keys, with pk last
+
+        Returns None if the ordering is not suitable for keyset pagination.
+        """
+        if self.queryset is None:
+            return None
+
+        query = self.queryset.query
+        if query.order_by:
+            ordering = query.order_by
+        elif query.default_ordering:
+            ordering = query.get_meta().ordering
+        else:
+            ordering = []
+
+        keys = []
+        for i in ordering:
+            if not isinstance(i, str) or i == '?':
+                # expressions, random order
+                return None
+            descending = i.startswith('-')
+            name = i.lstrip('-+')
+            if name == 'pk':
+                name = self.queryset.model._meta.pk.name
+            if not self._is_valid_key(name):
+                return None
+            keys.append((name, descending))
+            if name == self.queryset.model._meta.pk.name:
+                # pk is unique, anything after that is irrelevant
+                break
+        else:
+            keys.append((self.queryset.model._meta.pk.name, False))
+        return keys
+
+    def _is_valid_key(self, name):
+        """
+        Check that name is an annotation or a field, possibly across to-one
+        relations
+        """
+        if name in self.queryset.query.annotations:
+            return True
+
+        model = self.queryset.model
+        *path, field_name = name.split('__')
+        try:
+            for i in path:
+                field = model._meta.get_field(i)
+                if not (field.many_to_one or field.one_to_one):
+                    return False
+                model = field.related_model
+            field = model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            return False
+
+        if field.is_relation:
+            # ordering by a FK would apply the related model's ordering
+            return field.many_to_one and not field.related_model._meta.ordering
+        return True
+
+    @property
+    def key_hash(self):
+        """
+        Short fingerprint of the ordering
+
+        Included in the cursor so that cursors become invalid when the user
+        changes the sort order.
+        """
+        spec = ','.join(
+            ('-' if desc else '') + name for name, desc in self.keys
+        )
+        return format(crc32(spec.encode()), 'x')
+
+    def make_cursor(self, direction, record):
+        """
+        Make the cursor string pointing just before or after the given record
+        """
+        # cursor values must not contain commas, see parse_query_string_csv
+        return f'{direction}.{record.pk}.{self.key_hash}'
+
+    def parse_cursor(self):
+        """
+        Return (direction, pk) tuple from cursor, or None if invalid or stale
+        """
+        if not self.cursor or self.keys is None:
+            return None
+        try:
+            direction, pk, key_hash = self.cursor.split('.')
+        except ValueError:
+            return None
+        if direction not in (AFTER, BEFORE) or key_hash != self.key_hash:
+            return None
+        return direction, pk
+
+    @staticmethod
+    def _ordering(keys):
+        """
+        Get order_by() arguments, with NULLs always sorting as smallest values
+
+        The NULL placement is made explicit so that the keyset filter works
+        the same way for both SQLite and PostgreSQL.
+        """
+        return [
+            F(name).desc(nulls_last=True) if desc
+            else F(name).asc(nulls_first=True)
+            for name, desc in keys
+        ]
+
+    @staticmethod
+    def _keyset_filter(keys, values):
+        """
+        Get Q object selecting rows strictly following the given key values
+        """
+        q = Q()
+        equal = Q()
+        for (name, desc), value in zip(keys, values):
+            if value is None:
+                if desc:
+                    # nothing follows NULL in descending order
+                    after = None
+                else:
+                    after = Q(**{name + '__isnull': False})
+                same = Q(**{name + '__isnull': True})
+            else:
+                if desc:
+                    after = (Q(**{name + '__lt': value})
+                             | Q(**{name + '__isnull': True}))
+                else:
+                    after = Q(**{name + '__gt': value})
+                same = Q(**{name: value})
+
+            if after is not None:
+                q |= equal & after
+            equal &= same
+        return q
+
+    def page(self, number):
+        number = self.validate_number(number or 1)
+        cursor = self.parse_cursor()
+        if cursor is None or number == 1:
+            return self._offset_page(number)
+
+        direction, pk = cursor
+        keys = self.keys
+        key_names = [name for name, _ in keys]
+        try:
+            values = self.queryset.filter(pk=pk).values_list(*key_names).get()
+        except (self.queryset.model.DoesNotExist, ValueError):
+            # record is gone or filtered out, fall back to offset
+            log.debug(f'stale cursor: {self.cursor}')
+            return self._offset_page(number)
+
+        if direction == BEFORE:
+            keys = [(name, not desc) for name, desc in keys]
+
+        qs = self.queryset.order_by(*self._ordering(keys))
+        qs = qs.filter(self._keyset_filter(keys, values))
+        objects = list(qs[:self.per_page + 1])
+
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+
+        if direction == BEFORE:
+            objects.reverse()
+            has_next = True
+            if not has_more:
+                # we're at the beginning after all
+                number = 1
+        else:
+            has_next = has_more
+
+        return self._keyset_page(objects, number, has_next=has_next)
+
+    def _offset_page(self, number):
+        """
+        Get page the LazyPaginator way, via offset
+        """
+        if self.keys is None:
+            page = super().page(number)
+            objects = [
+                i.record if isinstance(i, BoundRow) else i
+                for i in page.object_list
+            ]
+            return self._keyset_page(objects, number, has_next=page.has_next())
+
+        # use same NULL ordering as for the keyset pages
+        qs = self.queryset.order_by(*self._ordering(self.keys))
+        bottom = (number - 1) * self.per_page
+        objects = list(qs[bottom:bottom + self.per_page + 1])
+        if not objects and number > 1:
+            raise EmptyPage('That page contains no results')
+        has_next = len(objects) > self.per_page
+        return self._keyset_page(objects[:self.per_page], number, has_next)
+
+    def _keyset_page(self, objects, number, has_next):
+        """
+        Wrap up a page, set cursors and number of pages
+        """
+        if has_next:
+            self._num_pages = number + 1
+            self._final_num_pages = None
+        else:
+            self._num_pages = number
+            self._final_num_pages = number
+
+        next_cursor = previous_cursor = None
+        if self.keys is not None and objects:
+            next_cursor = self.make_cursor(AFTER, objects[-1])
+            previous_cursor = self.make_cursor(BEFORE, objects[0])
+
+        if isinstance(self.object_list, BoundRows):
+            objects = BoundRows(data=objects, table=self.object_list.table)
+
+        return KeysetPage(
+            objects,
+            number,
+            self,
+            has_next=has_next,
+            next_cursor=next_cursor,
+            previous_cursor=previous_cursor,
+        )
+
+    @property
+    def estimated_count(self):
+        """
+        Estimated (or exact, depending on count mode) total number of rows
+
+        Is None if no estimate is available.
+        """
+        if self._estimated_count is None and self.queryset is not None:
+            qs = self.queryset
+            if self.count_mode == 'auto' and hasattr(qs, 'approximate_count'):
+                self._estimated_count = qs.approximate_count()
+            elif self.count_mode in ('exact', 'auto'):
+                if hasattr(qs, 'cached_count'):
+                    self._estimated_count = qs.cached_count()
+                else:
+                    self._estimated_count = qs.count()
+            elif hasattr(qs, 'estimated_count'):
+                self._estimated_count = qs.estimated_count()
+        return self._estimated_count
+
+    @property
+    def estimated_num_pages(self):
+        """
+        Estimated total number of pages or None if unknown
+        """
+        count = self.estimated_count
+        if count is None:
+            return None
+        num_pages = max(1, -(-count // self.per_page))
+        # the estimate can be off, but must be consistent with what we know
+        if self._final_num_pages is not None:
+            return self._final_num_pages
+        return max(num_pages, self._num_pages or 1)
@@ -1,8 +1,10 @@
 from django.core.cache import caches
-from django.db.models.signals import post_save
+from django.core.signals import request_finished
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
 
+from .models import ChangeRecord, DataVersion, Snapshot, natural_map_cache
 from .utils import getLogger
 
 
@@ -22,3 +24,39 @@ def clear_cache_on_save(sender, **kwargs):
     if c._cache:
         log.debug(f'cache: clearing all {len(c._cache.keys())} entries')
         c.clear()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def clear_natural_map_cache_on_save(sender, **kwargs):
+    """
+    Drop cached natural values of the saved or deleted object's model
+
+    Changes made in bulk or by other processes are detected by the data
+    version, see NaturalMapCache.
+    """
+    natural_map_cache.clear(sender)
+
+
+@receiver(m2m_changed)
+def bump_data_version_on_m2m_change(sender, instance, action, model,
+                                    **kwargs):
+    """
+    Bump the data version of both sides of a changed many-to-many relation
+
+    Adding to or removing from a relation does not save the objects, but may
+    e.g. change what the curation filters let through.  Links to change
+    records, added with each save, are not data changes.
+    """
+    if model is ChangeRecord or isinstance(instance, ChangeRecord):
+        return
+    if action.startswith('post_'):
+        DataVersion.bump(type(instance), model)
+
+
+@receiver(request_finished)
+def close_evicted_snapshot_connections(sender, **kwargs):
+    """
+    Close this thread's connections to evicted snapshot databases
+    """
+    Snapshot.close_evicted_connections()
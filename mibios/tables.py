@@ -1,11 +1,18 @@
+from itertools import islice
 import re
 
-from django.db.models import DecimalField
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import DecimalField, QuerySet
+from django.db.models.query import ModelIterable
+from django.template.defaultfilters import date as date_filter
 from django.urls import reverse
 from django.utils.functional import cached_property
+from django.utils.encoding import force_str
 from django.utils.html import format_html
+from django.utils.timezone import template_localtime
 
 import django_tables2 as tables
+from django_tables2.rows import BoundRow
 
 from .models import ChangeRecord, Snapshot
 from .utils import getLogger
@@ -16,6 +23,7 @@ log = getLogger('mibios')
 
 NONE_LOOKUP = 'NULL'
 ORDER_BY_FIELD = 'sort'
+EXPORT_CHUNK_SIZE = 2000
 
 
 class GroupColumn(tables.Column):
@@ -395,6 +403,220 @@ def table_factory(model=None, field_names=[], conf=None,
     return type(name, (parent, ), opts)
 
 
+def _has_plain_queryset(table):
+    """
+    Helper for iter_values() to tell if the table's data is a queryset of
+    model objects that can be further filtered
+    """
+    qs = table.data.data
+    return (
+        isinstance(qs, QuerySet)
+        and qs._iterable_class is ModelIterable
+        and not qs.query.is_sliced
+    )
+
+
+def _get_export_column_spec(table, bound_column):
+    """
+    Helper for iter_values() to get how to retrieve a column's values
+
+    Returns a tuple (lookup, convert, related) or None if the column's values
+    can not be gotten straight from the database.  convert is None or a
+    function applied to each value to get the same as the column's value().
+    related is None or a tuple (model, attr) indicating that the values are
+    primary keys of model objects to be replaced by their str() or, if attr is
+    given, by that attribute.
+    """
+    column = bound_column.column
+    name = bound_column.name
+    if hasattr(table, 'render_' + name) or hasattr(table, 'value_' + name):
+        return None
+
+    if type(column) in (tables.Column, DecimalColumn):
+        convert = None
+    elif type(column) is tables.BooleanColumn:
+        def convert(value):
+            return str(bool(value))
+    elif type(column) in (tables.DateColumn, tables.DateTimeColumn):
+        fmt = re.search(r'date:"([^"]*)"', column.template_code).group(1)
+        default = bound_column.default
+
+        def convert(value):
+            if value is None:
+                return default
+            return date_filter(template_localtime(value), fmt) or default
+    else:
+        # e.g. template or m2m columns, anything with custom rendering
+        return None
+
+    model = table.data.data.model
+    path = str(bound_column.accessor).replace('.', '__').split('__')
+    *rels, last = path
+    try:
+        for i in rels:
+            field = model._meta.get_field(i)
+            if not (field.many_to_one or field.one_to_one):
+                return None
+            model = field.related_model
+    except FieldDoesNotExist:
+        return None
+
+    try:
+        field = model._meta.get_field(last)
+    except FieldDoesNotExist:
+        if last in ('name', 'natural') and hasattr(model, 'natural') \
+                and convert is None:
+            # the natural property
+            return ('__'.join(rels + ['pk']), None, (model, 'natural'))
+        return None
+
+    if not field.concrete or field.many_to_many:
+        return None
+
+    lookup = '__'.join(path)
+    if field.many_to_one or field.one_to_one:
+        if convert is not None:
+            return None
+        return (lookup, None, (field.related_model, None))
+
+    if field.choices and convert is None:
+        choices = dict(field.flatchoices)
+
+        def convert(value):
+            return choices.get(value, value)
+
+    return (lookup, convert, None)
+
+
+def iter_values(table, chunk_size=EXPORT_CHUNK_SIZE, raw=False):
+    """
+    Stream a table's data as rows of values, like Table.as_values()
+
+    Table.as_values() instantiates every row's model object and renders each
+    cell via the column machinery.  Here, the data are retrieved via
+    values_list() in chunks and related objects and natural values are
+    looked up in one query per chunk and column.  Columns which can't be done
+    this way, e.g. because they are rendered via a template, are rendered from
+    the model objects, retrieved with one query per chunk.  If the table's
+    data is not a plain queryset, then this falls back to Table.as_values().
+
+    The first row yielded contains the column headers.
+
+    :param bool raw: If True, then values are returned as they come from the
+                     database, e.g. booleans, dates, or numbers, without the
+                     conversion to what the columns would display.  Related
+                     objects are still replaced by their str() or natural
+                     value.  For typed export formats.
+    """
+    qs = table.data.data
+    columns = [
+        i for i in table.columns.iterall()
+        if not i.column.exclude_from_export
+    ]
+
+    if not _has_plain_queryset(table):
+        log.debug('export: falling back to Table.as_values()')
+        yield from table.as_values()
+        return
+
+    specs = [_get_export_column_spec(table, i) for i in columns]
+    # columns rendered from the objects, for these values_list() gets the pk
+    rendered = [num for num, spec in enumerate(specs) if spec is None]
+    specs = [
+        ('pk', None, None) if spec is None else spec
+        for spec in specs
+    ]
+
+    yield [force_str(i.header, strings_only=True) for i in columns]
+
+    # like as_values() give None for empty values and convert the others
+    converters = [
+        (num, i.column.empty_values, convert)
+        for num, (i, (_, convert, _)) in enumerate(zip(columns, specs))
+        if not raw and num not in rendered
+    ]
+    rows = qs.values_list(*[lookup for lookup, _, _ in specs])
+    rows = rows.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        objs = {}
+        if rendered:
+            pks = [row[rendered[0]] for row in chunk]
+            objs = {i.pk: i for i in qs.filter(pk__in=pks).order_by()}
+
+        mappings = []
+        for num, (_, _, related) in enumerate(specs):
+            if related is None:
+                continue
+            model, attr = related
+            pks = set((row[num] for row in chunk))
+            pks.discard(None)
+            objs = model._base_manager.in_bulk(pks)
+            if attr is None:
+                mapping = {k: str(v) for k, v in objs.items()}
+            else:
+                mapping = {
+                    k: force_str(getattr(v, attr), strings_only=True)
+                    for k, v in objs.items()
+                }
+            mappings.append((num, mapping))
+
+        for row in chunk:
+            row = list(row)
+            if rendered:
+                bound_row = BoundRow(objs[row[rendered[0]]], table=table)
+                for num in rendered:
+                    row[num] = force_str(
+                        bound_row.get_cell_value(columns[num].name),
+                        strings_only=True,
+                    )
+            for num, mapping in mappings:
+                if row[num] is not None:
+                    row[num] = mapping.get(row[num], row[num])
+            for num, empty_values, convert in converters:
+                if row[num] in empty_values:
+                    row[num] = None
+                elif convert is not None:
+                    row[num] = convert(row[num])
+            yield row
+
+
+def get_export_fields(table):
+    """
+    Get the model fields corresponding to the values from iter_values()
+
+    Returns a list with a field for each exported column whose raw values are
+    those of a model field.  For columns with str values, e.g. related
+    objects or rendered columns, the list has None.  Returns None if
+    iter_values() would fall back to Table.as_values().
+    """
+    if not _has_plain_queryset(table):
+        return None
+    qs = table.data.data
+
+    fields = []
+    for i in table.columns.iterall():
+        if i.column.exclude_from_export:
+            continue
+        spec = _get_export_column_spec(table, i)
+        if spec is None:
+            fields.append(None)
+            continue
+        lookup, _, related = spec
+        if related is None:
+            model = qs.model
+            for name in lookup.split('__'):
+                field = model._meta.get_field(name)
+                model = field.related_model
+            fields.append(field)
+        else:
+            fields.append(None)
+    return fields
+
+
 class HistoryTable(tables.Table):
     changes = DiffColumn()
     record_pk = tables.Column(verbose_name='PK')
@@ -475,6 +697,11 @@ class DetailedHistoryTable(HistoryTable):
         )
         exclude = ('record_pk',)
 
+    def before_render(self, request):
+        # get the diffs for the displayed changes all at once
+        rows = self.page.object_list if hasattr(self, 'page') else self.rows
+        ChangeRecord.add_diffs([i.record for i in rows])
+
     def render_comment(self, value, record):
         if value:
             return value
@@ -515,3 +742,18 @@ class SnapshotTableColumn(tables.Column):
             )
         super().__init__(self, linkify=linkify, **kwargs)
         self.verbose_name = 'available tables'
+
+
+class SnapshotTableData(tables.data.TableQuerysetData):
+    """
+    Table data container for a snapshot table
+
+    Lets django_tables2 count, order, and slice the data via SQL, like a
+    queryset.  The data must be a mibios.models.SnapshotTable.
+    """
+    verbose_name = 'row'
+    verbose_name_plural = 'rows'
+
+    @property
+    def ordering(self):
+        return self.data.ordering
@@ -1,3 +1,507 @@
-from django.test import TestCase
+from io import BytesIO
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from zipfile import ZipFile
+from time import perf_counter
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+import django_tables2 as tables
+
+from mibios import get_registry, models as mibios_models
+from mibios.data import DataConfig, classify_search_term
+from mibios.load import Loader
+from mibios.models import (ChangeRecord, ChangeRecordBatch, TagNote,
+                           clear_introspection_cache)
+from mibios.pagination import KeysetPaginator
+from mibios.tables import iter_values
+from mibios.utils import getLogger
+from mibios.views import (CSVTabRendererZipped, ExportMixin,
+                          TextRendererZipped)
+
+
+log = getLogger(__name__)
+
+
+class BulkHistoryTests(TestCase):
+    """
+    The bulk history mode of the Loader should record the same history as the
+    row-by-row mode
+    """
+    def load(self, text, **kwargs):
+        file = BytesIO(text.encode())
+        file.name = 'tagnotes.tsv'
+        return Loader.load_file(file, data_name='tagnote', sep='\t', **kwargs)
+
+    def get_history(self):
+        qs = ChangeRecord.objects.filter(record_type__model='tagnote')
+        history = []
+        for i in qs:
+            fields = i.fields_as_dict()
+            del fields['pk']
+            history.append((i.record_natural, i.is_created, i.is_delta,
+                            i.line, sorted(fields.items())))
+        return sorted(history)
+
+    def run_imports(self, bulk_history):
+        header = 'name\ttag\ttext\n'
+        self.load(
+            header + ''.join(f'n{i}\tinfo\tt{i}\n' for i in range(30)),
+            bulk_history=bulk_history,
+        )
+        # change every third, add some, and an unchanged duplicate row
+        self.load(
+            header
+            + ''.join(f'n{i}\tinfo\tt{i}{"x" if i % 3 else ""}\n'
+                      for i in range(40))
+            + 'n1\tinfo\tt1x\n',
+            bulk_history=bulk_history,
+            can_overwrite=True,
+            warn_on_error=True,
+        )
+        history = self.get_history()
+        TagNote.objects.all().delete()
+        ChangeRecord.objects.all().delete()
+        return history
+
+    def test_same_history(self):
+        self.assertEqual(
+            self.run_imports(bulk_history=False),
+            self.run_imports(bulk_history=True),
+        )
+
+    def test_no_savepoint_per_row(self):
+        rows = ''.join(f'n{i}\tinfo\tt{i}\n' for i in range(30))
+        with CaptureQueriesContext(connection) as ctx:
+            self.load('name\ttag\ttext\n' + rows, bulk_history=True)
+        savepoints = [i for i in ctx.captured_queries
+                      if i['sql'].startswith('SAVEPOINT')]
+        self.assertLess(len(savepoints), 5)
+        self.assertEqual(TagNote.objects.count(), 30)
+
+    def test_add_bulk(self):
+        objs = [TagNote(name=f'n{i}', text=f't{i}') for i in range(5)]
+        batch = ChangeRecordBatch()
+        for i in objs:
+            i.add_change_record(comment='bulk', batch=batch)
+        TagNote.objects.bulk_create(objs)
+        pks = dict(TagNote.objects.values_list('name', 'pk'))
+        for i in objs:
+            i.pk = pks[i.name]
+        batch.add_bulk(objs)
+        self.assertEqual(batch.flush(), 5)
+        for i in objs:
+            change = i.history.get()
+            self.assertTrue(change.is_created)
+            self.assertEqual(change.comment, 'bulk')
+            self.assertEqual(change.fields_as_dict()['text'], i.text)
+
+
+class DeltaHistoryTests(TestCase):
+    """
+    Test change records storing deltas
+    """
+    def test_deltas(self):
+        obj = TagNote.objects.create(name='a', text='0')
+        texts = ['0']
+        for i in range(1, 2 * ChangeRecord.FULL_INTERVAL + 5):
+            obj.text = str(i)
+            obj.save()
+            texts.append(str(i))
+        # unchanged
+        obj.save()
+
+        changes = list(obj.history.order_by('timestamp', 'pk'))
+        self.assertEqual(len(changes), len(texts))
+        self.assertEqual(
+            [i for i, j in enumerate(changes) if not j.is_delta],
+            [0, ChangeRecord.FULL_INTERVAL, 2 * ChangeRecord.FULL_INTERVAL],
+        )
+        self.assertEqual(
+            [i.fields_as_dict()['text'] for i in changes],
+            texts,
+        )
+
+        expected = [i.diff_to(i.get_predecessor()) for i in changes]
+        self.assertEqual(expected[3], {'text': ('2', '3')})
+        ChangeRecord.add_diffs(changes)
+        self.assertEqual([i.diff() for i in changes], expected)
+
+    def test_latest_state(self):
+        obj = TagNote.objects.create(name='a', text='0')
+        for i in range(1, 2 * ChangeRecord.FULL_INTERVAL + 5):
+            obj.text = str(i)
+            obj.save()
+        record_type = obj.history.first().record_type
+
+        with CaptureQueriesContext(connection) as ctx:
+            state = ChangeRecord.get_latest_state(record_type, [obj.pk])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        natural, fields, depth = state[obj.pk]
+        self.assertEqual(fields['text'], obj.text)
+        self.assertEqual(depth, 4)
+
+        # only the changes since the last full serialization are fetched
+        with connection.cursor() as cur:
+            cur.execute(ctx.captured_queries[0]['sql'])
+            self.assertEqual(len(cur.fetchall()), depth + 1)
+
+
+class FieldStatsTests(TestCase):
+    """
+    Test the cached field stats
+    """
+    def test_bulk_update(self):
+        TagNote.objects.bulk_create(
+            [TagNote(name=f'n{i}', text='a') for i in range(3)]
+        )
+        qs = TagNote.objects.all()
+        self.assertEqual(qs.get_field_stats('text')['uniform'], {'a': 3})
+        TagNote.objects.filter(name='n0').update(text='b')
+        stats = TagNote.objects.all().get_field_stats('text')
+        self.assertEqual(stats['choice_counts'].to_dict(), {'a': 2, 'b': 1})
+        self.assertEqual(
+            TagNote.objects.none().get_field_stats('text')['choice_counts']
+            .to_dict(),
+            {},
+        )
+
+
+class CountTests(TestCase):
+    """
+    Test the cached and approximate counts
+    """
+    def setUp(self):
+        TagNote.objects.bulk_create(
+            [TagNote(name=f'n{i}', text=f't{i % 2}') for i in range(10)]
+        )
+
+    def test_cached_count(self):
+        qs = TagNote.objects.filter(text='t0')
+        self.assertEqual(qs.cached_count(), 5)
+        TagNote.objects.bulk_create([TagNote(name='new', text='t0')])
+        self.assertEqual(qs.cached_count(), 6)
+        self.assertEqual(TagNote.objects.none().cached_count(), 0)
+        self.assertNotEqual(
+            TagNote.objects.none()._get_count_query_hash(),
+            ChangeRecord.objects.none()._get_count_query_hash(),
+        )
+
+    @skipUnless(connection.vendor == 'sqlite', 'uses sqlite_stat1')
+    def test_approximate_count(self):
+        qs = TagNote.objects.all()
+        self.assertEqual(qs.approximate_count(), 10)
+        with connection.cursor() as cur:
+            cur.execute('ANALYZE')
+        self.assertEqual(qs.estimated_count(), 10)
+        self.assertIsNone(qs.filter(text='t0').estimated_count())
+
+        with patch.object(type(qs), 'APPROXIMATE_COUNT_THRESHOLD', 5):
+            # above threshold: the estimate, if any
+            self.assertEqual(qs.approximate_count(), 10)
+            self.assertIsNone(qs.filter(text='t0').approximate_count())
+        with patch.object(type(qs), 'APPROXIMATE_COUNT_THRESHOLD', 100):
+            self.assertEqual(qs.filter(text='t0').approximate_count(), 5)
+
+
+class NaturalMapTests(TestCase):
+    """
+    Test the natural map cache
+    """
+    def test_bulk_update(self):
+        obj = TagNote.objects.create(name='a', text='x')
+        self.assertEqual(TagNote.get_natural_map([obj.pk]), {obj.pk: 'a'})
+        TagNote.objects.filter(pk=obj.pk).update(name='b')
+        self.assertEqual(TagNote.get_natural_map([obj.pk]), {obj.pk: 'b'})
+        TagNote.objects.filter(pk=obj.pk).delete()
+        self.assertEqual(TagNote.get_natural_map([obj.pk]), {})
+
+
+class KeysetPaginatorTests(TestCase):
+    """
+    Test keyset pagination over keys with NULLs and duplicate values
+    """
+    def setUp(self):
+        ChangeRecord.objects.bulk_create([
+            ChangeRecord(
+                line=None if i % 5 == 0 else i % 7,
+                comment='abc'[i % 3],
+            )
+            for i in range(53)
+        ])
+
+    def walk(self, qs, per_page=10):
+        """
+        Go forward via next cursors, then back via previous cursors
+        """
+        pages = []
+        cursor = None
+        number = 1
+        while True:
+            page = KeysetPaginator(qs, per_page, cursor=cursor).page(number)
+            pages.append([i.pk for i in page.object_list])
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+            number += 1
+
+        back = [pages[-1]]
+        while number > 1:
+            cursor = page.previous_cursor
+            number -= 1
+            page = KeysetPaginator(qs, per_page, cursor=cursor).page(number)
+            back.insert(0, [i.pk for i in page.object_list])
+        return pages, back
+
+    def test_pages(self):
+        for ordering in (['line'], ['-line'], ['-comment', 'line'], ['pk']):
+            with self.subTest(ordering=ordering):
+                qs = ChangeRecord.objects.order_by(*ordering)
+                paginator = KeysetPaginator(qs, 10)
+                expected = list(
+                    qs.order_by(*paginator._ordering(paginator.keys))
+                    .values_list('pk', flat=True)
+                )
+                pages, back = self.walk(qs)
+                self.assertEqual(len(pages), 6)
+                self.assertEqual(sum(pages, []), expected)
+                self.assertEqual(back, pages)
+
+
+class SearchTests(TestCase):
+    """
+    Test search term classification and lookups
+    """
+    def test_classify(self):
+        cases = [
+            ('foo', ('substring', 'foo')),
+            ('^foo', ('prefix', 'foo')),
+            ('foo$', ('suffix', 'foo')),
+            ('^foo$', ('exact', 'foo')),
+            (r'^f\.o\$', ('prefix', 'f.o$')),
+            ('f.o', ('regex', 'f.o')),
+            ('^fo+$', ('regex', '^fo+$')),
+            ('a|b', ('regex', 'a|b')),
+            (r'\d', ('regex', r'\d')),
+            ('fo$o', ('regex', 'fo$o')),
+        ]
+        for term, expected in cases:
+            with self.subTest(term=term):
+                self.assertEqual(classify_search_term(term), expected)
+
+    def test_search(self):
+        for i in ['abc', 'ABCD', 'xabc', 'a.c']:
+            TagNote.objects.create(name=i)
+
+        conf = DataConfig('tagnote')
+        cases = [
+            ('abc', ['ABCD', 'abc', 'xabc']),
+            ('^abc', ['ABCD', 'abc']),
+            ('^abc$', ['abc']),
+            ('c$', ['a.c', 'abc', 'xabc']),
+            (r'a\.c', ['a.c']),
+            ('a.c', ['ABCD', 'a.c', 'abc', 'xabc']),
+        ]
+        for term, expected in cases:
+            with self.subTest(term=term):
+                _, f = conf._search('name', [term])
+                qs = TagNote.objects.filter(**f).order_by('name')
+                self.assertEqual(list(qs.values_list('name', flat=True)),
+                                 expected)
+
+        for i in ['12-3', '12_3', '123', '12%3', '12\U0010ffff']:
+            TagNote.objects.create(name=i)
+        TagNote.search_index_fields = ('name',)
+        try:
+            cases = [
+                ('^abc', ['ABCD', 'abc'], 'name__istartswith'),
+                ('^abc$', ['abc'], 'name__iexact'),
+                ('^12-', ['12-3'], 'name__istartswith'),
+                ('^12_', ['12_3'], 'name__istartswith'),
+                ('^12%', ['12%3'], 'name__istartswith'),
+                ('^12-3$', ['12-3'], 'name'),
+                ('^12\U0010ffff', ['12\U0010ffff'], 'name__istartswith'),
+            ]
+            for term, expected, lookup in cases:
+                with self.subTest(term=term, indexed=True):
+                    _, f = conf._search('name', [term])
+                    self.assertIn(lookup, f)
+                    qs = TagNote.objects.filter(**f).order_by('name')
+                    self.assertEqual(
+                        list(qs.values_list('name', flat=True)),
+                        expected,
+                    )
+        finally:
+            del TagNote.search_index_fields
+
+
+class IterValuesTests(TestCase):
+    """
+    Test streaming table data for export
+    """
+    def test_custom_column(self):
+        class NoteTable(tables.Table):
+            class Meta:
+                model = TagNote
+                fields = ['name', 'tag', 'text']
+
+            def render_text(self, value):
+                return value.upper()
+
+        for i in range(5):
+            TagNote.objects.create(name=f'n{i}', text=f't{i}')
+        table = NoteTable(TagNote.objects.order_by('name'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            rows = list(iter_values(table, chunk_size=2))
+        self.assertEqual(rows, list(table.as_values()))
+        self.assertEqual(rows[1], ['n0', 'info', 'T0'])
+        # one values_list() query, and per chunk one for the rendered column
+        self.assertEqual(len(ctx.captured_queries), 1 + 3)
+
+
+class IntrospectionCacheTests(TestCase):
+    """
+    Test memoized Model introspection
+    """
+    def introspect(self, model):
+        return [
+            model.get_fields(),
+            model.get_fields(with_m2m=True, with_reverse=True),
+            model.get_related_accessors(),
+            model.get_related_fields(),
+            model.get_related_objects(),
+            model.get_average_fields(),
+            model.resolve_natural_lookups(*model.get_related_accessors()),
+        ]
+
+    def test_cache(self):
+        clear_introspection_cache()
+        for model in get_registry().get_models():
+            expected = self.introspect(model)
+            cached = self.introspect(model)
+            self.assertEqual(cached, expected)
+
+            # modifying returned lists must not affect the cache
+            cached[0].names.append('foo')
+            cached[2].clear()
+            self.assertEqual(self.introspect(model), expected)
+
+            apps.clear_cache()
+            self.assertEqual(self.introspect(model), expected)
+
+        self.assertEqual(
+            TagNote.resolve_natural_lookups(natural='foo', text='bar'),
+            {'name': 'foo', 'text': 'bar'},
+        )
+
+    @skipUnless(os.environ.get('MIBIOS_BENCHMARK'), 'benchmark')
+    @override_settings(ROOT_URLCONF='mibios.urls')
+    def test_table_view_benchmark(self):
+        """
+        Compare table view request times with and without the cache
+        """
+        user = User.objects.create(username='bench')
+        # the model with the most fields and relations
+        model = max(get_registry().get_models(),
+                    key=lambda x: len(x.get_related_accessors()))
+        url = reverse('table', kwargs=dict(data_name=model._meta.model_name))
+        view = resolve(url)
+        request = RequestFactory().get(url, {'nocache': ''})
+        request.user = user
+
+        def run(num, enabled):
+            """ get best request time in ms """
+            mibios_models.INTROSPECTION_CACHE_ENABLED = enabled
+            times = []
+            try:
+                for _ in range(num):
+                    start = perf_counter()
+                    view.func(request, *view.args, **view.kwargs).render()
+                    times.append(perf_counter() - start)
+            finally:
+                mibios_models.INTROSPECTION_CACHE_ENABLED = True
+            return min(times) * 1000
+
+        run(1, enabled=True)
+        log.info(f'{model._meta.model_name} table view: '
+                 f'{run(30, enabled=False):.1f} ms without cache, '
+                 f'{run(30, enabled=True):.1f} ms with cache')
+
+
+class FileResponseTests(TestCase):
+    """
+    Test downloads of existing files with byte ranges
+    """
+    def get(self, path, byte_range=None):
+        headers = {}
+        if byte_range is not None:
+            headers['HTTP_RANGE'] = byte_range
+        view = ExportMixin()
+        view.request = RequestFactory().get('/', **headers)
+        response = view.get_file_response(path, 'data.zip', 'application/zip')
+        if response.streaming:
+            content = b''.join(response.streaming_content)
+        else:
+            content = response.content
+        response.close()
+        return response, content
+
+    def test_ranges(self):
+        with TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'data.zip'
+            path.write_bytes(b'0123456789')
+
+            response, content = self.get(path)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(content, b'0123456789')
+            self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+            cases = [
+                ('bytes=2-4', b'234', 'bytes 2-4/10'),
+                ('bytes=7-', b'789', 'bytes 7-9/10'),
+                ('bytes=-2', b'89', 'bytes 8-9/10'),
+                ('bytes=8-20', b'89', 'bytes 8-9/10'),
+            ]
+            for byte_range, expected, content_range in cases:
+                with self.subTest(byte_range=byte_range):
+                    response, content = self.get(path, byte_range)
+                    self.assertEqual(response.status_code, 206)
+                    self.assertEqual(content, expected)
+                    self.assertEqual(response['Content-Range'],
+                                     content_range)
+
+            response, _ = self.get(path, 'bytes=10-')
+            self.assertEqual(response.status_code, 416)
+            # multiple ranges are not supported, get whole file
+            response, content = self.get(path, 'bytes=0-1,4-5')
+            self.assertEqual(content, b'0123456789')
+
+
+class ZipRendererTests(TestCase):
+    """
+    Test the streaming zip renderers
+    """
+    def render(self, Renderer, values):
+        response = StreamingHttpResponse()
+        Renderer(response, filename='data.txt.zip').render(values)
+        return ZipFile(BytesIO(b''.join(response.streaming_content)))
+
+    def test_text(self):
+        lines = [f'>seq{i}\nACGT{i}\n' for i in range(20000)]
+        with self.render(TextRendererZipped, iter(lines)) as zf:
+            self.assertEqual(zf.namelist(), ['data.txt'])
+            self.assertEqual(zf.read('data.txt').decode(), ''.join(lines))
+
+    def test_csv(self):
+        rows = [['a', 'b'], [1, 2.5], ['x', None]]
+        with self.render(CSVTabRendererZipped, rows) as zf:
+            self.assertEqual(zf.read('data.txt'), b'a\tb\n1\t2.5\nx\t\n')
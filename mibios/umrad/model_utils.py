@@ -341,6 +341,22 @@ class Model(MibiosModel):
 
         raise LookupError(f'model {cls} has no unique/unique_together fields')
 
+    @classmethod
+    def get_search_index_fields(cls):
+        """
+        Get names of fields with an index usable for search
+
+        Unless search_index_fields is set, these are the unique or indexed
+        accession fields.
+        """
+        if cls.search_index_fields:
+            return cls.search_index_fields
+        try:
+            fields = cls.get_accession_fields()
+        except LookupError:
+            return ()
+        return tuple(i.name for i in fields if i.unique or i.db_index)
+
     @classmethod
     def get_accession_field_single(cls):
         """
@@ -1,8 +1,11 @@
 from collections import OrderedDict
 import csv
-from itertools import tee, zip_longest
+from importlib.util import find_spec
+from io import StringIO
+from itertools import islice
 from math import isnan
 from zipfile import ZipFile, ZIP_DEFLATED
+import zlib
 
 from django.apps import apps
 from django.conf import settings
@@ -11,8 +14,11 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import PermissionDenied
 from django.core.management import call_command
-from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.db import models
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
 from django.urls import reverse
+from django.utils.encoding import force_str
 from django.utils.html import format_html
 from django.views.decorators.cache import cache_page
 from django.views.generic.base import ContextMixin, TemplateView, View
@@ -22,7 +28,6 @@ from django_tables2 import (SingleTableMixin, SingleTableView, Column,
                             MultiTableMixin)
 
 from pandas import isna
-import zipstream
 
 from . import (__version__, QUERY_FORMAT, QUERY_AVG_BY,
                get_registry)
@@ -32,10 +37,13 @@ from .forms import (ExportForm, get_field_search_form, UploadFileForm,
 from .load import Loader
 from .management.import_base import AbstractImportCommand
 from .models import ChangeRecord, ImportFile, Snapshot
+from .pagination import KeysetPaginator
 from .tables import (DeletedHistoryTable, HistoryTable,
                      CompactHistoryTable, DetailedHistoryTable,
-                     SnapshotListTable, SnapshotTableColumn, Table,
-                     table_factory, ORDER_BY_FIELD)
+                     SnapshotListTable, SnapshotTableColumn,
+                     SnapshotTableData, Table,
+                     get_export_fields, iter_values, table_factory,
+                     ORDER_BY_FIELD)
 from .utils import get_db_connection_info, getLogger
 
 
@@ -316,9 +324,46 @@ class TableViewPlugin():
         return ctx
 
 
-class TableView(DatasetMixin, UserRequiredMixin, SingleTableView):
+class KeysetPaginationMixin:
+    """
+    Mixin for SingleTableMixin views to paginate via keyset cursors
+
+    Rather than counting all rows and skipping over previous pages via OFFSET
+    the next and previous pages are found via the ordering key values of the
+    last or first row of the current page.  The total number of pages is only
+    estimated, unless count_mode is set to 'exact' or 'auto', see
+    KeysetPaginator.
+    """
+    paginator_class = KeysetPaginator
+    cursor_field = 'cursor'
+    count_mode = 'estimate'
+    keyset_template_name = 'mibios/keyset_table.html'
+
+    def get_table_pagination(self, table):
+        paginate = super().get_table_pagination(table)
+        if paginate is False:
+            return False
+        if paginate is True:
+            paginate = {'paginator_class': self.paginator_class}
+        cursor_field = table.prefix + self.cursor_field
+        paginate.update(
+            cursor=self.request.GET.get(cursor_field),
+            cursor_field=cursor_field,
+            count_mode=self.count_mode,
+        )
+        return paginate
+
+    def get_table_kwargs(self):
+        kwargs = super().get_table_kwargs()
+        kwargs.setdefault('template_name', self.keyset_template_name)
+        return kwargs
+
+
+class TableView(KeysetPaginationMixin, DatasetMixin, UserRequiredMixin,
+                SingleTableView):
     template_name = 'mibios/table.html'
     config_class = TableConfig
+    count_mode = 'auto'
 
     # Tunables adjusting display varying on number of unique values:
     MEDIUM_UNIQUE_LIMIT = 10
@@ -531,22 +576,41 @@ class TableView(DatasetMixin, UserRequiredMixin, SingleTableView):
 
 
 class CSVRenderer():
+    """
+    Render rows of values as CSV to a streaming response
+
+    The response's streaming content is set to an iterator over chunks of
+    encoded CSV text, so rows are rendered as the response is consumed.
+    """
     description = 'comma-separated text file'
     content_type = 'text/csv'
     delimiter = ','
-    streaming = False
+    streaming = True
+    chunk_size = 64 * 1024  # approximate size of yielded chunks (bytes)
 
     def __init__(self, response, **kwargs):
         self.response = response
 
-    def render(self, values):
+    def _render(self, values):
         """
-        Render all rows to the response
+        Generate CSV text in chunks
         """
-        writer = csv.writer(self.response, delimiter=self.delimiter,
+        buf = StringIO()
+        writer = csv.writer(buf, delimiter=self.delimiter,
                             lineterminator='\n')
         for i in values:
             writer.writerow(i)
+            if buf.tell() >= self.chunk_size:
+                yield buf.getvalue().encode()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue().encode()
+
+    def render(self, values):
+        """
+        Set response's streaming content to rendered data
+        """
+        self.response.streaming_content = self._render(values)
 
 
 class CSVTabRenderer(CSVRenderer):
@@ -554,30 +618,75 @@ class CSVTabRenderer(CSVRenderer):
     delimiter = '\t'
 
 
-class CSVRendererZipped(CSVRenderer):
-    description = 'comma-separated text file, zipped'
+class CSVRendererGzipped(CSVRenderer):
+    description = 'comma-separated text file, gzipped'
+    content_type = 'application/gzip'
+    compresslevel = 6
+    """ zlib compression level, 0 (none) to 9 (best) """
+
+    def render(self, values):
+        """
+        Set response's streaming content to gzip-compressed data
+        """
+        self.response.streaming_content = self._compress(self._render(values))
+
+    def _compress(self, chunks):
+        # wbits=31 makes zlib write the gzip header and trailer
+        compressor = zlib.compressobj(self.compresslevel, wbits=31)
+        for i in chunks:
+            data = compressor.compress(i)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class CSVTabRendererGzipped(CSVRendererGzipped):
+    description = '<tab>-separated text file, gzipped'
+    delimiter = '\t'
+
+
+class ZipStreamMixin:
+    """
+    Stream the rendered data as single member of a zip archive
+
+    The archive is written with the zipfile module into a non-seekable sink,
+    which makes it put sizes and checksums into data descriptors after the
+    member's data.  So compressed chunks can be passed on to the response as
+    soon as the compressor emits them and memory use stays constant.
+    """
     content_type = 'application/zip'
     streaming = True
+    compresslevel = 6
+    """ zlib compression level, 0 (none) to 9 (best) """
 
     def __init__(self, response, filename):
         self.response = response
         self.filename = filename[:-len('.zip')]
 
-    def _render(self, values):
+    def _zip(self, chunks):
         """
-        render the csv
+        Generate the zip archive from the member's chunks of bytes
         """
-        for row in values:
-            yield b'\t'.join([str(i).encode() for i in row])
-            yield b'\n'
+        sink = _ChunkSink()
+        with ZipFile(sink, 'w', ZIP_DEFLATED,
+                     compresslevel=self.compresslevel) as zf:
+            with zf.open(self.filename, 'w', force_zip64=True) as f:
+                for i in chunks:
+                    f.write(i)
+                    data = sink.pop()
+                    if data:
+                        yield data
+        yield sink.pop()
+
+
+class CSVRendererZipped(ZipStreamMixin, CSVRenderer):
+    description = 'comma-separated text file, zipped'
 
     def render(self, values):
         """
         Set response's streaming content to rendered data
         """
-        z = zipstream.ZipFile(compression=ZIP_DEFLATED)
-        z.write_iter(self.filename, self._render(values))
-        self.response.streaming_content = z
+        self.response.streaming_content = self._zip(self._render(values))
 
 
 class CSVTabRendererZipped(CSVRendererZipped):
@@ -585,24 +694,182 @@ class CSVTabRendererZipped(CSVRendererZipped):
     delimiter = '\t'
 
 
-class TextRendererZipped():
-    description = 'zipped text file'
-    content_type = 'application/zip'
+class _ChunkSink:
+    """
+    Minimal writable file object collecting what gets written
 
-    def __init__(self, response, filename):
+    For writers that want a file, from which we take the written data in
+    chunks for a streaming response.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.pos = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def pop(self):
+        """ Return and remove data written so far """
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ArrowRenderer():
+    """
+    Abstract base for typed, columnar export formats via pyarrow
+
+    The rows are written in record batches.  If the model fields
+    corresponding to the columns are passed to render(), then the columns
+    get matching types, otherwise everything is exported as string.  Needs
+    the optional pyarrow package, the formats are only offered if it is
+    installed, see ARROW_FORMATS.
+    """
+    description = None
+    content_type = 'application/octet-stream'
+    streaming = True
+    typed = True
+    batch_size = 10000
+
+    def __init__(self, response, **kwargs):
         self.response = response
-        self.filename = filename[:-len('.zip')]
+
+    @staticmethod
+    def get_arrow_type(field):
+        """
+        Get the pyarrow data type and value conversion for a model field
+        """
+        import pyarrow as pa
+
+        if field is None or field.choices:
+            return pa.string(), str
+        if isinstance(field, models.BooleanField):
+            return pa.bool_(), bool
+        if isinstance(field, (models.IntegerField, models.AutoField)):
+            return pa.int64(), int
+        if isinstance(field, (models.FloatField, models.DecimalField)):
+            return pa.float64(), float
+        if isinstance(field, models.DateTimeField):
+            return pa.timestamp('us', tz='UTC' if settings.USE_TZ else None), None  # noqa: E501
+        if isinstance(field, models.DateField):
+            return pa.date32(), None
+        return pa.string(), str
+
+    def get_writer(self, sink, schema):
+        """
+        Return a writer for the format, with write_batch() and close()
+        """
+        raise NotImplementedError
+
+    def _render(self, values, fields):
+        import pyarrow as pa
+
+        values = iter(values)
+        header = [str(i) for i in next(values)]
+        if fields is None:
+            fields = [None] * len(header)
+        types = [self.get_arrow_type(i) for i in fields]
+        schema = pa.schema([
+            (name, pa_type) for name, (pa_type, _) in zip(header, types)
+        ])
+
+        sink = _ChunkSink()
+        writer = self.get_writer(sink, schema)
+        while True:
+            rows = list(islice(values, self.batch_size))
+            if not rows:
+                break
+            arrays = []
+            for col, (pa_type, conv) in zip(zip(*rows), types):
+                if conv is not None:
+                    col = [None if i is None else conv(i) for i in col]
+                arrays.append(pa.array(col, type=pa_type))
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))  # noqa: E501
+            yield sink.pop()
+        writer.close()
+        yield sink.pop()
+
+    def render(self, values, fields=None):
+        """
+        Set response's streaming content to rendered data
+
+        :param values: Iterable over rows, the first row has the column names
+        :param list fields: Model fields or None corresponding to the columns
+        """
+        self.response.streaming_content = self._render(values, fields)
+
+
+class ParquetRenderer(ArrowRenderer):
+    description = 'Parquet file (typed, columnar, compressed)'
+    content_type = 'application/vnd.apache.parquet'
+
+    def get_writer(self, sink, schema):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(sink, schema)
+
+
+class ArrowIPCRenderer(ArrowRenderer):
+    description = 'Arrow IPC / Feather v2 file (typed, columnar)'
+    content_type = 'application/vnd.apache.arrow.file'
+
+    def get_writer(self, sink, schema):
+        import pyarrow as pa
+        return pa.ipc.new_file(sink, schema)
+
+
+ARROW_FORMATS = (
+    ('parquet', '.parquet', ParquetRenderer),
+    ('arrow', '.arrow', ArrowIPCRenderer),
+) if find_spec('pyarrow') else ()
+""" Typed export formats, available if pyarrow is installed """
+
+
+class TextRendererZipped(ZipStreamMixin):
+    description = 'zipped text file'
+    chunk_size = 64 * 1024  # approximate size of uncompressed chunks (bytes)
+
+    def _render(self, values):
+        """
+        Encode lines and join them into chunks
+        """
+        chunk = []
+        size = 0
+        for line in values:
+            data = line.encode()
+            chunk.append(data)
+            size += len(data)
+            if size >= self.chunk_size:
+                yield b''.join(chunk)
+                chunk = []
+                size = 0
+        yield b''.join(chunk)
 
     def render(self, values):
         """
-        Render all rows to the response
+        Set response's streaming content to the zipped text
 
         :param values: An iterator over str lines ending with a newline.
         """
-        with ZipFile(self.response, 'w', ZIP_DEFLATED) as z:
-            with z.open(self.filename, 'w') as f:
-                for line in values:
-                    f.write(line.encode())
+        self.response.streaming_content = self._zip(self._render(values))
 
 
 class ExportBaseMixin:
@@ -613,7 +880,9 @@ class ExportBaseMixin:
         ('tab', '.csv', CSVTabRenderer),
         ('comma/zipped', '.csv.zip', CSVRendererZipped),
         ('tab/zipped', '.csv.zip', CSVTabRendererZipped),
-    )
+        ('comma/gzipped', '.csv.gz', CSVRendererGzipped),
+        ('tab/gzipped', '.csv.gz', CSVTabRendererGzipped),
+    ) + ARROW_FORMATS
     DEFAULT_FORMAT = 'csv'
 
     def get_format(self):
@@ -634,6 +903,28 @@ class ExportBaseMixin:
         else:
             raise RuntimeError('no valid default export format defined')
 
+    def get_typed_values(self):
+        """
+        Get values and fields for typed export formats
+
+        Returns a tuple of an iterable over rows, like get_values(), and a
+        list of model fields corresponding to the columns.  This default
+        implementation does not know about the fields and returns None for
+        them.  Views that can provide raw database values with field
+        information should override this.
+        """
+        return self.get_values(), None
+
+    def render_export(self, renderer):
+        """
+        Render the export data via the given renderer instance
+        """
+        if getattr(renderer, 'typed', False):
+            values, fields = self.get_typed_values()
+            renderer.render(values, fields=fields)
+        else:
+            renderer.render(self.get_values())
+
 
 class ExportMixin(ExportBaseMixin):
     """
@@ -670,10 +961,92 @@ class ExportMixin(ExportBaseMixin):
         filename = self.get_filename() + suffix
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
 
-        Renderer(response, filename=filename).render(self.get_values())
+        self.render_export(Renderer(response, filename=filename))
 
         return response
 
+    def get_file_response(self, path, filename, content_type):
+        """
+        Get response to download an existing file, with range support
+
+        A request for a single byte range gets a partial response, multiple
+        or invalid ranges are ignored and the whole file is sent.
+        """
+        size = path.stat().st_size
+        byte_range = self._parse_range(self.request.META.get('HTTP_RANGE'),
+                                       size)
+        if byte_range is None:
+            response = FileResponse(
+                open(path, 'rb'),
+                as_attachment=True,
+                filename=filename,
+                content_type=content_type,
+            )
+        elif byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                self._iter_file_range(path, start, end),
+                status=206,
+                content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Disposition'] = \
+                f'attachment; filename="{filename}"'
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    @staticmethod
+    def _parse_range(header, size):
+        """
+        Parse a Range header value
+
+        Returns the (start, end) tuple of a single, satisfiable byte range
+        with an inclusive end, False for an unsatisfiable range, and None if
+        there is no range or it can't be used.
+        """
+        if not header or not header.startswith('bytes='):
+            return None
+        spec = header[len('bytes='):].strip()
+        if ',' in spec:
+            return None
+        start, sep, end = spec.partition('-')
+        try:
+            if not sep:
+                return None
+            elif not start:
+                # suffix range, the last bytes
+                length = int(end)
+                if length == 0:
+                    return False
+                start, end = max(0, size - length), size - 1
+            else:
+                start = int(start)
+                end = min(int(end), size - 1) if end else size - 1
+        except ValueError:
+            return None
+        if start < 0 or start > end:
+            return False
+        return start, end
+
+    @staticmethod
+    def _iter_file_range(path, start, end, chunk_size=64 * 1024):
+        """
+        Generate chunks of the file's content from start to end inclusive
+        """
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
 
 class ExportView(ExportMixin, TableView):
     """
@@ -683,7 +1056,11 @@ class ExportView(ExportMixin, TableView):
         return self.conf.name
 
     def get_values(self):
-        return self.get_table().as_values()
+        return iter_values(self.get_table())
+
+    def get_typed_values(self):
+        table = self.get_table()
+        return iter_values(table, raw=True), get_export_fields(table)
 
 
 class ExportFormView(ExportBaseMixin, DatasetMixin, FormView):
@@ -896,18 +1273,10 @@ class HistoryView(BaseMixin, CuratorRequiredMixin, MultiTableMixin,
         :param qs: iterable of ChangeRecord instances.  All changes must belong
                    to the same record and be in order.
         """
-        # diffs for each and precessor, compare itertools pairwise recipe:
-        a, b = tee(qs)
-        next(b, None)  # shift forward, diff to last/None will give all fields
-        diffs = []
-        for i, j in zip_longest(a, b):
-            d = i.diff_to(j)
-            diffs.append(d)
-
-        # combine into data
         data = list(qs)
-        for diff, row in zip(diffs, data):
-            row.changes = diff
+        ChangeRecord.add_diffs(data)
+        for row in data:
+            row.changes = row.diff()
         return data
 
     def get_context_data(self, **ctx):
@@ -1052,7 +1421,7 @@ class SnapshotView(BasicBaseMixin, UserRequiredMixin, SingleTableView):
 
 class SnapshotTableView(BasicBaseMixin, UserRequiredMixin, SingleTableView):
     """
-    Display one table from a snapshot (with all data)
+    Display one table from a snapshot, paginated
     """
     template_name = 'mibios/snapshot_table.html'
 
@@ -1066,16 +1435,19 @@ class SnapshotTableView(BasicBaseMixin, UserRequiredMixin, SingleTableView):
             raise Http404
 
         try:
-            self.columns, rows = \
-                self.snapshot.get_table_data(self.app_label, self.table_name)
-        except ValueError:
+            self.queryset = \
+                self.snapshot.get_table(self.app_label, self.table_name)
+        except (LookupError, ValueError):
             # invalid table name
             raise Http404
 
-        self.queryset = [dict(zip(self.columns, i)) for i in rows]
+        self.columns = self.queryset.columns
 
         return super().get(request, *args, **kwargs)
 
+    def get_table_data(self):
+        return SnapshotTableData(self.object_list)
+
     def get_table_class(self):
         meta_opts = dict()
         Meta = type('Meta', (object,), meta_opts)
@@ -1094,7 +1466,18 @@ class ExportSnapshotTableView(ExportMixin, SnapshotTableView):
         return self.snapshot.name + '_' + self.table_name
 
     def get_values(self):
-        return self.get_table().as_values()
+        """
+        Stream the rows, in the table's order, straight from the snapshot
+        """
+        table = self.get_table()
+        columns = list(table.columns.iterall())
+        yield [force_str(i.header, strings_only=True) for i in columns]
+        empty = (None, '')
+        for row in table.data.data.iter_rows():
+            yield [
+                None if i in empty else force_str(i, strings_only=True)
+                for i in row
+            ]
 
 
 class ImportFileDownloadView(CuratorRequiredMixin, View):
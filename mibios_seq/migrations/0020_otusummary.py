@@ -0,0 +1,38 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import mibios.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mibios_seq', '0019_project_sequencing_direct_m2m'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OTUSummary',
+            fields=[
+                ('id', mibios.models.AutoField(primary_key=True, serialize=False)),
+                ('prevalence', models.PositiveIntegerField(editable=False, help_text='number of sequencing records with non-zero count')),
+                ('total_abundance', models.PositiveBigIntegerField(editable=False, help_text='sum of absolute counts')),
+                ('mean_abundance', models.FloatField(editable=False, help_text="mean absolute count over all the project's sequencing records")),
+                ('otu', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='mibios_seq.otu', verbose_name='OTU')),
+                ('project', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, to='mibios_seq.analysisproject', verbose_name='analysis project')),
+                ('taxon', models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='mibios_seq.taxonomy')),
+            ],
+            options={
+                'verbose_name': 'OTU summary',
+                'verbose_name_plural': 'OTU summaries',
+                'unique_together': {('project', 'otu')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='otusummary',
+            index=models.Index(fields=['project', '-prevalence'], name='otusummary_prevalence_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='otusummary',
+            index=models.Index(fields=['project', '-total_abundance'], name='otusummary_abundance_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mibios_seq', '0020_otusummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='otusummary',
+            name='data_version',
+            field=models.CharField(default='', editable=False, help_text='data version of project at time of refresh', max_length=200),
+            preserve_default=False,
+        ),
+    ]
@@ -1,15 +1,28 @@
 from collections import OrderedDict
-from itertools import chain, groupby
-from operator import attrgetter, itemgetter
+import csv
+import hashlib
+from io import TextIOWrapper
+from itertools import chain
+import json
+from pathlib import Path
+import shutil
+from tempfile import mkstemp
+from zipfile import ZIP_DEFLATED, ZipFile
 
 from Bio import SeqIO
-from django.db import models
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection, models
+from django.db.models.functions import Cast
 from django.db.transaction import atomic
+from django.utils.text import slugify
+import numpy
 from pandas import DataFrame
 
-from omics.shared import MothurShared
 from mibios.dataset import UserDataError
-from mibios.models import (ImportFile, Manager, CurationManager, Model,
+from mibios.models import (ChangeRecord, ChangeRecordBatch, DataVersion,
+                           ImportFile, Manager, CurationManager, Model,
                            ParentModel, QuerySet, TagNote)
 from mibios.utils import getLogger
 
@@ -107,6 +120,20 @@ class SequencingRun(Model):
         return dict(serial=s, number=n)
 
 
+class SequenceQuerySet(QuerySet):
+    def to_fasta(self):
+        """
+        Get iterator over the sequences as fasta-formatted records
+
+        The records are made from values, without loading model instances or
+        taxa per row, otherwise these are the same as from Sequence.fasta().
+        """
+        prefix = Sequence._meta.model_name
+        qs = self.values_list('pk', 'seq', 'taxon__taxid', 'taxon__name')
+        for pk, seq, taxid, taxname in qs.iterator():
+            yield Sequence.format_fasta(f'{prefix}:{pk}', seq, taxid, taxname)
+
+
 class Sequence(Model):
     """
     Models a 16S/V4 sequence
@@ -122,6 +149,9 @@ class Sequence(Model):
         verbose_name='sequence',
     )
 
+    objects = Manager.from_queryset(SequenceQuerySet)()
+    curated = CurationManager.from_queryset(SequenceQuerySet)()
+
     def __str__(self):
         return self.seq[:20] + '...'
 
@@ -138,18 +168,31 @@ class Sequence(Model):
             name = f'{self._meta.model_name}:{self.pk}'
 
         if with_taxon and self.taxon is not None:
-            taxon = f' taxid:{self.taxon.taxid} {self.taxon.name}'
+            taxid, taxname = self.taxon.taxid, self.taxon.name
         else:
+            taxid, taxname = None, None
+
+        return self.format_fasta(name, self.seq, taxid, taxname, wrap=wrap)
+
+    @staticmethod
+    def format_fasta(name, seq, taxid=None, taxname=None, wrap=False):
+        """
+        Format a fasta record from the given values
+
+        The taxon is added to the header if taxid is not None.
+        """
+        if taxid is None:
             taxon = ''
+        else:
+            taxon = f' taxid:{taxid} {taxname}'
 
-        slines = [self.seq]
         if wrap:
             MAX_LEN = 60
-            while len(slines[-1]) > MAX_LEN:
-                slines[-1:] = [slines[-1][:MAX_LEN], slines[-1][MAX_LEN:]]
-        slines = '\n'.join(slines)
+            seq = '\n'.join(
+                seq[i:i + MAX_LEN] for i in range(0, len(seq), MAX_LEN)
+            )
 
-        return f'>{name}{taxon}\n{slines}\n'
+        return f'>{name}{taxon}\n{seq}\n'
 
 
 class Strain(Model):
@@ -160,6 +203,9 @@ class Strain(Model):
 class AbundanceQuerySet(QuerySet):
     _project = None
 
+    SHARED_CHUNK_SIZE = 10000
+    """ Initial size of the arrays collecting the data for shared files """
+
     def _clone(self):
         """
         Extends non-public _clone() to keep track of extra state
@@ -261,41 +307,48 @@ class AbundanceQuerySet(QuerySet):
         recs = sh.itertuples(index=True, name=None)
         return chain([header], recs)
 
+    @staticmethod
+    def _discrete_scale(data, indptr, size):
+        """
+        Scale the values of each row to integers summing up to size
+
+        :param data: numpy array of non-negative values, stored row by row
+        :param indptr: numpy int array of row boundaries in data, like for a
+                       CSR matrix, rows must not be empty
+
+        The values are scaled to the target size and rounded down, then the
+        remaining units are given to the values with the largest remainders.
+        Returns an int array with the same layout as data.
+        """
+        if not len(data):
+            return data.astype(numpy.int64)
+        lengths = numpy.diff(indptr)
+        row = numpy.repeat(numpy.arange(len(lengths)), lengths)
+        totals = numpy.add.reduceat(data, indptr[:-1])
+        scaled = data * (size / totals)[row]
+        disc = numpy.floor(scaled).astype(numpy.int64)
+        deficit = size - numpy.add.reduceat(disc, indptr[:-1])
+        # per row, sort by decreasing remainder, then get rank within row
+        order = numpy.lexsort((disc - scaled, row))
+        rank = numpy.empty_like(order)
+        rank[order] = numpy.arange(len(order)) - indptr[row]
+        disc += rank < deficit[row]
+        return disc
+
     @classmethod
     def _normalize(cls, group, size, debug=0):
         """
         Scale absolute counts to normal sample size
+
+        :param group: iterable over tuples (count, a, b) for one sample
+        Returns a generator over the tuples with scaled counts.
         """
         group = list(group)
-        debug <= 1 or print(f'group={group}')
-        vals = [i[0] for i in group]
-        debug <= 1 or print(f'vals={vals}')
-        total = sum(vals)
-        debug <= 0 or print(f'total={total}')
-        f = size / total
-        frac = [i * f for i in vals]
-        debug <= 1 or print(f'frac={frac}')
-        disc = [round(i) for i in frac]
-        overhang = sum(disc) - size
-        debug <= 0 or print(f'overhang={overhang}')
-        for _ in range(abs(overhang)):
-            errs = [i - j for i, j in zip(disc, frac)]  # round-up errs are pos
-            debug <= 1 or print(f'dict={disc} at {sum(disc)}')
-            debug <= 1 or print(f'errs={errs}')
-            if overhang > 0:
-                abs_err_max = max(errs)
-            else:
-                abs_err_max = min(errs)
-            idx = errs.index(abs_err_max)
-            if overhang > 0:
-                disc[idx] -= 1
-            else:
-                disc[idx] += 1
-            debug <= 0 or print(f'idx={idx} count={disc[idx]} err: '
-                                '{errs[idx]}->{disc[idx]-frac[idx]}')
-        debug <= 1 or print(f'disc={disc} at {sum(disc)}')
-        debug <= 1 or print(sum(disc))
-        return ((i, j, k) for i, (_, j, k) in zip(disc, group))
+        vals = numpy.array([i[0] for i in group], dtype=float)
+        debug <= 0 or print(f'total={vals.sum()}')
+        disc = cls._discrete_scale(vals, numpy.array([0, len(vals)]), size)
+        debug <= 1 or print(f'disc={disc} at {disc.sum()}')
+        return ((int(i), j, k) for i, (_, j, k) in zip(disc, group))
 
     @classmethod
     def test_norm(cls, vals, norm_size, verbose=False, verboser=False):
@@ -328,32 +381,6 @@ class AbundanceQuerySet(QuerySet):
         total = sum(vals)
         return ((i / total, j, k) for i, j, k in group)
 
-    def _zerofill_and_norm(self, otus, group, normalize):
-        """
-        Fill in zeros and normalize values for one row
-
-        This is a generator over the items of a row in a shared file
-
-        :param otus: iterable over all OTU pks of QuerySet in order
-        :param group: Data for one sample/row; an iterable over tuple
-                      (abund, OTU pk)
-        """
-        if normalize == -1 or normalize == 0:
-            zero = 0.0
-        else:
-            zero = 0
-
-        abund, otu_pk = next(group)
-        for i in otus:
-            if otu_pk == i:
-                yield abund
-                try:
-                    abund, otu_pk = next(group)
-                except StopIteration:
-                    pass
-            else:
-                yield zero
-
     def _group_and_pivot(self, otus, normalize, id_fields, min_avg_group_size):
         """
         Generator of shared file rows
@@ -370,6 +397,13 @@ class AbundanceQuerySet(QuerySet):
 
         Assumes that filter_project() has been called if we are working with
         averaged data.
+
+        The data is retrieved once, row by row, into numpy arrays which make
+        up a sparse matrix in CSR layout: the row ids, the boundaries of the
+        rows (indptr) and per non-zero value the OTU column and abundance.
+        Raises RuntimeError if the data contains OTUs not given in otus.
+        Normalization is then done on the whole matrix and dense rows, with
+        the zeros filled in, are only made when yielded.
         """
         if normalize is None:
             abund_field = 'count'
@@ -415,51 +449,104 @@ class AbundanceQuerySet(QuerySet):
         )
         del fields
 
-        # Group data by what will be the rows of the shared file.  The group-by
-        # key, the row id(s) (a tuple) will be the first element of the output
-        # row, the rest, which are now tuples of abundance value and otu, in
-        # two steps: (1) possibly normalize the values and (2) fill in the
-        # zeros.  Then that gets packaged into a row, each of which is yielded
-        # back.
-        key = itemgetter(slice(None, len(id_fields)))
-        for row_id, group in groupby(it, key=key):
-            # row_id is tuple of id_fields from above
-            # a group is data for one row in shared file
-
-            # pick only abund, otu pairs from data
+        # Collect the sparse matrix, the rows are the groups of the ordered
+        # data by row id, a tuple of the id_fields.  The per-value arrays are
+        # pre-allocated and grown geometrically as needed.
+        if normalize is None and not self._avg_by:
+            abund_dtype = numpy.int64
+        else:
+            abund_dtype = numpy.float64
+        size = self.SHARED_CHUNK_SIZE
+        data = numpy.empty(size, dtype=abund_dtype)
+        otu_col = numpy.empty(size, dtype=numpy.int64)
+        num_ids = len(id_fields)
+        row_ids = []
+        avg_g_cts = []
+        indptr = []
+        count = 0
+        last_id = None
+        for row in it:
+            row_id = row[:num_ids]
+            if row_id != last_id:
+                row_ids.append(row_id)
+                indptr.append(count)
+                if self._avg_by:
+                    avg_g_cts.append(row[num_ids])
+                last_id = row_id
+            if count == size:
+                size *= 2
+                data.resize(size, refcheck=False)
+                otu_col.resize(size, refcheck=False)
+            abund = row[-2]
+            data[count] = numpy.nan if abund is None else abund
+            otu_col[count] = row[-1]
+            count += 1
+        indptr.append(count)
+        del it, last_id
+
+        if not count:
+            return
+        data = data[:count]
+        otu_col = otu_col[:count]
+        indptr = numpy.array(indptr, dtype=numpy.int64)
+        lengths = numpy.diff(indptr)
+
+        # map OTU pks to column positions, OTU order as given
+        otus = numpy.array(otus, dtype=numpy.int64)
+        sorter = numpy.argsort(otus)
+        pos = numpy.searchsorted(otus, otu_col, sorter=sorter)
+        cols = sorter[numpy.minimum(pos, len(otus) - 1)]
+        missing = otus[cols] != otu_col
+        if missing.any():
+            # the data changed since the OTU columns were determined
+            raise RuntimeError(
+                f'abundance data for OTU(s) not in the header, e.g. OTU pk='
+                f'{otu_col[missing][0]}'
+            )
+        del otu_col, sorter, pos, missing
+
+        if self._avg_by:
+            real_avg_g_cts = numpy.array(
+                [real_avg_grp_counts[i] for i in row_ids],
+                dtype=float,
+            )
+            # correct averages for zeros!
+            factor = numpy.array(avg_g_cts) / real_avg_g_cts
+            data = data * numpy.repeat(factor, lengths)
+            keep = real_avg_g_cts >= min_avg_group_size
+        else:
+            keep = numpy.ones(len(row_ids), dtype=bool)
+
+        if normalize is None:
+            zero = 0
+        elif normalize == -1:
+            data = data * 100.0
+            zero = 0.0
+        elif normalize >= 1:
+            data = self._discrete_scale(data, indptr, normalize)
+            zero = 0
+        else:
+            # normalize == 0 -- keep values
+            zero = 0.0
+
+        if data.dtype.kind == 'f' and isinstance(zero, int):
+            # e.g. averaged counts, keep zeros as int
+            dtype = object
+        else:
+            dtype = data.dtype
+
+        for num, row_id in enumerate(row_ids):
+            if not keep[num]:
+                # skip this row
+                continue
             if self._avg_by:
-                real_avg_g_ct = real_avg_grp_counts[row_id]
-                if real_avg_g_ct < min_avg_group_size:
-                    # skip this row
-                    continue
-                group = (
-                    # correct averages for zeros!
-                    (abund * (avg_g_ct / real_avg_g_ct), otu)
-                    for *_, avg_g_ct, abund, otu in group
-                )
-                grp_count = (real_avg_g_ct,)
+                grp_count = (real_avg_g_cts[num].item(), )
             else:
-                # last two elements -> (abund, otu)
-                group = map(itemgetter(slice(-2, None)), group)
                 grp_count = ()
-
-            if normalize is not None:
-                if normalize == -1:
-                    group = (
-                        (abund * 100.0, otu)
-                        for abund, otu in group
-                    )
-                elif normalize >= 1:
-                    group = (
-                        (round(abund * normalize), otu)
-                        for abund, otu in group
-                    )
-                else:
-                    # normalize == 0 -- keep values
-                    pass
-
-            values = self._zerofill_and_norm(otus, group, normalize)
-            yield (row_id, grp_count, values)
+            values = numpy.full(len(otus), zero, dtype=dtype)
+            a, b = indptr[num], indptr[num + 1]
+            values[cols[a:b]] = data[a:b]
+            yield (row_id, grp_count, values.tolist())
 
     def _add_meta_data(self, shared_rows, meta_cols):
         """
@@ -661,6 +748,171 @@ class AbundanceQuerySet(QuerySet):
         tail = self._add_meta_data(tail, meta_cols)
         return chain([header], tail)
 
+    @staticmethod
+    def get_shared_file_stem(project_name, normalize=None, averaged=False):
+        """
+        Get the name, without suffix, for a shared file download
+        """
+        if normalize is None:
+            norm = 'abs'
+        elif normalize == -1:
+            norm = 'relpct'
+        elif normalize == 0:
+            norm = 'rel'
+        else:
+            norm = str(normalize)
+        stem = slugify(f'{project_name} {norm}')
+        if averaged:
+            stem += '-avg'
+        return stem
+
+    def _get_shared_meta_models(self, meta_cols=()):
+        """
+        Get the models from which shared table meta data columns are taken
+
+        Helper for get_shared_data_version().  These are the models along the
+        meta column accessors and the averaged-by fields.
+        """
+        ret = set()
+        for i in chain(meta_cols, self._avg_by or []):
+            model = Abundance
+            for name in i.split('__'):
+                try:
+                    field = model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    break
+                if not field.is_relation:
+                    break
+                model = field.related_model
+                ret.add(model)
+        ret.discard(Abundance)
+        return ret
+
+    def get_shared_data_version(self, meta_cols=()):
+        """
+        Get the data version relevant for the project's shared table
+
+        This combines the latest abundance data import for the project, the
+        latest change to the project or its sequencing records, and the data
+        version of the other models from which meta data columns are taken.
+        Changes to the relative abundance are not covered,
+        Abundance.compute_relative() clears the project's cache instead.
+        """
+        project = self._project
+        import_file = (AbundanceImportFile.objects
+                       .filter(project=project)
+                       .aggregate(models.Max('pk'))['pk__max'])
+        record_types = ContentType.objects.get_for_models(
+            AnalysisProject,
+            Sequencing,
+        )
+        change = ChangeRecord.objects.filter(
+            models.Q(
+                record_type=record_types[AnalysisProject],
+                record_pk=project.pk,
+            ) | models.Q(
+                record_type=record_types[Sequencing],
+                record_pk__in=project.sequencing.values('pk'),
+            )
+        ).aggregate(models.Max('pk'))['pk__max']
+
+        meta_models = self._get_shared_meta_models(meta_cols)
+        meta_models -= {AnalysisProject, Sequencing}
+        if meta_models:
+            meta = ChangeRecord.objects.filter(
+                record_type__in=ContentType.objects
+                .get_for_models(*meta_models).values(),
+            ).aggregate(models.Max('pk'))['pk__max']
+        else:
+            meta = None
+        bulk = DataVersion.get_version(Sequencing, *meta_models)
+        return f'{import_file}-{change}-{meta}-{bulk}'
+
+    def get_cached_shared(
+            self,
+            normalize=None,
+            meta_cols=(),
+            min_avg_group_size=1,
+            curated=True,
+    ):
+        """
+        Get the path to the zipped shared file from the export cache
+
+        :param bool curated: Whether the queryset is derived from the curated
+                             manager.
+
+        Takes the same parameters as as_shared_values_list().  The caller
+        needs to ensure that the queryset is otherwise not filtered, beyond
+        the project and averaging, as this is not part of the cache key.  The
+        file gets written on the first request, if it is not in the cache yet,
+        and older versions of the file are then removed.  Returns None if the
+        cache is disabled, that is when the SHARED_EXPORT_CACHE_DIR setting is
+        missing or None.
+        """
+        cache_dir = getattr(settings, 'SHARED_EXPORT_CACHE_DIR', None)
+        if cache_dir is None:
+            return None
+
+        if self._project is None:
+            return self.filter_project().get_cached_shared(
+                normalize=normalize,
+                meta_cols=meta_cols,
+                min_avg_group_size=min_avg_group_size,
+                curated=curated,
+            )
+
+        variant = json.dumps([
+            normalize,
+            list(meta_cols),
+            list(self._avg_by or []),
+            min_avg_group_size,
+            curated,
+        ])
+        variant = hashlib.md5(variant.encode()).hexdigest()
+        version = self.get_shared_data_version(meta_cols)
+        cache_dir = self._project.get_shared_cache_dir()
+        path = cache_dir / f'{variant}.{version}.shared.zip'
+        if path.is_file():
+            return path
+
+        cache_dir.mkdir(mode=0o770, parents=True, exist_ok=True)
+        stem = self.get_shared_file_stem(
+            self._project.name,
+            normalize=normalize,
+            averaged=bool(self._avg_by),
+        )
+        rows = self.as_shared_values_list(
+            normalize,
+            meta_cols=meta_cols,
+            min_avg_group_size=min_avg_group_size,
+        )
+        # write to a unique temp file first, so no one ever sees a partial
+        # file and concurrent requests don't write to the same file
+        fd, tmp_path = mkstemp(dir=cache_dir, prefix=f'.{variant}.',
+                               suffix='.part')
+        tmp_path = Path(tmp_path)
+        try:
+            with open(fd, 'wb') as ofile, \
+                    ZipFile(ofile, 'w', ZIP_DEFLATED) as zf:
+                with zf.open(stem + '.shared', 'w', force_zip64=True) as f:
+                    text = TextIOWrapper(f, newline='')
+                    writer = csv.writer(text, delimiter='\t',
+                                        lineterminator='\n')
+                    writer.writerows(rows)
+                    text.flush()
+                    text.detach()
+            tmp_path.chmod(0o660)
+            tmp_path.replace(path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        log.info(f'Saved shared file to cache: {path}')
+
+        for i in cache_dir.glob(f'{variant}.*.shared.zip'):
+            if i != path:
+                i.unlink(missing_ok=True)
+        return path
+
     def as_shared_dataframe(
             self,
             normalize=0,
@@ -743,6 +995,9 @@ class Abundance(Model):
     objects = Manager.from_queryset(AbundanceQuerySet)()
     curated = CurationManager.from_queryset(AbundanceQuerySet)()
 
+    import_batch_size = 10000
+    """ number of abundance rows per bulk_create() at import """
+
     average_by = [('project', 'otu',
                    'sequencing__sample__fecalsample__participant',
                    'sequencing__sample__fecalsample__week')]
@@ -763,72 +1018,186 @@ class Abundance(Model):
         ASV numbers.  Instead ASVs are identified by sequence and ASV objects
         are created as needed.  Obviously, the OTU/ASV/sequence names in shared
         and fasta files must correspond.
+
+        The threads parameter is ignored, it is kept for compatibility, the
+        shared file is read by a single streaming pass, see _read_shared().
         """
-        sh = MothurShared(file, verbose=False, threads=threads)
-        return cls._from_file(file, project, fasta, sh)
+        result = cls._from_file(file, project, fasta)
+        project.clear_shared_cache()
+        OTUSummary.refresh(project)
+        return result
+
+    @staticmethod
+    def _read_shared(file):
+        """
+        Read a mothur shared file one sample row at a time
+
+        :param file: An open text file.
+
+        Returns a tuple of the list of OTU names from the header and a
+        generator over the rows.  Each row is a tuple of the group name, the
+        number of zero counts, and two numpy arrays, the column indices of
+        the non-zero counts and these counts.  The file is never held in
+        memory as a dense matrix.  Counts written as floats, e.g. "1.0", are
+        accepted if they are whole numbers.
+        """
+        header = file.readline().rstrip('\n').split('\t')
+        if header[:3] != ['label', 'Group', 'numOtus']:
+            raise UserDataError(f'Not a mothur shared file header: '
+                                f'{header[:3]}')
+        otu_names = header[3:]
+
+        def rows():
+            label = None
+            for linenum, line in enumerate(file, start=2):
+                row = line.rstrip('\n').split('\t')
+                if label is None:
+                    label = row[0]
+                elif row[0] != label:
+                    raise UserDataError(f'line {linenum}: multiple labels are '
+                                        f'not supported: {row[0]}')
+                if len(row) - 3 != len(otu_names):
+                    raise UserDataError(f'line {linenum}: expected '
+                                        f'{len(otu_names)} counts')
+                try:
+                    counts = numpy.array(row[3:], dtype=numpy.int64)
+                except ValueError:
+                    try:
+                        floats = numpy.array(row[3:], dtype=numpy.float64)
+                    except ValueError as e:
+                        raise UserDataError(
+                            f'line {linenum}: counts must be numbers: {e}'
+                        ) from e
+                    with numpy.errstate(invalid='ignore'):
+                        counts = floats.astype(numpy.int64)
+                    if not numpy.array_equal(counts, floats):
+                        raise UserDataError(f'line {linenum}: counts must be '
+                                            f'whole numbers')
+                nonzero = numpy.flatnonzero(counts)
+                zeros = len(counts) - len(nonzero)
+                yield row[1], zeros, nonzero, counts[nonzero]
+
+        return otu_names, rows()
 
     @classmethod
     @atomic
-    def _from_file(cls, file, project, fasta, sh):
+    def _from_file(cls, file, project, fasta):
         if fasta:
-            fasta_result = OTU.from_fasta(fasta, project=project)
+            fasta_result = OTU.from_fasta(fasta, project=project, bulk=True)
         else:
             fasta_result = None
         AbundanceImportFile.create_from_file(file=file, project=project)
-        sequencings = Sequencing.objects.in_bulk(field_name='name')
-        if project.otu_type == AnalysisProject.ASV_TYPE:
-            f = dict(project=None)
+
+        if isinstance(file, (str, Path)):
+            file = open(file)
+            need_close = True
         else:
-            f = dict(project=project)
-        otus = {
-            (i.prefix, i.number): i
-            for i in OTU.objects.all().filter(**f).iterator()
-        }
-        del f
+            # read again after import file got saved
+            file.seek(0)
+            need_close = False
 
-        skipped, zeros, otus_new = 0, 0, 0
-        objs = []
-        for (seqid, otu), count in sh.counts.stack().items():
-            if count == 0:
-                # don't store zeros
-                zeros += 1
-                continue
+        try:
+            otu_names, rows = cls._read_shared(file)
+            otu_pks, otus_new = cls._get_shared_otus(otu_names, project)
+            sequencings = dict(
+                Sequencing.objects.values_list('name', 'pk').iterator()
+            )
 
-            if seqid not in sequencings:
-                # ok to skip, e.g. non-public
-                skipped += 1
-                continue
+            count, skipped, zeros = 0, 0, 0
+            objs = []
+            for group, num_zeros, cols, counts in rows:
+                zeros += num_zeros
+                if group not in sequencings:
+                    # ok to skip, e.g. non-public
+                    skipped += len(cols)
+                    continue
+
+                seq_pk = sequencings[group]
+                for otu_pk, num in zip(otu_pks[cols].tolist(),
+                                       counts.tolist()):
+                    objs.append(cls(
+                        count=num,
+                        project=project,
+                        sequencing_id=seq_pk,
+                        otu_id=otu_pk,
+                    ))
+
+                if len(objs) >= cls.import_batch_size:
+                    cls.objects.bulk_create(objs)
+                    count += len(objs)
+                    objs = []
+
+            cls.objects.bulk_create(objs)
+            count += len(objs)
+        finally:
+            if need_close:
+                file.close()
+
+        return dict(count=count, zeros=zeros, skipped=skipped,
+                    fasta=fasta_result, otus_created=otus_new)
 
+    @staticmethod
+    def _get_shared_otus(otu_names, project):
+        """
+        Get the OTU pks for the columns of a shared file
+
+        Missing OTUs get created in bulk.  Returns a tuple of a numpy array of
+        the pks, in column order, and the number of created OTUs.
+        """
+        keys = []
+        for i in otu_names:
             try:
-                otu_key = OTU.natural_lookup(otu)
+                otu_key = OTU.natural_lookup(i)
             except ValueError:
                 raise UserDataError(
-                    f'Irregular OTU identifier not supported: {otu}'
+                    f'Irregular OTU identifier not supported: {i}'
                 )
-            else:
-                otu_key = (otu_key['prefix'], otu_key['number'])
+            keys.append((otu_key['prefix'], otu_key['number']))
 
-            try:
-                otu_obj = otus[otu_key]
-            except KeyError:
-                otu_obj = OTU.objects.create(
-                    prefix=otu_key[0],
-                    number=otu_key[1],
-                    project=project,
-                )
-                otus[otu_key] = otu_obj
-                otus_new += 1
+        if project.otu_type == AnalysisProject.ASV_TYPE:
+            f = dict(project=None)
+        else:
+            f = dict(project=project)
+        otus = {
+            (prefix, number): pk
+            for pk, prefix, number
+            in OTU.objects.filter(**f).values_list('pk', 'prefix', 'number')
+            .iterator()
+        }
 
-            objs.append(cls(
-                count=count,
-                project=project,
-                sequencing=sequencings[seqid],
-                otu=otu_obj,
-            ))
+        new = [
+            OTU(prefix=prefix, number=number, project=project)
+            for prefix, number in dict.fromkeys(keys)
+            if (prefix, number) not in otus
+        ]
+        if new:
+            history = ChangeRecordBatch()
+            for i in new:
+                i.add_change_record(batch=history)
+            # create in batches and get the new pks by exact (prefix, number)
+            # with a number of query parameters that is safe for sqlite
+            size = OTU.NATURAL_MAP_BATCH_SIZE
+            for i in range(0, len(new), size):
+                batch = new[i:i + size]
+                OTU.objects.bulk_create(batch)
+                numbers = {}
+                for obj in batch:
+                    numbers.setdefault(obj.prefix, []).append(obj.number)
+                for prefix, nums in numbers.items():
+                    qs = OTU.objects.filter(
+                        project=project,
+                        prefix=prefix,
+                        number__in=nums,
+                    )
+                    qs = qs.values_list('pk', 'number')
+                    for pk, number in qs.iterator():
+                        otus[(prefix, number)] = pk
+            for i in new:
+                i.pk = otus[(i.prefix, i.number)]
+            history.add_bulk(new)
+            history.flush()
 
-        cls.objects.bulk_create(objs)
-        return dict(count=len(objs), zeros=zeros, skipped=skipped,
-                    fasta=fasta_result, otus_created=otus_new)
+        return numpy.array([otus[i] for i in keys]), len(new)
 
     @classmethod
     def compute_relative(cls, project=None):
@@ -839,84 +1208,183 @@ class Abundance(Model):
 
         This will overwrite existing data.  If case of errors, partial updates
         are possible.
-        """
-        qs = (cls.objects
-              .select_related('project', 'sequencing')
-              .order_by('project__pk', 'sequencing__pk'))
 
+        The per-sequencing totals are aggregated once per project and joined
+        into a single UPDATE ... FROM statement.  Only for SQLite versions
+        before 3.33, which lack UPDATE ... FROM, is there one UPDATE per
+        sequencing record.
+        """
         if project:
-            qs = qs.filter(project=project)
+            projects = [project]
+        else:
+            projects = list(AnalysisProject.objects.filter(
+                pk__in=cls.objects.values('project')
+            ))
+
+        for i in projects:
+            if cls._has_update_from():
+                num = cls._compute_relative_joined(i)
+            else:
+                num = cls._compute_relative_per_sequencing(i)
+            log.info(f'Updated relative abundance for {num} rows of {i}')
+
+        # relative abundance is not part of the shared cache version
+        for i in projects:
+            i.clear_shared_cache()
 
-        grpkey = attrgetter('project.pk', 'sequencing.pk')
-        for _, group in groupby(qs.iterator(), key=grpkey):
-            group = list(group)
-            total = sum((i.count for i in group))
-            for i in group:
-                i.relative = i.count / total
-            cls.objects.bulk_update(group, ('relative', ))
+    @staticmethod
+    def _has_update_from():
+        """
+        Tell if the DB backend supports UPDATE ... FROM
+        """
+        if connection.vendor == 'sqlite':
+            return connection.Database.sqlite_version_info >= (3, 33)
+        return connection.vendor == 'postgresql'
 
     @classmethod
-    def compare_projects(cls, project_a, project_b):
+    def _compute_relative_per_sequencing(cls, project):
+        """
+        Update relative abundance of project, one UPDATE per sequencing
+
+        Fallback for SQLite < 3.33.
+        """
+        totals = (cls.objects
+                  .filter(project=project)
+                  .order_by()
+                  .values('sequencing')
+                  .annotate(total=models.Sum('count'))
+                  .values_list('sequencing', 'total'))
+        num = 0
+        for seq_pk, total in list(totals.iterator()):
+            num += cls.objects.filter(project=project, sequencing=seq_pk) \
+                .update(relative=Cast('count', models.FloatField())
+                        / models.Value(total, models.FloatField()))
+        return num
+
+    @classmethod
+    def _compute_relative_joined(cls, project):
+        """
+        Update relative abundance of project via UPDATE ... FROM
+
+        For PostgreSQL and SQLite >= 3.33.
+        """
+        qn = connection.ops.quote_name
+        table = qn(cls._meta.db_table)
+        seq = qn(cls._meta.get_field('sequencing').column)
+        proj = qn(cls._meta.get_field('project').column)
+        count = qn(cls._meta.get_field('count').column)
+        relative = qn(cls._meta.get_field('relative').column)
+        sql = (
+            f'UPDATE {table} AS a SET {relative} = '
+            f'CAST(a.{count} AS double precision) / t.total '
+            f'FROM (SELECT {seq}, SUM({count}) AS total FROM {table} '
+            f'WHERE {proj} = %s GROUP BY {seq}) AS t '
+            f'WHERE a.{proj} = %s AND a.{seq} = t.{seq}'
+        )
+        with connection.cursor() as cur:
+            cur.execute(sql, [project.pk, project.pk])
+            num = cur.rowcount
+        DataVersion.bump(cls)
+        return num
+
+    @classmethod
+    def compare_projects(cls, project_a, project_b, threshold=None,
+                         stream=False):
         """
         Compare absolute counts between two ASV analysis projects
+
+        :param float threshold: If given, only report differences with a
+                                relative change, abs(delta) / max(count), of
+                                at least this value.
+        :param bool stream: If True, then the reported differences are an
+                            iterator over (sequencing pk, otu pk, delta, pct)
+                            tuples instead of a DataFrame.
+
+        Each project's counts are loaded into numpy arrays, a sparse matrix in
+        coordinate format with sequencing rows and OTU columns.  The two
+        matrices are aligned on the union of their non-zero cells and deltas
+        and relative changes are computed vectorized.  Cells of sequencing
+        records not analysed by the other project are skipped.
+
+        Returns a dict with the stats (total, skipped, same, changed) and the
+        differences as DataFrame indexed by sequencing and otu pks with
+        columns count_a, count_b, delta and pct.
         """
         if project_a == project_b:
             raise ValueError('the two given projects must not be the same')
 
-        seqs_a = project_a.sequencing.distinct().values_list('pk', flat=True)
-        seqs_a = set(seqs_a.iterator())
-        seqs_b = project_b.sequencing.distinct().values_list('pk', flat=True)
-        seqs_b = set(seqs_b.iterator())
-
-        # rows are 4-tuples of int with 3 pks + count
-        qs = cls.objects.filter(project__in=[project_a, project_b])
-        qs = qs.order_by('sequencing', 'otu', 'project')
-        qs = qs.values_list('sequencing', 'otu', 'project', 'count')
-
-        def keyfun(row):
-            # group by sequencing and otu
-            return (row[0], row[1])
-
-        total = 0
-        skipped = 0
-        same = 0
-        diffs = {}
-        for _, grp in groupby(qs.iterator(), key=keyfun):
-            total += 1
-            (seq, otu, proj, count), *more = grp
-            if more:
-                if len(more) > 1:
-                    raise RuntimeError('expected at most two in group')
-                # more has one element
-                count_b = more[0][3]
-                delta = count_b - count
-                max_count = max(count, count_b)
-            else:
-                if proj == project_a.pk and seq in seqs_b:
-                    # zero in project b
-                    delta = -count
-                elif proj == project_b.pk and seq in seqs_a:
-                    # zero in project a
-                    delta = count
-                else:
-                    # sequencing data was not analysed in other project
-                    skipped += 1
-                    continue
-                max_count = count
-
-            if delta == 0:
-                same += 1
-                continue
-
-            pct = abs(delta) / max_count
-            diffs[(seq, otu)] = (delta, pct)
+        def get_cells(project):
+            qs = cls.objects.filter(project=project).order_by()
+            qs = qs.values_list('sequencing', 'otu', 'count')
+            data = numpy.fromiter(chain.from_iterable(qs.iterator()),
+                                  dtype=numpy.int64)
+            return data.reshape(-1, 3).T
+
+        def get_seqs(project):
+            qs = project.sequencing.distinct().values_list('pk', flat=True)
+            return numpy.fromiter(qs.iterator(), dtype=numpy.int64)
+
+        seq_a, otu_a, count_a = get_cells(project_a)
+        seq_b, otu_b, count_b = get_cells(project_b)
+
+        # align the two matrices: cell key -> position in union of cells
+        width = int(max(otu_a.max(initial=0), otu_b.max(initial=0))) + 1
+        keys, inverse = numpy.unique(
+            numpy.concatenate([seq_a * width + otu_a, seq_b * width + otu_b]),
+            return_inverse=True,
+        )
+        counts_a = numpy.zeros(len(keys), dtype=numpy.int64)
+        counts_b = numpy.zeros(len(keys), dtype=numpy.int64)
+        in_a = numpy.zeros(len(keys), dtype=bool)
+        in_b = numpy.zeros(len(keys), dtype=bool)
+        counts_a[inverse[:len(seq_a)]] = count_a
+        counts_b[inverse[len(seq_a):]] = count_b
+        in_a[inverse[:len(seq_a)]] = True
+        in_b[inverse[len(seq_a):]] = True
+        seqs = keys // width
+        otus = keys % width
+
+        # cells missing in one project count as zero if that project
+        # analysed the sequencing record, otherwise they are skipped
+        keep = (
+            (in_a & in_b)
+            | (in_a & numpy.isin(seqs, get_seqs(project_b)))
+            | (in_b & numpy.isin(seqs, get_seqs(project_a)))
+        )
+        delta = counts_b - counts_a
+        changed = keep & (delta != 0)
+        pct = numpy.abs(delta[changed]) / numpy.maximum(counts_a[changed],
+                                                        counts_b[changed])
+        result = dict(
+            total=len(keys),
+            skipped=int((~keep).sum()),
+            same=int((keep & (delta == 0)).sum()),
+            changed=int(changed.sum()),
+        )
 
-        return dict(
-            total=total,
-            skipped=skipped,
-            same=same,
-            diffs=diffs,
+        cols = dict(
+            sequencing=seqs[changed],
+            otu=otus[changed],
+            count_a=counts_a[changed],
+            count_b=counts_b[changed],
+            delta=delta[changed],
+            pct=pct,
         )
+        if threshold is not None:
+            over = pct >= threshold
+            cols = {k: v[over] for k, v in cols.items()}
+
+        if stream:
+            result['diffs'] = zip(
+                cols['sequencing'].tolist(),
+                cols['otu'].tolist(),
+                cols['delta'].tolist(),
+                cols['pct'].tolist(),
+            )
+        else:
+            result['diffs'] = \
+                DataFrame(cols).set_index(['sequencing', 'otu'])
+        return result
 
 
 class AnalysisProject(Model):
@@ -940,6 +1408,20 @@ class AnalysisProject(Model):
         # Prevent numbers from being displayed, too much data
         return super().get_fields(with_m2m=False, **kwargs)
 
+    def get_shared_cache_dir(self):
+        """
+        Get the directory for the project's cached shared files
+        """
+        return Path(settings.SHARED_EXPORT_CACHE_DIR) / f'project{self.pk}'
+
+    def clear_shared_cache(self):
+        """
+        Remove all of the project's cached shared files
+        """
+        if getattr(settings, 'SHARED_EXPORT_CACHE_DIR', None) is None:
+            return
+        shutil.rmtree(self.get_shared_cache_dir(), ignore_errors=True)
+
     def get_otus(self):
         """
         Returns QuerySet with the project's OTUs
@@ -974,14 +1456,23 @@ class OTUQuerySet(QuerySet):
                 f.write(i)
 
     def _to_fasta(self):
-        qs = self.select_related('sequence__taxon', 'project')
+        qs = self.values_list(
+            'prefix',
+            'number',
+            'sequence__seq',
+            'sequence__taxon__taxid',
+            'sequence__taxon__name',
+        )
 
+        width = OTU.NUM_WIDTH
         missing = 0
-        for i in qs.iterator():
-            if i.sequence is None:
+        for prefix, number, seq, taxid, taxname in qs.iterator():
+            if seq is None:
                 missing += 1
             else:
-                yield i.sequence.fasta(name=i.natural)
+                # name as OTU.natural
+                name = prefix + str(number).zfill(width)
+                yield Sequence.format_fasta(name, seq, taxid, taxname)
 
         if missing:
             log.debug(f'to_fasta(): skipped {missing} OTUs missing a sequence')
@@ -1005,6 +1496,9 @@ class OTU(Model):
 
     hidden_fields = ['prefix', 'number']  # use name property instead
 
+    import_batch_size = 1000
+    """ number of fasta records per batch in bulk import mode """
+
     objects = Manager.from_queryset(OTUQuerySet)()
     curated = CurationManager.from_queryset(OTUQuerySet)()
 
@@ -1055,7 +1549,7 @@ class OTU(Model):
 
     @classmethod
     @atomic
-    def from_fasta(cls, file, project=None, comment=''):
+    def from_fasta(cls, file, project=None, comment='', bulk=False):
         """
         Import from given fasta file
 
@@ -1063,11 +1557,14 @@ class OTU(Model):
         :param AnalysisProject project: AnalysisProject that generated the OTUs
                                         If this is None, then the OTU type will
                                         be set to ASV.
+        :param bool bulk: Use bulk import mode, see _from_fasta_bulk().
         """
         file_rec = ImportFile.create_from_file(file=file)
 
         try:
             file_rec.file.open('r')
+            if bulk:
+                return cls._from_fasta_bulk(file_rec, project, comment)
             return cls._from_fasta(file_rec, project, comment)
         except Exception:
             try:
@@ -1161,6 +1658,139 @@ class OTU(Model):
         return dict(total=total, new=added, updated=updated,
                     skipped=skipped)
 
+    @classmethod
+    def _from_fasta_bulk(cls, file_rec, project, comment):
+        """
+        Bulk mode fasta import
+
+        Existing sequences are found via an in-memory map from sequence hash
+        to pk and the existing OTUs via a map from (prefix, number) to (pk,
+        sequence pk).  The fasta records are processed in batches of
+        import_batch_size.  Per batch, new objects are validated, new
+        sequences and OTUs are saved via bulk_create(), OTUs gaining a
+        sequence via bulk_update() and all change records in bulk via a
+        ChangeRecordBatch.  Validation skips the uniqueness and foreign key
+        checks as these are covered by the maps.  Returns the same stats as
+        _from_fasta().
+        """
+        added, updated, skipped, total = 0, 0, 0, 0
+
+        if project and project.otu_type == project.ASV_TYPE:
+            # ASVs do not belong to a project
+            project = None
+
+        def seq_hash(seq):
+            return hashlib.md5(seq.encode()).digest()
+
+        seq_pks = {
+            seq_hash(seq): pk
+            for pk, seq in Sequence.objects.values_list('pk', 'seq').iterator()
+        }
+        otus = {
+            (prefix, number): (pk, seq_pk)
+            for pk, prefix, number, seq_pk
+            in cls.objects.filter(project=project)
+            .values_list('pk', 'prefix', 'number', 'sequence')
+            .iterator()
+        }
+        history = ChangeRecordBatch()
+
+        def save_batch(new_seqs, new_otus, upd_otus):
+            """ save a batch of objects, new_* are dicts hash -> object """
+            # 1. sequences
+            for line, obj in new_seqs.values():
+                obj.full_clean(validate_unique=False)
+                obj.add_change_record(file=file_rec, line=line,
+                                      comment=comment, batch=history)
+            objs = [obj for _, obj in new_seqs.values()]
+            Sequence.objects.bulk_create(objs)
+            qs = Sequence.objects.filter(seq__in=[i.seq for i in objs])
+            for pk, seq in qs.values_list('pk', 'seq').iterator():
+                seq_pks[seq_hash(seq)] = pk
+            for obj in objs:
+                obj.pk = seq_pks[seq_hash(obj.seq)]
+            history.add_bulk(objs)
+
+            # 2. OTUs
+            for line, obj, hash_ in chain(new_otus.values(),
+                                          upd_otus.values()):
+                obj.sequence_id = seq_pks[hash_]
+                try:
+                    # FKs are known to be valid, skip their lookups
+                    obj.full_clean(exclude=['project', 'sequence'],
+                                   validate_unique=False)
+                except Exception as e:
+                    log.error(f'Failed importing ASV: at fasta record {line}: '
+                              f'{obj}: {e}')
+                    raise
+                obj.add_change_record(file=file_rec, line=line,
+                                      comment=comment, batch=history)
+            objs = [obj for _, obj, _ in new_otus.values()]
+            cls.objects.bulk_create(objs)
+            if objs:
+                qs = cls.objects.filter(
+                    project=project,
+                    prefix__in=set((i.prefix for i in objs)),
+                    number__in=set((i.number for i in objs)),
+                )
+                for pk, prefix, number, seq_pk in qs.values_list(
+                        'pk', 'prefix', 'number', 'sequence').iterator():
+                    otus[(prefix, number)] = (pk, seq_pk)
+                for obj in objs:
+                    obj.pk = otus[(obj.prefix, obj.number)][0]
+            upd_objs = [obj for _, obj, _ in upd_otus.values()]
+            cls.objects.bulk_update(upd_objs, ['sequence'])
+            for obj in upd_objs:
+                otus[(obj.prefix, obj.number)] = (obj.pk, obj.sequence_id)
+            history.add_bulk(objs + upd_objs)
+            history.flush()
+
+        new_seqs, new_otus, upd_otus = {}, {}, {}
+        # see _from_fasta() why we pass the underlying file object
+        for i in SeqIO.parse(file_rec.file.file.file, 'fasta'):
+            try:  # expect {'prefix': X, 'number': N}
+                kwnum = cls.natural_lookup(i.id)
+            except ValueError:
+                # SeqIO sequence id does not parse,
+                # is something from analysis pipeline, no OTU number?
+                skipped += 1
+                continue
+            total += 1
+            key = (kwnum['prefix'], kwnum['number'])
+
+            seq = str(i.seq)
+            hash_ = seq_hash(seq)
+            if hash_ not in seq_pks and hash_ not in new_seqs:
+                new_seqs[hash_] = (total, Sequence(seq=seq))
+
+            if key in new_otus or key in upd_otus:
+                line, obj, other_hash = new_otus.get(key) or upd_otus[key]
+                if other_hash != hash_:
+                    raise UserDataError(f'OTU record already exists with'
+                                        f'different sequence: {obj}')
+            elif key in otus:
+                pk, seq_pk = otus[key]
+                if seq_pk is None:
+                    obj = cls(pk=pk, prefix=key[0], number=key[1],
+                              project=project)
+                    upd_otus[key] = (total, obj, hash_)
+                    updated += 1
+                elif seq_pks.get(hash_) != seq_pk:
+                    raise UserDataError(f'OTU record already exists with'
+                                        f'different sequence: {i.id}')
+            else:
+                obj = cls(prefix=key[0], number=key[1], project=project)
+                new_otus[key] = (total, obj, hash_)
+                added += 1
+
+            if len(new_otus) + len(upd_otus) >= cls.import_batch_size:
+                save_batch(new_seqs, new_otus, upd_otus)
+                new_seqs, new_otus, upd_otus = {}, {}, {}
+
+        save_batch(new_seqs, new_otus, upd_otus)
+        return dict(total=total, new=added, updated=updated,
+                    skipped=skipped)
+
     @classmethod
     def summary(cls, project=None):
         """
@@ -1169,34 +1799,25 @@ class OTU(Model):
         :param project:
             Restrict analysis to given project.  Can be an instance of
             AnalysisProject or the project name as str.
+
+        The stats are read from the project's OTUSummary records which are
+        computed first if missing or out of date.
         """
         if isinstance(project, str):
             project = AnalysisProject.objects.get(name=project)
 
-        se_qs = Sequencing.curated.all().filter(project=project)
-
-        # filtering on the project: ASVs don't have a project but Sequencings
-        # and Abundances always do
-        if project.otu_type == AnalysisProject.ASV_TYPE:
-            f = dict(project=None)
-        else:
-            f = dict(project=project)
-        prevalence = models.Count(
-            'sequencing',
-            distinct=True,
-            filter=models.Q(sequencing__in=se_qs),
-        )
-        sum_abund = models.Sum(
-            'abundance__count',
-            filter=models.Q(abundance__sequencing__in=se_qs),
-        )
+        version = OTUSummary.get_data_version(project)
+        if not OTUSummary.objects \
+                .filter(project=project, data_version=version).exists():
+            OTUSummary.refresh(project)
 
         qs = (cls.objects
-              .filter(**f)
+              .filter(summaries__project=project)
               .select_related('sequence__taxon')
               .annotate(
-                  prevalence=prevalence,
-                  total_abundance=sum_abund,
+                  prevalence=models.F('summaries__prevalence'),
+                  total_abundance=models.F('summaries__total_abundance'),
+                  mean_abundance=models.F('summaries__mean_abundance'),
               ))
 
         return qs
@@ -1213,6 +1834,9 @@ class Taxonomy(Model):
         verbose_name='taxonomic name',
     )
 
+    update_chunk_size = 900
+    """ max number of records per bulk statement at import, sqlite safe """
+
     class Meta:
         verbose_name_plural = 'taxonomy'
 
@@ -1241,13 +1865,25 @@ class Taxonomy(Model):
         database.
         """
         file_rec = ImportFile.create_from_file(file=file)
+        # (prefix, number) -> (sequence pk, taxon pk)
         otus = {
-            (i.prefix, i.number): i
-            for i in OTU.objects.filter(project=project)
+            (prefix, number): (seq_pk, taxon_pk)
+            for prefix, number, seq_pk, taxon_pk
+            in OTU.objects.filter(project=project)
+            .values_list('prefix', 'number', 'sequence', 'sequence__taxon')
+            .iterator()
         }
+        taxa = {}  # (taxid, name) -> pk
+        taxids, names = set(), set()
+        for pk, taxid, name in cls.objects.values_list('pk', 'taxid', 'name'):
+            taxa[(taxid, name)] = pk
+            taxids.add(taxid)
+            names.add(name)
+
+        new_taxa = {}  # (taxid, name) -> new Taxonomy object
+        assignments = {}  # sequence pk -> (taxid, name)
         is_header = True  # first line is header
         updated, total, seq_missing = 0, 0, 0
-        seqs = []
         for line in file_rec.file.open('r'):
             if is_header:
                 is_header = False
@@ -1272,34 +1908,204 @@ class Taxonomy(Model):
                     # ASV/OTU not in database
                     continue
 
-                try:
-                    taxon = cls.objects.get(taxid=taxid, name=name)
-                except cls.DoesNotExist:
+                key = (taxid, name)
+                if key not in taxa and key not in new_taxa:
+                    if taxid in taxids or name in names:
+                        raise UserDataError(
+                            f'taxid or name already exists with other name '
+                            f'or taxid: {taxid} {name}'
+                        )
                     taxon = cls(taxid=taxid, name=name)
-                    taxon.full_clean()
+                    taxon.full_clean(validate_unique=False)
                     taxon.add_change_record(
                         file=file_rec,
                         line=total + 1,
                         comment=comment,
                     )
-                    taxon.save()
+                    new_taxa[key] = taxon
+                    taxids.add(taxid)
+                    names.add(name)
 
-                seq = otus[(prefix, num)].sequence
-                if seq is None:
+                seq_pk, taxon_pk = otus[(prefix, num)]
+                if seq_pk is None:
                     seq_missing += 1
-                else:
-                    if seq.taxon != taxon:
-                        seq.taxon = taxon
-                        updated += 1
-                seqs.append(seq)
+                elif taxon_pk is None or taxa.get(key) != taxon_pk:
+                    assignments[seq_pk] = key
+                    updated += 1
             except Exception as e:
                 raise RuntimeError(
                     f'error loading file: {file} at line {total}: {row}'
                 ) from e
 
-        Sequence.objects.bulk_update(seqs, ['taxon'])
+        cls._bulk_create_taxa(new_taxa, taxa)
+
+        # group sequences by taxon, one UPDATE per taxon and chunk of pks
+        by_taxon = {}
+        for seq_pk, key in assignments.items():
+            by_taxon.setdefault(taxa[key], []).append(seq_pk)
+        size = cls.update_chunk_size
+        for taxon_pk, seq_pks in by_taxon.items():
+            for i in range(0, len(seq_pks), size):
+                chunk = seq_pks[i:i + size]
+                Sequence.objects.filter(pk__in=chunk) \
+                    .update(taxon_id=taxon_pk)
+                # keep the summaries' taxa in sync, for all projects
+                OTUSummary.objects.filter(otu__sequence__in=chunk) \
+                    .update(taxon_id=taxon_pk)
+
         return dict(total=total, update=updated, seq_missing=seq_missing)
 
+    @classmethod
+    def _bulk_create_taxa(cls, new_taxa, taxa):
+        """
+        Save new taxa and their change records in batches
+
+        :param dict new_taxa: Map (taxid, name) -> unsaved Taxonomy object
+        :param dict taxa: Map (taxid, name) -> pk, updated with the new pks
+        """
+        objs = list(new_taxa.values())
+        size = cls.update_chunk_size
+        for i in range(0, len(objs), size):
+            batch = objs[i:i + size]
+            cls.objects.bulk_create(batch)
+            qs = cls.objects.filter(taxid__in=[j.taxid for j in batch])
+            pks = dict(qs.values_list('taxid', 'pk'))
+            for j in batch:
+                j.pk = pks[j.taxid]
+                taxa[(j.taxid, j.name)] = j.pk
+            history = ChangeRecordBatch()
+            history.add_bulk(batch)
+            history.flush()
+
+
+class OTUSummary(Model):
+    """
+    Per-project OTU prevalence and abundance stats
+
+    This is derived data, a materialized version of what OTU.summary() used
+    to compute on each call.  The stats only count abundance from curated
+    sequencing records.  Use refresh() to update a project's records, which
+    is done after abundance imports and by OTU.summary() if the records'
+    data_version is out of date, e.g. after sequencing records got curated.
+    Taxonomy imports update the taxon directly.
+    """
+    history = None
+    project = models.ForeignKey(
+        'AnalysisProject',
+        on_delete=models.CASCADE,
+        editable=False,
+        verbose_name='analysis project',
+    )
+    otu = models.ForeignKey(
+        OTU,
+        on_delete=models.CASCADE,
+        related_name='summaries',
+        editable=False,
+        verbose_name='OTU',
+    )
+    taxon = models.ForeignKey(
+        Taxonomy,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        editable=False,
+    )
+    prevalence = models.PositiveIntegerField(
+        editable=False,
+        help_text='number of sequencing records with non-zero count',
+    )
+    total_abundance = models.PositiveBigIntegerField(
+        editable=False,
+        help_text='sum of absolute counts',
+    )
+    mean_abundance = models.FloatField(
+        editable=False,
+        help_text="mean absolute count over all the project's sequencing "
+                  "records",
+    )
+    data_version = models.CharField(
+        max_length=200,
+        editable=False,
+        help_text='data version of project at time of refresh',
+    )
+
+    class Meta:
+        unique_together = (('project', 'otu'),)
+        indexes = [
+            models.Index(fields=['project', '-prevalence'],
+                         name='otusummary_prevalence_idx'),
+            models.Index(fields=['project', '-total_abundance'],
+                         name='otusummary_abundance_idx'),
+        ]
+        verbose_name = 'OTU summary'
+        verbose_name_plural = 'OTU summaries'
+
+    @classmethod
+    @atomic
+    def refresh(cls, project):
+        """
+        Re-compute the summary records for the given project
+
+        :param project: AnalysisProject instance or the name as str
+
+        Every OTU of the project gets a record, with zeros if the OTU has no
+        abundance data.  For ASV projects, these are the ASVs with abundance
+        data in the project.  Returns the number of records.
+        """
+        if isinstance(project, str):
+            project = AnalysisProject.objects.get(name=project)
+
+        version = cls.get_data_version(project)
+        se_qs = Sequencing.curated.all().filter(project=project)
+        num_seqs = se_qs.count()
+        stats = {
+            otu: (prevalence, total)
+            for otu, prevalence, total in Abundance.objects
+            .filter(project=project, sequencing__in=se_qs)
+            .order_by()
+            .values('otu')
+            .annotate(
+                prevalence=models.Count('sequencing', distinct=True),
+                total=models.Sum('count'),
+            )
+            .values_list('otu', 'prevalence', 'total')
+            .iterator()
+        }
+
+        otus = project.get_otus().values_list('pk', 'sequence__taxon')
+
+        objs = []
+        for otu_pk, taxon_pk in otus.iterator():
+            prevalence, total = stats.get(otu_pk, (0, 0))
+            objs.append(cls(
+                project=project,
+                otu_id=otu_pk,
+                taxon_id=taxon_pk,
+                prevalence=prevalence,
+                total_abundance=total,
+                mean_abundance=total / num_seqs if num_seqs else 0.0,
+                data_version=version,
+            ))
+
+        cls.objects.filter(project=project).delete()
+        cls.objects.bulk_create(objs, batch_size=Taxonomy.update_chunk_size)
+        return len(objs)
+
+    @staticmethod
+    def get_data_version(project):
+        """
+        Get the data version on which a project's summary depends
+
+        This is the shared table's data version, including the models that
+        the sequencing curation depends on.
+        """
+        curation = Sequencing.curated
+        curation.ensure_filter_setup()
+        lookups = list(curation.filter)
+        for i in curation.excludes:
+            lookups += list(i)
+        return Abundance.objects.filter_project(project) \
+            .get_shared_data_version(['sequencing__' + i for i in lookups])
+
 
 class AbundanceImportFile(ImportFile):
     """
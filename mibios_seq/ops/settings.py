@@ -7,3 +7,9 @@ from mibios.ops.settings import *
 
 INSTALLED_APPS.append('mibios_seq.apps.AppConfig')
 LOGGING['loggers']['mibios_seq'] = LOGGING['loggers']['mibios']
+
+# Directory for cached shared file exports.  The cache is disabled by default.
+# To enable it, set this to an absolute path of a directory writable by the
+# web application, e.g. in the deployment's settings:
+# SHARED_EXPORT_CACHE_DIR = '/var/cache/mibios/shared_exports'
+SHARED_EXPORT_CACHE_DIR = None
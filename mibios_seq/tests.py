@@ -0,0 +1,204 @@
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+from zipfile import ZipFile
+
+from django.test import TestCase, override_settings
+
+from django.db.models import Count, Q, Sum
+
+from mibios.dataset import UserDataError
+from mibios.models import TagNote
+from mibios_seq.models import (Abundance, AnalysisProject, OTU, OTUSummary,
+                               Sequencing)
+
+
+@override_settings(SHARED_EXPORT_CACHE_DIR=None)
+class AbundanceTests(TestCase):
+    """
+    Test the derived abundance data
+    """
+    def setUp(self):
+        self.project = AnalysisProject.objects.create(
+            name='p1',
+            otu_type=AnalysisProject.PCT97_TYPE,
+        )
+        self.seqs = [
+            Sequencing.objects.create(name=f's{i}') for i in range(3)
+        ]
+        self.otus = [
+            OTU.objects.create(prefix='Otu', number=i, project=self.project)
+            for i in range(3)
+        ]
+        self.counts = {
+            # (sequencing, otu) -> count
+            (0, 0): 1, (0, 1): 3,
+            (1, 0): 5,
+            (2, 1): 2, (2, 2): 6,
+        }
+        for (seq, otu), count in self.counts.items():
+            Abundance.objects.create(
+                project=self.project,
+                sequencing=self.seqs[seq],
+                otu=self.otus[otu],
+                count=count,
+            )
+        self.project.sequencing.add(*self.seqs)
+
+    def test_compute_relative(self):
+        totals = {0: 4, 1: 5, 2: 8}
+        qs = Abundance.objects.values_list(
+            'sequencing__name', 'otu__number', 'relative',
+        )
+        for update_from in [True, False]:
+            Abundance.objects.update(relative=None)
+            with patch.object(Abundance, '_has_update_from',
+                              return_value=update_from):
+                Abundance.compute_relative(project=self.project)
+            for seq, otu, relative in qs:
+                seq = int(seq[1:])
+                with self.subTest(update_from=update_from, seq=seq, otu=otu):
+                    self.assertAlmostEqual(
+                        relative,
+                        self.counts[(seq, otu)] / totals[seq],
+                    )
+
+    def test_shared_values(self):
+        qs = Abundance.objects.filter_project(self.project)
+        header, *rows = qs.as_shared_values_list()
+        self.assertEqual(header[1:], [i.natural for i in self.otus])
+        self.assertEqual(rows, [
+            ('s0', 1, 3, 0),
+            ('s1', 5, 0, 0),
+            ('s2', 0, 2, 6),
+        ])
+
+        Abundance.compute_relative(project=self.project)
+        _, *rows = qs.as_shared_values_list(normalize=0)
+        self.assertEqual(rows[2], ('s2', 0.0, 0.25, 0.75))
+
+        # data for an OTU missing from the header
+        it = qs._group_and_pivot(
+            [i.pk for i in self.otus[:2]], None, ['sequencing'], 1,
+        )
+        with self.assertRaises(RuntimeError):
+            list(it)
+
+    def test_shared_cache(self):
+        with TemporaryDirectory() as tmpd:
+            with self.settings(SHARED_EXPORT_CACHE_DIR=Path(tmpd)):
+                qs = Abundance.objects.filter_project(self.project)
+                path = qs.get_cached_shared()
+                self.assertEqual(qs.get_cached_shared(), path)
+                with ZipFile(path) as zf:
+                    shared = zf.read(zf.namelist()[0]).decode()
+                self.assertEqual(len(shared.splitlines()), 4)
+
+                self.seqs[0].name = 'x0'
+                self.seqs[0].save()
+                new_path = qs.get_cached_shared()
+                self.assertNotEqual(new_path, path)
+                self.assertEqual(
+                    list(path.parent.iterdir()),
+                    [new_path],
+                )
+
+    def get_summary_by_annotation(self):
+        """
+        Get OTU stats as OTU.summary() used to compute them
+        """
+        se_qs = Sequencing.curated.all().filter(project=self.project)
+        qs = OTU.objects.filter(project=self.project).annotate(
+            prevalence=Count('sequencing', distinct=True,
+                             filter=Q(sequencing__in=se_qs)),
+            total_abundance=Sum('abundance__count',
+                                filter=Q(abundance__sequencing__in=se_qs)),
+        )
+        return {
+            i.number: (i.prevalence, i.total_abundance or 0)
+            for i in qs
+        }
+
+    def get_summary(self):
+        return {
+            i.number: (i.prevalence, i.total_abundance)
+            for i in OTU.summary(self.project)
+        }
+
+    def test_summary(self):
+        extra = OTU.objects.create(prefix='Otu', number=3,
+                                   project=self.project)
+        expected = self.get_summary_by_annotation()
+        self.assertEqual(expected[extra.number], (0, 0))
+        self.assertEqual(self.get_summary(), expected)
+        for i in OTUSummary.objects.filter(project=self.project):
+            self.assertAlmostEqual(i.mean_abundance, i.total_abundance / 3)
+
+        # curation change, excluding sequencing s2
+        tag = TagNote.objects.create(name='bad', tag='exclude')
+        self.seqs[2].note.add(tag)
+        expected = self.get_summary_by_annotation()
+        self.assertEqual(expected[2], (0, 0))
+        self.assertEqual(self.get_summary(), expected)
+
+
+class SharedImportTests(TestCase):
+    """
+    Test loading abundance from mothur shared files
+    """
+    def setUp(self):
+        self.project = AnalysisProject.objects.create(
+            name='p2',
+            otu_type=AnalysisProject.PCT97_TYPE,
+        )
+        for i in ('s0', 's1'):
+            Sequencing.objects.create(name=i)
+        OTU.objects.create(prefix='Otu', number=1, project=self.project)
+
+    def load(self, text):
+        file = StringIO(text)
+        file.name = 'test.shared'
+        with TemporaryDirectory() as tmpd:
+            with self.settings(MEDIA_ROOT=tmpd, SHARED_EXPORT_CACHE_DIR=None):
+                return Abundance.from_file(file, self.project)
+
+    def test_from_file(self):
+        result = self.load(
+            'label\tGroup\tnumOtus\tOtu1\tOtu2\n'
+            '0.03\ts0\t2\t3\t0\n'
+            '0.03\ts1\t2\t1.0\t4\n'
+            '0.03\tunknown\t2\t5\t6\n'
+        )
+        self.assertEqual(result['count'], 3)
+        self.assertEqual(result['zeros'], 1)
+        self.assertEqual(result['skipped'], 2)
+        self.assertEqual(result['otus_created'], 1)
+        self.assertEqual(
+            set(Abundance.objects.values_list(
+                'sequencing__name', 'otu__number', 'count',
+            )),
+            {('s0', 1, 3), ('s1', 1, 1), ('s1', 2, 4)},
+        )
+
+    def test_new_otus_in_batches(self):
+        otus = [f'Otu{i}' for i in (9, 1, 7, 2, 5)]
+        with patch.object(OTU, 'NATURAL_MAP_BATCH_SIZE', 2):
+            result = self.load(
+                'label\tGroup\tnumOtus\t' + '\t'.join(otus) + '\n'
+                '0.03\ts0\t5\t9\t1\t7\t2\t5\n'
+            )
+        self.assertEqual(result['otus_created'], 4)
+        qs = Abundance.objects.values_list('otu__number', 'count')
+        self.assertEqual(len(qs), 5)
+        for number, count in qs:
+            self.assertEqual(number, count)
+
+    def test_bad_counts(self):
+        for value in ('1.5', 'x'):
+            with self.subTest(value=value):
+                with self.assertRaises(UserDataError):
+                    self.load(
+                        'label\tGroup\tnumOtus\tOtu1\n'
+                        f'0.03\ts0\t1\t{value}\n'
+                    )
@@ -1,4 +1,6 @@
-from django.http import Http404
+from zipfile import ZipFile
+
+from django.http import FileResponse, Http404
 from django.http.request import QueryDict
 from django.utils.text import slugify
 from django.views.generic.edit import FormView
@@ -155,17 +157,10 @@ class ExportSharedView(ExportSharedFormMixin, ExportView):
     _group_id_maps = None
 
     def get_filename(self):
-        parts = [self.project_name]
-        if self.normalize is None:
-            norm = 'abs'
-        elif self.normalize == -1:
-            norm = 'relpct'
-        elif self.normalize == 0:
-            norm = 'rel'
-        else:
-            norm = str(self.normalize)
-        parts.append(norm)
-        return slugify(' '.join(parts))
+        return models.AbundanceQuerySet.get_shared_file_stem(
+            self.project_name,
+            normalize=self.normalize,
+        )
 
     def get(self, request, *args, **kwargs):
         form = self.get_form_class()(data=self.request.GET)
@@ -194,6 +189,42 @@ class ExportSharedView(ExportSharedFormMixin, ExportView):
             form.cleaned_data.get('min_avg_group_size', 1)
         return super().get(request, *args, **kwargs)
 
+    def get_cached_shared(self):
+        """
+        Get path to the shared file from the export cache
+
+        Returns None if the table is filtered or if caching is disabled.
+        """
+        if self.mothur or self.conf.has_selection():
+            return None
+        return (
+            self.get_queryset()
+            .filter_project(self.project_name)
+            .get_cached_shared(
+                self.normalize,
+                meta_cols=self.meta_col_accessors,
+                min_avg_group_size=self.min_avg_group_size,
+                curated=self.conf.is_curated,
+            )
+        )
+
+    def render_to_response(self, context):
+        path = self.get_cached_shared()
+        if path is None:
+            return super().render_to_response(context)
+
+        name, suffix, Renderer = self.get_format()
+        filename = self.get_filename() + suffix
+        if issubclass(Renderer, CSVTabRendererZipped):
+            return self.get_file_response(path, filename,
+                                          Renderer.content_type)
+
+        # uncompressed format, serve the zip archive's only member
+        with ZipFile(path) as zf:
+            member = zf.open(zf.namelist()[0])
+        return FileResponse(member, as_attachment=True, filename=filename,
+                            content_type=Renderer.content_type)
+
     def get_values(self):
         return (
             self.get_queryset()
@@ -223,7 +254,7 @@ class ExportSequenceFastaView(ExportView):
         return super().get_filename()
 
     def get_values(self):
-        return (i.fasta() for i in self.get_queryset())
+        return self.get_queryset().to_fasta()
 
 
 class ExportOTUFastaView(ExportView):
@@ -104,8 +104,11 @@ setuptools.setup(
         'pandas~=1.3.0',
         'psycopg2~=2.9.0',
         'xlrd~=1.2',
-        'zipstream~=1.1.0',
     ],
+    extras_require={
+        # for Parquet / Arrow export formats
+        'arrow': ['pyarrow>=10'],
+    },
     packages=setuptools.find_packages(),
     package_data=get_package_data(),
     entry_points={